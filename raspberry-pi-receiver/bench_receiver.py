@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+
+import os
+import pty
+import sys
+import time
+import random
+import socket
+import logging
+import threading
+import resource
+import argparse
+import tempfile
+import multiprocessing
+
+from deskextend_receiver.services.decoder import SubprocessDecoder
+from deskextend_receiver.services.decoder_writer import DecoderWriter
+from deskextend_receiver.utils.devices import detect_all_devices
+from deskextend_receiver.utils.hotplug import DeviceWatcher, inotify_available
+from deskextend_receiver.utils.framing import pack_v1_frame
+from deskextend_receiver.utils.reassembly import FrameReassembler
+
+NULL_DECODER = {"name": "null sink", "cmd": ["sh", "-c", "cat > /dev/null"]}
+
+
+def make_frames(seconds, fps, bitrate_mbps, gop):
+    count = int(seconds * fps)
+    bytes_per_gop = bitrate_mbps * 1_000_000 / 8 * gop / fps
+    p_size = max(64, int(bytes_per_gop / (gop + 9)))
+    idr_size = p_size * 10
+    frames = []
+    for index in range(count):
+        size = idr_size if index % gop == 0 else p_size
+        nal_type = 0x65 if index % gop == 0 else 0x41
+        frames.append(b"\x00\x00\x00\x01" + bytes([nal_type]) + os.urandom(16) + b"\x00" * (size - 21))
+    return frames
+
+
+def usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, usage.ru_nvcsw + usage.ru_nivcsw
+
+
+def report(name, video_seconds, elapsed, cpu, switches, extra):
+    print(
+        f"{name:<28} wall {elapsed:6.2f}s | CPU {cpu * 1000 / video_seconds:7.1f} ms per video second"
+        f" | ctx switches {switches / video_seconds:8.1f}/s{extra}"
+    )
+
+
+def feed_writer(stream, frames, pipe_size, batch, fps, realtime):
+    decoder = SubprocessDecoder(NULL_DECODER, pipe_size=pipe_size)
+    decoder.start(0.2)
+    reassembler = FrameReassembler(8 * 1024 * 1024, 64 * 1024 * 1024)
+    writer = DecoderWriter(
+        reassembler,
+        decoder.write,
+        max_frames=len(frames),
+        write_batch=decoder.write_frames,
+        max_batch_frames=batch
+    )
+    writer.start()
+
+    cpu_before, switches_before = usage()
+    started = time.perf_counter()
+    position = 0
+    sent = 0
+    while position < len(stream):
+        if realtime:
+            delay = started + sent / fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        view = reassembler.writable()
+        if not view:
+            view.release()
+            time.sleep(0.0002)
+            continue
+        size = min(len(view), len(stream) - position, 256 * 1024)
+        view[:size] = stream[position:position + size]
+        view.release()
+        reassembler.commit(size)
+        position += size
+        while True:
+            frame = reassembler.next_frame()
+            if frame is None:
+                break
+            writer.push(frame)
+            sent += 1
+    writer.stop(timeout=60, drain=True)
+    elapsed = time.perf_counter() - started
+    cpu_after, switches_after = usage()
+    decoder.stop()
+    return elapsed, cpu_after - cpu_before, switches_after - switches_before, decoder, writer
+
+
+def bench_writev(args):
+    frames = make_frames(args.seconds, args.fps, args.bitrate, args.gop)
+    stream = b"".join(pack_v1_frame(frame) for frame in frames)
+    print(
+        f"{len(frames)} frames, {len(stream) / 1_000_000:.1f} MB "
+        f"({args.seconds:.0f}s of {args.fps:.0f} fps video at {args.bitrate:.0f} Mbps)"
+        f"{', paced in real time' if args.realtime else ', unpaced'}"
+    )
+    variants = [
+        ("write per frame, 64 KiB pipe", 0, 1),
+        (f"writev x{args.batch}, {args.pipe_size // 1024} KiB pipe", args.pipe_size, args.batch),
+    ]
+    results = []
+    for name, pipe_size, batch in variants:
+        elapsed, cpu, switches, decoder, writer = feed_writer(stream, frames, pipe_size, batch, args.fps, args.realtime)
+        capacity = decoder.pipe_capacity or 65536
+        report(
+            name,
+            args.seconds,
+            elapsed,
+            cpu,
+            switches,
+            f" | write calls {decoder.write_calls / args.seconds:7.1f}/s | batches {writer.batches}"
+            f" | pipe {capacity // 1024} KiB"
+        )
+        results.append((decoder.write_calls, cpu))
+    (base_calls, base_cpu), (calls, cpu) = results
+    print(
+        f"Saved {(base_calls - calls) / args.seconds:.1f} write calls and "
+        f"{(base_cpu - cpu) * 1000 / args.seconds:.1f} ms CPU per second of video"
+    )
+
+
+def send_stream(port, stream, chunk_size, bytes_per_second):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        started = time.perf_counter()
+        for offset in range(0, len(stream), chunk_size):
+            if bytes_per_second:
+                delay = started + offset / bytes_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendall(stream[offset:offset + chunk_size])
+
+
+def receive_session(stream, splice, policy, chunk_size, bytes_per_second):
+    from deskextend_receiver.core import VideoReceiver
+
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ["DESKEXTEND_STREAM_SPLICE"] = "1" if splice else "0"
+    os.environ["DESKEXTEND_STREAM_DROP_POLICY"] = policy
+    os.environ["DESKEXTEND_DECODER_QUEUE_FRAMES"] = "100000"
+    receiver = VideoReceiver(mode="network")
+    receiver.running = True
+    receiver.show_chromium_kiosk = lambda: None
+    receiver.hide_chromium_kiosk = lambda: None
+    receiver.decoder = SubprocessDecoder(NULL_DECODER, pipe_size=receiver.decoder_pipe_size)
+    receiver.decoder.start(0.2)
+
+    listener = socket.create_server(("127.0.0.1", 0))
+    sender = multiprocessing.Process(
+        target=send_stream,
+        args=(listener.getsockname()[1], stream, chunk_size, bytes_per_second)
+    )
+    sender.start()
+    conn, _ = listener.accept()
+    receiver.configure_client_socket(conn)
+    conn.settimeout(1.0)
+
+    cpu_before, switches_before = usage()
+    started = time.perf_counter()
+    receiver.process_stream(conn, forced_transport_name="Network")
+    elapsed = time.perf_counter() - started
+    cpu_after, switches_after = usage()
+
+    sender.join()
+    conn.close()
+    listener.close()
+    receiver.decoder.stop()
+    frames = receiver.metrics.get("deskextend_frames_written_total", (("transport", "Network"),))
+    return elapsed, cpu_after - cpu_before, switches_after - switches_before, frames
+
+
+def bench_splice(args):
+    os.environ.setdefault("DESKEXTEND_CACHE_DIR", tempfile.mkdtemp(prefix="deskextend-bench-"))
+    frames = make_frames(args.seconds, args.fps, args.bitrate, args.gop)
+    stream = b"".join(pack_v1_frame(frame) for frame in frames)
+    megabits = len(stream) * 8 / 1_000_000
+    bytes_per_second = 0 if args.unpaced else args.bitrate * 1_000_000 / 8
+    print(
+        f"{len(frames)} frames, {len(stream) / 1_000_000:.1f} MB over TCP loopback"
+        f"{', unpaced' if args.unpaced else f', paced at {args.bitrate:.0f} Mbps'}"
+    )
+    if not hasattr(os, "splice"):
+        print("os.splice is not available on this platform; only the copy path can be measured")
+    variants = [("copy, nal drop policy", False, "nal"), ("copy, frames drop policy", False, "frames")]
+    if hasattr(os, "splice"):
+        variants.append(("splice", True, "nal"))
+    for name, splice, policy in variants:
+        elapsed, cpu, switches, written = receive_session(stream, splice, policy, args.chunk_size, bytes_per_second)
+        print(
+            f"{name:<28} {megabits / elapsed:8.0f} Mbps | CPU {cpu * 1000 / megabits:6.3f} ms per Mbit"
+            f" | ctx switches {switches / elapsed:8.1f}/s | frames {written}/{len(frames)}"
+        )
+
+
+def send_tty(master, stream, chunk_size, bytes_per_second, received):
+    started = time.perf_counter()
+    for offset in range(0, len(stream), chunk_size):
+        if bytes_per_second:
+            delay = started + offset / bytes_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        view = memoryview(stream)[offset:offset + chunk_size]
+        while view:
+            view = view[os.write(master, view):]
+    received.wait(30)
+    os.close(master)
+
+
+def receive_tty(stream, frame_count, raw, chunk_size, bytes_per_second):
+    from deskextend_receiver.core import VideoReceiver
+
+    logging.getLogger().setLevel(logging.WARNING)
+    master, slave = pty.openpty()
+    path = os.ttyname(slave)
+    receiver = VideoReceiver(mode="network")
+    receiver.usb_device = path
+    receiver.usb_raw_tty = raw
+    if not receiver.open_usb():
+        raise SystemExit(f"Could not open {path}")
+    os.close(slave)
+    conn = receiver.serial_conn
+    copy_reads = not raw
+    reassembler = FrameReassembler(receiver.stream_buffer_size, receiver.max_frame_size)
+
+    received = multiprocessing.Event()
+    sender = multiprocessing.Process(target=send_tty, args=(master, stream, chunk_size, bytes_per_second, received))
+    sender.start()
+    os.close(master)
+
+    frames = reads = empty_reads = largest = 0
+    cpu_before, switches_before = usage()
+    started = time.perf_counter()
+    while frames < frame_count:
+        view = reassembler.writable()
+        if copy_reads:
+            chunk = receiver.read_from_connection(conn, chunk_size=len(view))
+            view.release()
+        else:
+            chunk = receiver.read_from_connection(conn, recv_buffer=view)
+        if chunk is None:
+            break
+        if not chunk:
+            empty_reads += 1
+            if copy_reads:
+                time.sleep(0.001)
+            continue
+        reads += 1
+        largest = max(largest, len(chunk))
+        if copy_reads:
+            reassembler.write(chunk)
+        else:
+            reassembler.commit(len(chunk))
+        while True:
+            frame = reassembler.next_frame()
+            if frame is None:
+                break
+            reassembler.release(frame)
+            frames += 1
+    elapsed = time.perf_counter() - started
+    cpu_after, switches_after = usage()
+
+    received.set()
+    sender.join()
+    receiver.close_usb()
+    return elapsed, cpu_after - cpu_before, switches_after - switches_before, frames, reads, empty_reads, largest
+
+
+def bench_tty(args):
+    os.environ.setdefault("DESKEXTEND_CACHE_DIR", tempfile.mkdtemp(prefix="deskextend-bench-"))
+    frames = make_frames(args.seconds, args.fps, args.bitrate, args.gop)
+    stream = b"".join(pack_v1_frame(frame) for frame in frames)
+    megabits = len(stream) * 8 / 1_000_000
+    bytes_per_second = 0 if args.unpaced else args.bitrate * 1_000_000 / 8
+    print(
+        f"{len(frames)} frames, {len(stream) / 1_000_000:.1f} MB over a pty"
+        f"{', unpaced' if args.unpaced else f', paced at {args.bitrate:.0f} Mbps'}"
+    )
+    for name, raw in (("pyserial, in_waiting + sleep", False), ("raw tty, poll + readinto", True)):
+        elapsed, cpu, switches, written, reads, empty_reads, largest = receive_tty(
+            stream, len(frames), raw, args.chunk_size, bytes_per_second
+        )
+        print(
+            f"{name:<28} {megabits / elapsed:8.1f} Mbps | CPU {cpu * 1000 / megabits:6.3f} ms per Mbit"
+            f" | ctx switches {switches / elapsed:8.1f}/s | reads {reads / elapsed:8.1f}/s"
+            f" (largest {largest} B, {empty_reads / elapsed:.1f}/s empty) | frames {written}/{len(frames)}"
+        )
+
+
+def watch_devices(root, watcher, interval, rescan_interval, stop, seen, stats):
+    while not stop.is_set():
+        if watcher:
+            watcher.wait(rescan_interval)
+        else:
+            time.sleep(interval)
+        stats["wakeups"] += 1
+        devices = detect_all_devices(root)
+        now = time.perf_counter()
+        for device in devices:
+            seen.setdefault(device, now)
+
+
+def measure_hotplug(use_watcher, args):
+    root = tempfile.mkdtemp(prefix="deskextend-dev-")
+    watcher = DeviceWatcher(root) if use_watcher else None
+    stop = threading.Event()
+    seen = {}
+    stats = {"wakeups": 0}
+    thread = threading.Thread(
+        target=watch_devices,
+        args=(root, watcher, args.interval, args.rescan, stop, seen, stats)
+    )
+    thread.start()
+
+    latencies = []
+    for index in range(args.attaches):
+        time.sleep(random.uniform(0.05, args.interval))
+        path = os.path.join(root, f"ttyACM{index}")
+        attached = time.perf_counter()
+        open(path, "w").close()
+        while path not in seen:
+            time.sleep(0.0005)
+        latencies.append(seen[path] - attached)
+        os.unlink(path)
+
+    time.sleep(args.interval)
+    wakeups_before = stats["wakeups"]
+    cpu_before, switches_before = usage()
+    idle_started = time.perf_counter()
+    time.sleep(args.idle)
+    idle = time.perf_counter() - idle_started
+    cpu_after, switches_after = usage()
+    wakeups = (stats["wakeups"] - wakeups_before) / idle
+    stop.set()
+    if watcher:
+        open(os.path.join(root, "ttyACM-stop"), "w").close()
+    thread.join()
+    if watcher:
+        watcher.close()
+    return latencies, (cpu_after - cpu_before) / idle, (switches_after - switches_before) / idle, wakeups
+
+
+def bench_hotplug(args):
+    print(
+        f"{args.attaches} simulated attaches, then {args.idle:.0f}s idle "
+        f"(poll interval {args.interval:.1f}s, inotify rescan every {args.rescan:.0f}s)"
+    )
+    variants = [("glob polling", False)]
+    if inotify_available():
+        variants.append(("inotify watcher", True))
+    else:
+        print("inotify is not available on this platform; only polling can be measured")
+    for name, use_watcher in variants:
+        latencies, cpu, switches, wakeups = measure_hotplug(use_watcher, args)
+        latencies.sort()
+        print(
+            f"{name:<28} attach->detect p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms"
+            f" | max {latencies[-1] * 1000:7.1f} ms | idle scans {wakeups:5.2f}/s"
+            f" | idle CPU {cpu * 1000:6.3f} ms/s | idle ctx switches {switches:6.2f}/s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receiver hot-path benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    writev = subparsers.add_parser("writev", help="Per-frame writes vs batched writev into a resized decoder pipe")
+    writev.add_argument("--seconds", type=float, default=10.0)
+    writev.add_argument("--fps", type=float, default=60.0)
+    writev.add_argument("--bitrate", type=float, default=50.0, help="Video bitrate in Mbps")
+    writev.add_argument("--gop", type=int, default=60)
+    writev.add_argument("--batch", type=int, default=8)
+    writev.add_argument("--pipe-size", type=int, default=1024 * 1024)
+    writev.add_argument("--realtime", action="store_true", help="Pace input at the video frame rate")
+    writev.set_defaults(run=bench_writev)
+
+    splice = subparsers.add_parser("splice", help="Userspace copy vs splice from a TCP socket into the decoder pipe")
+    splice.add_argument("--seconds", type=float, default=10.0)
+    splice.add_argument("--fps", type=float, default=60.0)
+    splice.add_argument("--bitrate", type=float, default=50.0, help="Video bitrate in Mbps")
+    splice.add_argument("--gop", type=int, default=60)
+    splice.add_argument("--chunk-size", type=int, default=64 * 1024, help="Sender write size")
+    splice.add_argument("--unpaced", action="store_true", help="Send as fast as possible instead of at the video bitrate")
+    splice.set_defaults(run=bench_splice)
+
+    tty = subparsers.add_parser("tty", help="pyserial polling vs the raw tty reader on a pty")
+    tty.add_argument("--seconds", type=float, default=10.0)
+    tty.add_argument("--fps", type=float, default=60.0)
+    tty.add_argument("--bitrate", type=float, default=20.0, help="Video bitrate in Mbps")
+    tty.add_argument("--gop", type=int, default=60)
+    tty.add_argument("--chunk-size", type=int, default=16 * 1024, help="Sender write size")
+    tty.add_argument("--unpaced", action="store_true", help="Send as fast as possible instead of at the video bitrate")
+    tty.set_defaults(run=bench_tty)
+
+    hotplug = subparsers.add_parser("hotplug", help="Device detection by glob polling vs the inotify watcher")
+    hotplug.add_argument("--attaches", type=int, default=20)
+    hotplug.add_argument("--interval", type=float, default=1.0, help="Polling interval (DESKEXTEND_USB_SCAN_INTERVAL)")
+    hotplug.add_argument("--rescan", type=float, default=30.0, help="Watcher full rescan interval")
+    hotplug.add_argument("--idle", type=float, default=10.0, help="Seconds to measure idle wakeups for")
+    hotplug.set_defaults(run=bench_hotplug)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import socket
+import select
 import struct
 import subprocess
 import signal
@@ -8,7 +9,6 @@ import os
 import logging
 import shutil
 import pwd
-import glob
 
 try:
     import serial
@@ -16,11 +16,12 @@ except Exception:
     serial = None
 
 try:
-    from flask import Flask, render_template, jsonify, request, redirect
+    from flask import Flask, Response, render_template, jsonify, request, redirect
     from dotenv import load_dotenv
     import psutil
 except Exception:
     Flask = None
+    Response = None
     render_template = None
     jsonify = None
     request = None
@@ -28,9 +29,48 @@ except Exception:
     load_dotenv = None
     psutil = None
 
-from .services.usb_gadget import setup_usb_gadget
+from .services.decoder import DecoderStallError, create_decoder, gstreamer_available, probe_decoders, replace_sink
+from .services.decoder_cache import STATUS_BROKEN, STATUS_OK, DecoderCapabilityCache
+from .services.decoder_writer import DecoderWriter
+from .services.pipeline_scores import PipelineScoreboard, process_cpu_seconds
+from .services.usb_gadget import NETWORK_FUNCTIONS, setup_usb_gadget, usb_function_name, usb_network_address
 from .utils.devices import detect_all_devices, detect_usb_device
-from .utils.display import get_screen_resolution, has_vaapi_sink
+from .utils.display import DrmConnectorWatcher, connected_resolution, read_connectors, x_display_available
+from .utils.hotplug import DeviceWatcher, inotify_available
+from .utils.tty import EndpointStream, RawStream, RawTTY, raw_tty_available
+from .utils.metrics import CONTENT_TYPE, RECOVERY_BUCKETS, Histogram, MetricsRegistry
+from .utils.clock_sync import ClockSync
+from .utils.framing import (
+    CONTROL_PING,
+    CONTROL_PONG,
+    FLAG_CONTROL,
+    HELLO_FLAG_CONTROL,
+    HELLO_MAGIC,
+    KEYFRAME_REASON_DECODER,
+    KEYFRAME_REASON_DROP,
+    KEYFRAME_REASON_SESSION,
+    KEYFRAME_REASONS,
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    V1_HEADER,
+    from_microseconds,
+    pack_feedback,
+    pack_hello,
+    pack_keyframe_request,
+    pack_ping,
+    pack_pong,
+    unpack_control,
+)
+from .utils.h264 import (
+    FRAME_CONFIG,
+    FRAME_IDR,
+    FRAME_NONREF,
+    FRAME_REF,
+    PARAMETER_SCAN_BYTES,
+    ParameterSetCache,
+    classify_access_unit,
+)
+from .utils.reassembly import FrameReassembler, FrameSizeError, StreamFrame
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,27 +78,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DECODER_WINDOW_NAMES = ("vaapisink", "autovideosink", "gst-launch-1.0")
+DISPLAY_PLANE_SINKS = ("kmssink", "v4l2sink")
+DECODER_SAMPLE_IDLE_GAP = 1.0
+
 
 class VideoReceiver:
     def __init__(self, host="0.0.0.0", port=5900, mode="network", usb_device=None, device_name=None):
+        self.started_at = time.monotonic()
         self.host = host
         self.port = port
         self.mode = mode
         self.device_name = device_name or os.environ.get("DESKEXTEND_NAME", "RaspberryPi")
         os.environ["DESKEXTEND_NAME"] = self.device_name
-
-        if self.mode in ["usb", "hybrid", "all"]:
-            if os.geteuid() == 0:
-                logger.info("Setting up USB gadget...")
-                if not setup_usb_gadget():
-                    logger.error("USB gadget setup failed; receiver may not appear as USB accessory")
-            else:
-                logger.warning("USB mode requires root. USB may not be available.")
+        try:
+            self.usb_function = usb_function_name()
+        except ValueError as e:
+            logger.error(f"{e} - using acm")
+            self.usb_function = "acm"
+        self.usb_gadget_async = os.environ.get("DESKEXTEND_USB_GADGET_ASYNC", "1") == "1"
+        self.usb_gadget_ready = threading.Event()
+        self.usb_gadget_thread = None
+        self.startup_stages = set()
 
         self.usb_device = usb_device or detect_usb_device()
         self.sock = None
         self.serial_conn = None
-        self.decoder_process = None
+        self.decoder = None
+        self.decoder_lock = threading.RLock()
+        self.decoder_signature = None
+        self.decoder_warm = False
+        self.decoder_idle = False
+        self.persistent_decoder = os.environ.get("DESKEXTEND_PERSISTENT_DECODER", "1") == "1"
+        self.session_started_at = None
+        self.decoder_backend = os.environ.get("DESKEXTEND_DECODER_BACKEND", "subprocess").strip().lower()
+        self.decoder_sink = os.environ.get("DESKEXTEND_DECODER_SINK", "").strip()
+        self.decoder_ready_timeout = float(os.environ.get("DESKEXTEND_DECODER_READY_TIMEOUT", "2"))
+        self.parallel_probe = os.environ.get("DESKEXTEND_DECODER_PARALLEL_PROBE", "1") == "1"
+        self.decoder_cache = DecoderCapabilityCache(
+            broken_ttl=float(os.environ.get("DESKEXTEND_DECODER_BROKEN_TTL", "3600"))
+        )
+        self.decoder_failover_queue_frames = int(os.environ.get("DESKEXTEND_DECODER_FAILOVER_QUEUE_FRAMES", "120"))
+        self.max_decoder_failovers = int(os.environ.get("DESKEXTEND_DECODER_MAX_FAILOVERS", "3"))
+        self.decoder_failovers = 0
+        self.session_pipeline_failures = {}
+        self.decoder_stall_started = None
+        self.decoder_stall_timeout = float(os.environ.get("DESKEXTEND_DECODER_STALL_TIMEOUT", "2"))
+        self.decoder_pipe_size = int(os.environ.get("DESKEXTEND_DECODER_PIPE_SIZE", str(1024 * 1024)))
+        self.decoder_batch_frames = int(os.environ.get("DESKEXTEND_DECODER_BATCH_FRAMES", "8"))
+        self.pipeline_scores = PipelineScoreboard()
+        self.decoder_sample = None
+        self.parameter_sets = ParameterSetCache()
+        self.primed_decoder = None
         self.chromium_process = None
         self.unclutter_process = None
         self.kiosk_last_failed = 0.0
@@ -72,28 +143,134 @@ class VideoReceiver:
         self.web_thread = None
         self.startup_flag = {"play": False}
         self.display_connected = False
-        self.display_check_thread = None
+        self.display_watcher = None
+        self.screen_resolution = None
         self.is_video_streaming = False
         self.serial_idle_timeout = float(os.environ.get("DESKEXTEND_USB_IDLE_TIMEOUT", "5"))
+        self.usb_raw_tty = os.environ.get("DESKEXTEND_USB_RAW_TTY", "1") == "1"
         self.stream_state_lock = threading.Lock()
         self.active_streams = 0
         self.usb_state_lock = threading.Lock()
         self.available_usb_devices = []
         self.usb_monitor_thread = None
         self.usb_scan_interval = float(os.environ.get("DESKEXTEND_USB_SCAN_INTERVAL", "1"))
+        self.usb_hotplug = os.environ.get("DESKEXTEND_USB_HOTPLUG", "inotify").strip().lower()
+        self.usb_rescan_interval = float(os.environ.get("DESKEXTEND_USB_RESCAN_INTERVAL", "30"))
+        self.usb_watcher = None
+        self.usb_devices_changed = threading.Event()
         self.transport_lock = threading.Lock()
         self.active_transport = None
         self.ethernet_interface = self.detect_ethernet_interface()
         self.max_frame_size = int(os.environ.get("DESKEXTEND_MAX_FRAME_SIZE", str(50 * 1024 * 1024)))
         self.socket_rcvbuf = int(os.environ.get("DESKEXTEND_SOCKET_RCVBUF", str(16 * 1024 * 1024)))
         self.socket_chunk_size = int(os.environ.get("DESKEXTEND_SOCKET_CHUNK_SIZE", str(1024 * 1024)))
-        self.stream_compact_threshold = int(os.environ.get("DESKEXTEND_STREAM_COMPACT_THRESHOLD", str(2 * 1024 * 1024)))
+        self.stream_buffer_size = int(os.environ.get("DESKEXTEND_STREAM_BUFFER_SIZE", str(8 * 1024 * 1024)))
         self.stream_drop_backlog_bytes = int(os.environ.get("DESKEXTEND_STREAM_DROP_BACKLOG_BYTES", "0"))
         self.stream_keep_latest_frames = int(os.environ.get("DESKEXTEND_STREAM_KEEP_LATEST_FRAMES", "2"))
+        self.stream_drop_policy = os.environ.get("DESKEXTEND_STREAM_DROP_POLICY", "nal").strip().lower()
+        self.stream_splice = os.environ.get("DESKEXTEND_STREAM_SPLICE", "0") == "1"
+        self.max_frame_age = float(os.environ.get("DESKEXTEND_MAX_FRAME_AGE_MS", "0")) / 1000.0
+        self.awaiting_idr = False
         self.decoder_queue_buffers = int(os.environ.get("DESKEXTEND_DECODER_QUEUE_BUFFERS", "2"))
+        self.decoder_queue_frames = int(os.environ.get("DESKEXTEND_DECODER_QUEUE_FRAMES", "30"))
         self.decoder_max_lateness_ns = int(os.environ.get("DESKEXTEND_DECODER_MAX_LATENESS_NS", "20000000"))
         self.dropped_frames_for_latency = 0
+        self.stream_reassembler = None
+        self.decoder_writer = None
+        self.last_copied_bytes = 0
+        self.stream_metric_labels = ()
+        self.sequence_reported = (0, 0)
+        self.latency_labels = {}
+        self.interval_latency = Histogram()
+        self.interval_capture_latency = Histogram()
+        self.clock_sync = None
+        self.clock_sync_interval = float(os.environ.get("DESKEXTEND_CLOCK_SYNC_INTERVAL", "1.0"))
+        self.feedback_interval = float(os.environ.get("DESKEXTEND_FEEDBACK_INTERVAL", "0.5"))
+        self.keyframe_request_interval = float(os.environ.get("DESKEXTEND_KEYFRAME_REQUEST_INTERVAL", "1.0"))
+        self.keyframe_lock = threading.Lock()
+        self.keyframe_request_reason = None
+        self.keyframe_request_sent_at = None
+        self.recovery_started_at = None
+        self.recovery_reason = None
+        self.control_wakeup = threading.Event()
+        self.connection_send_lock = threading.Lock()
+        self.connected_transports = set()
+        self.decoder_starts = 0
+        self.metrics = MetricsRegistry()
+        self.register_metrics()
         self.refresh_usb_devices()
+        self.start_usb_gadget_setup()
+
+    def register_metrics(self):
+        metrics = self.metrics
+        metrics.counter("deskextend_bytes_received_total", "Stream bytes received")
+        metrics.counter("deskextend_frames_written_total", "Frames written to the decoder")
+        metrics.counter("deskextend_frames_dropped_total", "Frames dropped to keep latency down")
+        metrics.counter("deskextend_frames_missing_total", "Sequence numbers skipped by v2 streams")
+        metrics.counter("deskextend_frames_reordered_total", "v2 frames that arrived after a later sequence number")
+        metrics.counter("deskextend_feedback_reports_total", "Feedback reports sent to the sender")
+        metrics.counter("deskextend_keyframe_requests_total", "Keyframe requests sent to the sender")
+        metrics.counter("deskextend_keyframe_requests_coalesced_total", "Keyframe requests folded into one already pending")
+        metrics.counter("deskextend_stream_connections_total", "Stream connections accepted")
+        metrics.counter("deskextend_stream_reconnects_total", "Stream connections after the first on a transport")
+        metrics.counter("deskextend_decoder_starts_total", "Decoder pipelines started")
+        metrics.counter("deskextend_decoder_restarts_total", "Decoder pipelines started after the first")
+        metrics.counter("deskextend_decoder_exits_total", "Decoders that exited on their own")
+        metrics.counter("deskextend_parameter_set_injections_total", "New decoders primed with cached SPS/PPS")
+        metrics.counter("deskextend_decoder_failovers_total", "Decoders replaced mid-session after a write failure")
+        metrics.counter("deskextend_decoder_stalls_total", "Decoders killed by the watchdog for making no progress")
+        metrics.counter("deskextend_decoder_write_blocked_seconds_total", "Time spent waiting for the decoder input to drain")
+        metrics.counter("deskextend_decoder_write_calls_total", "write/writev calls made to feed the decoder")
+        metrics.gauge("deskextend_active_transport", "1 for the transport currently streaming")
+        metrics.gauge("deskextend_active_streams", "Streams currently connected")
+        metrics.gauge("deskextend_stream_buffer_bytes", "Bytes buffered in the reassembly ring")
+        metrics.gauge("deskextend_stream_buffered_frames", "Complete frames waiting in the reassembly ring")
+        metrics.gauge("deskextend_decoder_queue_frames", "Frames queued for the decoder writer")
+        metrics.gauge("deskextend_decoder_up", "1 while a decoder is running")
+        metrics.gauge("deskextend_startup_seconds", "Seconds from receiver start until each startup stage was reached")
+        metrics.gauge("deskextend_usb_gadget_setup_seconds", "Time the last USB gadget setup took")
+        metrics.gauge("deskextend_fps", "Frames per second over the last interval")
+        metrics.gauge("deskextend_clock_offset_seconds", "Estimated sender clock minus receiver clock")
+        metrics.gauge("deskextend_clock_rtt_seconds", "Round-trip time of the best recent clock sync sample")
+        metrics.histogram(
+            "deskextend_frame_latency_seconds",
+            "Per-frame latency: receive is first byte to frame complete, write is frame complete to decoder write done, "
+            "total is both, capture is sender capture time to decoder write done"
+        )
+        metrics.histogram(
+            "deskextend_keyframe_recovery_seconds",
+            "Time from losing a decodable picture to writing the next IDR frame",
+            RECOVERY_BUCKETS
+        )
+        metrics.histogram(
+            "deskextend_decoder_stall_seconds",
+            "Time from a mid-session decoder failure to the first frame written to its replacement",
+            RECOVERY_BUCKETS
+        )
+        metrics.add_collector(self.collect_metrics)
+
+    def collect_metrics(self):
+        metrics = self.metrics
+        active = self.active_transport
+        with self.stream_state_lock:
+            transports = set(self.connected_transports)
+        if active:
+            transports.add(active)
+        for transport_name in transports:
+            metrics.set("deskextend_active_transport", 1 if transport_name == active else 0, (("transport", transport_name),))
+        metrics.set("deskextend_active_streams", self.active_streams)
+        reassembler = self.stream_reassembler
+        metrics.set("deskextend_stream_buffer_bytes", reassembler.buffered() if reassembler else 0)
+        metrics.set("deskextend_stream_buffered_frames", reassembler.complete_frames() if reassembler else 0)
+        writer = self.decoder_writer
+        metrics.set("deskextend_decoder_queue_frames", writer.depth() if writer else 0)
+        decoder = self.decoder
+        metrics.set("deskextend_decoder_up", 1 if decoder and decoder.is_alive() else 0)
+        metrics.set("deskextend_fps", round(self.current_fps, 2) if self.is_video_streaming else 0.0)
+        clock = self.clock_sync
+        if clock and clock.synchronized():
+            metrics.set("deskextend_clock_offset_seconds", clock.offset)
+            metrics.set("deskextend_clock_rtt_seconds", clock.rtt)
 
     def try_claim_transport(self, transport_name):
         with self.transport_lock:
@@ -119,6 +296,12 @@ class VideoReceiver:
         with self.stream_state_lock:
             self.active_streams += 1
             should_hide = self.active_streams == 1
+            reconnect = transport_name in self.connected_transports
+            self.connected_transports.add(transport_name)
+        labels = (("transport", transport_name),)
+        self.metrics.inc("deskextend_stream_connections_total", 1, labels)
+        if reconnect:
+            self.metrics.inc("deskextend_stream_reconnects_total", 1, labels)
         logger.info("%s stream connected", transport_name)
         if should_hide:
             self.hide_chromium_kiosk()
@@ -142,6 +325,8 @@ class VideoReceiver:
 
         for device in added:
             logger.info("USB accessory detected: %s", device)
+        if added:
+            self.usb_devices_changed.set()
         for device in removed:
             logger.info("USB accessory removed: %s", device)
 
@@ -165,19 +350,108 @@ class VideoReceiver:
         if self.usb_monitor_thread and self.usb_monitor_thread.is_alive():
             return
 
+        watcher = self.open_usb_watcher()
+
         def loop():
             interval = max(0.2, self.usb_scan_interval)
+            next_rescan = time.monotonic() + self.usb_rescan_interval
             while self.running:
                 try:
+                    if watcher:
+                        relevant = watcher.wait(max(0.0, next_rescan - time.monotonic()))
+                        if time.monotonic() >= next_rescan:
+                            next_rescan = time.monotonic() + self.usb_rescan_interval
+                            relevant = relevant or not self.has_active_transport()
+                        if relevant:
+                            self.refresh_usb_devices()
+                        continue
                     if not self.has_active_transport():
                         self.refresh_usb_devices()
                 except Exception as e:
                     logger.warning(f"USB monitor error: {e}")
                 time.sleep(interval)
+            if watcher:
+                watcher.close()
+                self.usb_watcher = None
 
         self.usb_monitor_thread = threading.Thread(target=loop, daemon=True)
         self.usb_monitor_thread.start()
 
+    def open_usb_watcher(self):
+        if self.usb_hotplug != "inotify" or not inotify_available():
+            logger.info("USB hotplug: polling every %.1fs", max(0.2, self.usb_scan_interval))
+            return None
+        try:
+            self.usb_watcher = DeviceWatcher()
+        except OSError as e:
+            logger.warning(f"USB hotplug: inotify unavailable ({e}), polling every {max(0.2, self.usb_scan_interval):.1f}s")
+            self.usb_watcher = None
+            return None
+        logger.info("USB hotplug: watching /dev with inotify (full rescan every %.0fs)", self.usb_rescan_interval)
+        return self.usb_watcher
+
+    def poll_usb_devices(self):
+        if self.usb_watcher is None:
+            self.refresh_usb_devices()
+
+    def wait_for_usb_device(self, timeout):
+        self.usb_devices_changed.wait(timeout)
+        self.usb_devices_changed.clear()
+
+    def start_usb_gadget_setup(self):
+        if self.mode not in ["usb", "hybrid", "all"]:
+            self.usb_gadget_ready.set()
+            return
+        if os.geteuid() != 0:
+            logger.warning("USB mode requires root. USB may not be available.")
+            self.usb_gadget_ready.set()
+            return
+        if self.usb_gadget_async:
+            self.usb_gadget_thread = threading.Thread(target=self.configure_usb_gadget, daemon=True)
+            self.usb_gadget_thread.start()
+        else:
+            self.configure_usb_gadget()
+
+    def configure_usb_gadget(self):
+        logger.info("Setting up USB gadget...")
+        started = time.monotonic()
+        try:
+            if not setup_usb_gadget(self.usb_function):
+                logger.error("USB gadget setup failed; receiver may not appear as USB accessory")
+        except Exception as e:
+            logger.error(f"USB gadget setup error: {e}")
+        finally:
+            self.metrics.set("deskextend_usb_gadget_setup_seconds", time.monotonic() - started)
+            self.refresh_usb_devices()
+            self.usb_gadget_ready.set()
+            self.record_startup("usb_gadget")
+
+    def wait_for_usb_gadget(self):
+        if self.usb_gadget_ready.is_set():
+            return
+        logger.info("Waiting for USB gadget setup to finish...")
+        while self.running and not self.usb_gadget_ready.wait(0.5):
+            pass
+
+    @staticmethod
+    def get_system_uptime():
+        try:
+            with open("/proc/uptime", "r") as f:
+                return float(f.read().split()[0])
+        except Exception:
+            return None
+
+    def record_startup(self, stage):
+        with self.stream_state_lock:
+            if stage in self.startup_stages:
+                return
+            self.startup_stages.add(stage)
+        elapsed = time.monotonic() - self.started_at
+        self.metrics.set("deskextend_startup_seconds", elapsed, (("stage", stage),))
+        uptime = self.get_system_uptime()
+        boot = f", {uptime:.1f}s after boot" if uptime is not None else ""
+        logger.info(f"Startup: {stage} {elapsed:.2f}s after receiver start{boot}")
+
     def get_cpu_temp(self):
         try:
             with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
@@ -186,57 +460,34 @@ class VideoReceiver:
         except Exception:
             return 0
 
-    def check_display_connected(self):
-        try:
-            display_env = os.environ.get("DISPLAY", ":0")
-            result = subprocess.run(
-                ["xrandr", "--query"],
-                capture_output=True,
-                text=True,
-                timeout=2,
-                env={**os.environ, "DISPLAY": display_env}
-            )
-            if result.returncode == 0:
-                for line in result.stdout.splitlines():
-                    if " connected" in line and "disconnected" not in line:
-                        return True
-
-            for status_path in glob.glob("/sys/class/drm/*/status"):
-                try:
-                    with open(status_path, "r") as f:
-                        if f.read().strip().lower() == "connected":
-                            return True
-                except Exception:
-                    continue
-
-            return False
-        except Exception as e:
-            logger.debug(f"Display check failed: {e}")
-            return False
-
-    def display_monitor_loop(self):
-        while self.running:
-            try:
-                connected = self.check_display_connected()
-                if connected != self.display_connected:
-                    self.display_connected = connected
-                    logger.info(
-                        f"Display status changed: {'connected' if connected else 'disconnected'}"
-                    )
-                else:
-                    self.display_connected = connected
-            except Exception as e:
-                logger.warning(f"Display monitor error: {e}")
-            time.sleep(60)
+    def check_display_connected(self, connectors=None):
+        if connectors is None:
+            connectors = read_connectors()
+        if connectors:
+            return any(status == "connected" for status, _ in connectors.values())
+        return x_display_available()
+
+    def on_display_change(self, connectors):
+        connected = self.check_display_connected(connectors)
+        resolution = connected_resolution(connectors)
+        changed = connected != self.display_connected or resolution != self.screen_resolution
+        self.display_connected = connected
+        self.screen_resolution = resolution
+        if changed:
+            size = f" at {resolution[0]}x{resolution[1]}" if resolution else ""
+            logger.info(f"Display status changed: {'connected' if connected else 'disconnected'}{size}")
 
     def start_display_monitor(self):
-        if not self.display_check_thread or not self.display_check_thread.is_alive():
-            self.display_connected = self.check_display_connected()
-            logger.info(
-                f"Initial display status: {'connected' if self.display_connected else 'disconnected'}"
-            )
-            self.display_check_thread = threading.Thread(target=self.display_monitor_loop, daemon=True)
-            self.display_check_thread.start()
+        if self.display_watcher and self.display_watcher.running:
+            return
+        self.display_watcher = DrmConnectorWatcher(self.on_display_change)
+        connectors = self.display_watcher.connectors
+        self.display_connected = self.check_display_connected(connectors)
+        self.screen_resolution = connected_resolution(connectors)
+        logger.info(
+            f"Initial display status: {'connected' if self.display_connected else 'disconnected'}"
+        )
+        self.display_watcher.start()
 
     def get_receiver_ip_entries(self):
         entries = []
@@ -329,9 +580,36 @@ class VideoReceiver:
             temp = self.get_cpu_temp()
             return {"cpu": round(cpu), "ram": round(ram), "storage": round(storage), "temp": temp}
 
+        @self.app.route("/metrics")
+        def metrics():
+            return Response(self.metrics.render(), content_type=CONTENT_TYPE)
+
+        @self.app.route("/latency")
+        def latency():
+            return {
+                "unit": "ms",
+                "items": [
+                    {**labels, **summary}
+                    for labels, summary in self.metrics.histogram_summaries("deskextend_frame_latency_seconds")
+                ]
+            }
+
+        @self.app.route("/decoder-scores")
+        def decoder_scores():
+            decoder = self.decoder
+            return {
+                "active": decoder.name if decoder else None,
+                "backend": decoder.backend if decoder else self.decoder_backend,
+                "pipelines": self.pipeline_scores.summary()
+            }
+
         @self.app.route("/display-status")
         def display_status():
-            return {"connected": self.display_connected}
+            resolution = self.screen_resolution
+            return {
+                "connected": self.display_connected,
+                "resolution": f"{resolution[0]}x{resolution[1]}" if resolution else None
+            }
 
         @self.app.route("/weather")
         def weather():
@@ -778,7 +1056,8 @@ class VideoReceiver:
         parse_stage = ["h264parse", "disable-passthrough=true", "config-interval=-1"]
 
         has_v4l2_sink = os.path.exists("/dev/video0") and os.access("/dev/video0", os.W_OK)
-        screen_res = get_screen_resolution()
+        capabilities = self.decoder_cache.capabilities()
+        screen_res = tuple(capabilities["screen_resolution"]) if capabilities["screen_resolution"] else None
 
         if enable_kms:
             pipelines.append({
@@ -793,7 +1072,7 @@ class VideoReceiver:
                 ]
             })
 
-        if has_vaapi_sink():
+        if capabilities["vaapi_sink"]:
             pipelines.append({
                 "name": "VAAPI h264 + vaapisink fullscreen",
                 "cmd": [
@@ -892,44 +1171,76 @@ class VideoReceiver:
                 ]
             })
 
+        if self.decoder_sink:
+            for pipeline_info in pipelines:
+                pipeline_info["cmd"] = replace_sink(pipeline_info["cmd"], self.decoder_sink)
+
         return pipelines
 
-    def start_decoder(self):
-        pipelines = self.detect_decoder_pipeline()
+    def start_decoder(self, pipelines=None, demote=None):
+        if pipelines is None:
+            pipelines = self.detect_decoder_pipeline()
 
         print(f"DISPLAY environment: {os.environ.get('DISPLAY', 'NOT SET')}")
 
-        for pipeline_info in pipelines:
-            try:
-                pipeline = pipeline_info["cmd"]
-                logger.info(f"Trying: {pipeline_info['name']}")
+        backend = self.decoder_backend
+        if backend == "appsrc" and not gstreamer_available():
+            logger.warning("In-process decoder requested but PyGObject/GStreamer is missing; using gst-launch")
+            backend = "subprocess"
 
-                env = os.environ.copy()
-                if "DISPLAY" not in env:
-                    env["DISPLAY"] = ":0"
+        env = os.environ.copy()
+        if "DISPLAY" not in env:
+            env["DISPLAY"] = ":0"
 
-                self.decoder_process = subprocess.Popen(
-                    pipeline,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.PIPE,
+        statuses = [self.decoder_cache.pipeline_status(pipeline_info, backend) for pipeline_info in pipelines]
+        candidates = [info for info, status in zip(pipelines, statuses) if status != STATUS_BROKEN]
+        if not candidates:
+            logger.warning("Every decoder pipeline is cached as broken; retrying all of them")
+            candidates = pipelines
+        candidates = self.pipeline_scores.rank(candidates, backend)
+        if demote:
+            candidates = (
+                [info for info in candidates if info["name"] != demote["name"]]
+                + [info for info in candidates if info["name"] == demote["name"]]
+            )
+        first_known_good = self.decoder_cache.pipeline_status(candidates[0], backend) == STATUS_OK
+        skipped = len(pipelines) - len(candidates)
+        if skipped:
+            logger.info(f"Skipping {skipped} decoder pipeline(s) known to be broken on this system")
+
+        if self.parallel_probe and not first_known_good and len(candidates) > 1:
+            logger.info(f"Probing {len(candidates)} decoder pipelines in parallel against fakesink")
+            probes = [
+                create_decoder(
+                    {**info, "cmd": replace_sink(info["cmd"], "fakesink")},
+                    backend=backend,
                     env=env,
-                    bufsize=0
+                    pipe_size=self.decoder_pipe_size
                 )
+                for info in candidates
+            ]
+            usable = []
+            for pipeline_info, (_, ready) in zip(candidates, probe_decoders(probes, timeout=self.decoder_ready_timeout)):
+                if ready:
+                    usable.append(pipeline_info)
+                else:
+                    self.decoder_cache.record(pipeline_info, backend, STATUS_BROKEN)
+            if not usable:
+                logger.error("All decoder pipelines failed")
+                return False
+            candidates = usable
 
-                time.sleep(1.0)
+        for pipeline_info in candidates:
+            try:
+                logger.info(f"Trying: {pipeline_info['name']}")
 
-                if self.decoder_process.poll() is None:
-                    self.decoder_type = pipeline_info["name"]
-                    logger.info(f"Decoder started: {self.decoder_type}")
-                    self.apply_wmctrl_fullscreen()
-                    threading.Thread(target=self.monitor_decoder_errors, daemon=True).start()
+                decoder = create_decoder(pipeline_info, backend=backend, env=env, pipe_size=self.decoder_pipe_size)
+                if decoder.start(self.decoder_ready_timeout):
+                    self.decoder_cache.record(pipeline_info, backend, STATUS_OK)
+                    self.adopt_decoder(decoder)
                     return True
-                try:
-                    stderr = self.decoder_process.stderr.read().decode("utf-8", errors="ignore")
-                    logger.warning(f"Failed: {stderr[:200]}")
-                except Exception:
-                    pass
+                decoder.stop()
+                self.decoder_cache.record(pipeline_info, backend, STATUS_BROKEN)
             except Exception as e:
                 logger.warning(f"Error: {e}")
                 continue
@@ -937,48 +1248,199 @@ class VideoReceiver:
         logger.error("All decoder pipelines failed")
         return False
 
-    def apply_wmctrl_fullscreen(self):
-        if not self.has_wmctrl():
+    def adopt_decoder(self, decoder):
+        self.decoder = decoder
+        self.decoder_type = decoder.name
+        score = self.pipeline_scores.score(decoder.pipeline_info, decoder.backend)
+        if score is not None:
+            logger.info(f"Decoder started: {self.decoder_type} ({decoder.backend}, score {score:.1f})")
+        else:
+            logger.info(f"Decoder started: {self.decoder_type} ({decoder.backend})")
+        self.reset_decoder_sample()
+        self.decoder_starts += 1
+        labels = (("pipeline", decoder.name), ("backend", decoder.backend))
+        self.metrics.inc("deskextend_decoder_starts_total", 1, labels)
+        if self.decoder_starts > 1:
+            self.metrics.inc("deskextend_decoder_restarts_total", 1, labels)
+        self.arrange_decoder_window()
+
+    def reset_decoder_sample(self):
+        decoder = self.decoder
+        if not decoder:
+            self.decoder_sample = None
             return
+        now = time.monotonic()
+        self.decoder_sample = {
+            "decoder": decoder,
+            "started": now,
+            "last_frame": now,
+            "frames": 0,
+            "qos_dropped": decoder.qos_dropped,
+            "late_frames": self.decoder_queue_drops(),
+            "cpu_seconds": process_cpu_seconds(decoder.pid),
+        }
+
+    def decoder_queue_drops(self):
+        labels = self.stream_metric_labels
+        return sum(
+            self.metrics.get("deskextend_frames_dropped_total", (*labels, ("reason", reason)))
+            for reason in ("overflow", "expired")
+        )
+
+    def count_decoder_frame(self):
+        sample = self.decoder_sample
+        if not sample or sample["decoder"] is not self.decoder:
+            return
+        now = time.monotonic()
+        if now - sample["last_frame"] > DECODER_SAMPLE_IDLE_GAP:
+            self.reset_decoder_sample()
+            sample = self.decoder_sample
+        sample["frames"] += 1
+        sample["last_frame"] = now
+
+    def sample_decoder_performance(self):
+        decoder = self.decoder
+        sample = self.decoder_sample
+        if not decoder or not sample or sample["decoder"] is not decoder:
+            return
+        now = time.monotonic()
+        qos_dropped = decoder.qos_dropped
+        late_frames = self.decoder_queue_drops()
+        cpu_seconds = process_cpu_seconds(decoder.pid)
+        cpu_delta = None
+        if cpu_seconds is not None and sample["cpu_seconds"] is not None:
+            cpu_delta = cpu_seconds - sample["cpu_seconds"]
+        self.pipeline_scores.record_sample(
+            decoder.pipeline_info,
+            decoder.backend,
+            sample["frames"],
+            now - sample["started"],
+            max(0, qos_dropped - sample["qos_dropped"]),
+            cpu_delta,
+            max(0, late_frames - sample["late_frames"])
+        )
+        sample.update(
+            started=now,
+            frames=0,
+            qos_dropped=qos_dropped,
+            late_frames=late_frames,
+            cpu_seconds=cpu_seconds
+        )
+
+    def stop_decoder(self):
+        with self.decoder_lock:
+            decoder = self.decoder
+            self.decoder = None
+            self.decoder_signature = None
+        if decoder:
+            if not decoder.is_alive():
+                self.pipeline_scores.record_restart(decoder.pipeline_info, decoder.backend)
+                self.metrics.inc("deskextend_decoder_exits_total", 1, (("pipeline", decoder.name), ("backend", decoder.backend)))
+                self.pipeline_scores.save()
+            decoder.stop(timeout=3)
 
-        window_names = [
-            "vaapisink",
-            "autovideosink",
-            "gst-launch-1.0"
-        ]
+    @staticmethod
+    def pipeline_signature(pipelines):
+        return tuple(tuple(pipeline_info["cmd"]) for pipeline_info in pipelines)
+
+    def ensure_decoder(self, for_session=True):
+        if for_session:
+            self.session_started_at = time.monotonic()
+        with self.decoder_lock:
+            pipelines = self.detect_decoder_pipeline()
+            signature = self.pipeline_signature(pipelines)
+            decoder = self.decoder
+            self.decoder_idle = not for_session
+            if decoder and decoder.is_alive() and signature == self.decoder_signature:
+                self.decoder_warm = True
+                logger.info(f"Reusing warm decoder: {self.decoder_type}")
+                if for_session:
+                    self.arrange_decoder_window(delay=0)
+                return True
+
+            if decoder:
+                if decoder.is_alive():
+                    logger.info("Stream parameters changed, restarting decoder")
+                else:
+                    logger.warning("Decoder exited, restarting")
+                self.stop_decoder()
+
+            self.decoder_warm = False
+            if not self.start_decoder(pipelines):
+                return False
+            self.decoder_signature = signature
+            return True
+
+    def prewarm_decoder(self):
+        if not self.persistent_decoder or not self.running:
+            return
+        if not self.has_wmctrl():
+            logger.info("Not pre-spawning the decoder: wmctrl is needed to keep its window behind the kiosk page")
+            return
 
-        def worker(delay=5.0):
+        def worker():
             try:
-                time.sleep(delay)
-                for name in window_names:
-                    try:
-                        subprocess.run(
-                            ["wmctrl", "-r", name, "-b", "add,fullscreen,above"],
-                            timeout=1,
-                            stderr=subprocess.DEVNULL
-                        )
-                    except Exception:
-                        continue
-            except Exception:
-                return
+                if self.has_active_transport():
+                    return
+                with self.decoder_lock:
+                    if self.decoder and self.decoder.is_alive():
+                        return
+                    logger.info("Pre-spawning decoder while waiting for a client")
+                    if not self.ensure_decoder(for_session=False):
+                        return
+                    decoder = self.decoder
+                    if decoder and not self.has_active_transport() and not self.decoder_can_idle(decoder):
+                        logger.info(f"Not keeping {decoder.name} warm: its sink would cover the kiosk page")
+                        self.stop_decoder()
+            except Exception as e:
+                logger.warning(f"Decoder pre-spawn failed: {e}")
 
         threading.Thread(target=worker, daemon=True).start()
 
-    def monitor_decoder_errors(self):
-        if not self.decoder_process or not self.decoder_process.stderr:
+    def finish_decoder_session(self):
+        decoder = self.decoder
+        if self.persistent_decoder and decoder and decoder.is_alive():
+            if self.decoder_can_idle(decoder):
+                logger.info("Keeping decoder warm for the next session")
+                self.decoder_idle = True
+                self.arrange_decoder_window(delay=0)
+                return
+            logger.info(f"Not keeping {decoder.name} warm: its sink would cover the kiosk page")
+            self.stop_decoder()
             return
+        self.stop_decoder()
+        self.prewarm_decoder()
 
-        while self.running and self.decoder_process:
-            try:
-                line = self.decoder_process.stderr.readline()
-                if not line:
-                    break
+    def decoder_can_idle(self, decoder):
+        if any(element in DISPLAY_PLANE_SINKS for element in decoder.pipeline_info["cmd"]):
+            return False
+        return self.has_wmctrl()
+
+    def arrange_decoder_window(self, delay=5.0):
+        if not self.has_wmctrl():
+            return
 
-                line = line.decode("utf-8", errors="ignore").strip()
-                if line and ("ERROR" in line or "WARN" in line):
-                    logger.warning(f"GStreamer: {line}")
+        def worker():
+            try:
+                time.sleep(delay)
+                if self.decoder_idle:
+                    actions = ["remove,fullscreen,above", "add,hidden"]
+                else:
+                    actions = ["remove,hidden", "add,fullscreen,above"]
+                for name in DECODER_WINDOW_NAMES:
+                    for action in actions:
+                        try:
+                            subprocess.run(
+                                ["wmctrl", "-r", name, "-b", action],
+                                timeout=1,
+                                stderr=subprocess.DEVNULL
+                            )
+                        except Exception:
+                            continue
             except Exception:
-                break
+                return
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def bind_socket(self):
         return self.bind_socket_for_mode(ethernet_only=False)
@@ -1148,6 +1610,7 @@ class VideoReceiver:
                 self.sock.bind(bind_target)
                 self.sock.listen(16)
                 self.sock.settimeout(5.0)
+                self.record_startup("listening")
                 if ethernet_only:
                     iface = self.ethernet_interface or "auto"
                     logger.info(f"[{self.device_name}] Listening on Ethernet {iface} {host}:{self.port}")
@@ -1199,6 +1662,25 @@ class VideoReceiver:
             logger.error("No USB device detected")
             return False
 
+        if os.path.isdir(self.usb_device):
+            try:
+                self.serial_conn = EndpointStream(self.usb_device, timeout=1.0, write_timeout=1.0)
+                logger.info(f"Opened USB FunctionFS endpoints: {self.usb_device}")
+                self.record_startup("usb_open")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to open USB endpoints: {e}")
+                return False
+
+        if self.usb_raw_tty and raw_tty_available():
+            try:
+                self.serial_conn = RawTTY(self.usb_device, timeout=1.0, write_timeout=1.0)
+                logger.info(f"Opened USB device in raw mode: {self.usb_device}")
+                self.record_startup("usb_open")
+                return True
+            except Exception as e:
+                logger.warning(f"Raw tty open failed for {self.usb_device} ({e}), falling back to pyserial")
+
         try:
             try:
                 from serial import Serial as _Serial, SerialException as _SerialException
@@ -1217,6 +1699,7 @@ class VideoReceiver:
                 write_timeout=1.0
             )
             logger.info(f"Opened USB device: {self.usb_device}")
+            self.record_startup("usb_open")
             return True
         except Exception as e:
             logger.error(f"Failed to open USB device: {e}")
@@ -1232,23 +1715,74 @@ class VideoReceiver:
 
     def update_fps(self):
         self.frame_count += 1
+        self.count_decoder_frame()
         now = time.time()
         elapsed = now - self.last_fps_time
         if elapsed >= 1.0:
             self.current_fps = self.frame_count / elapsed
+            self.sample_decoder_performance()
             mbps = (self.bytes_received * 8) / (elapsed * 1_000_000)
+            copied_kbps = 0.0
+            dropped_by_type = ""
+            reassembler = self.stream_reassembler
+            if reassembler:
+                copied_kbps = (reassembler.copied_bytes - self.last_copied_bytes) / (elapsed * 1024)
+                self.last_copied_bytes = reassembler.copied_bytes
+                dropped_by_type = " ".join(
+                    f"{name}={count}" for name, count in reassembler.dropped_by_type.items() if count
+                )
+            queue_stats = ""
+            writer = self.decoder_writer
+            if writer:
+                handled = writer.frames_written + writer.frames_expired
+                avg_wait_ms = (writer.wait_total / handled * 1000) if handled else 0.0
+                queue_stats = (
+                    f" | Queue: {writer.depth()}/{writer.max_depth} (limit {writer.max_frames})"
+                    f" | QueueWait: {avg_wait_ms:.1f}/{writer.wait_max * 1000:.1f} ms"
+                    f" | QueueDrops: {writer.frames_dropped}"
+                )
+                writer.reset_stats()
+            sequence_stats = ""
+            if reassembler and reassembler.protocol == PROTOCOL_V2:
+                tracker = reassembler.sequence
+                sequence_stats = f" | SeqLost: {tracker.lost} | SeqReordered: {tracker.reordered}"
+                self.flush_sequence_metrics(reassembler)
+            latency = self.interval_latency.summary()
+            self.interval_latency.reset()
+            capture_stats = ""
+            clock = self.clock_sync
+            if self.interval_capture_latency.count and clock and clock.synchronized():
+                capture = self.interval_capture_latency.summary()
+                capture_stats = (
+                    f" | Capture->write p50/p95/max: {capture['p50']:.1f}/{capture['p95']:.1f}/{capture['max']:.1f} ms"
+                    f" | RTT: {clock.rtt * 1000:.1f} ms"
+                )
+            self.interval_capture_latency.reset()
             logger.info(
-                f"FPS: {self.current_fps:.1f} | Bitrate: {mbps:.1f} Mbps | Frames: {self.frame_count} | DroppedForLatency: {self.dropped_frames_for_latency}"
+                f"FPS: {self.current_fps:.1f} | Bitrate: {mbps:.1f} Mbps | Frames: {self.frame_count} | DroppedForLatency: {self.dropped_frames_for_latency} ({dropped_by_type or 'none'}) | BufferCopy: {copied_kbps:.1f} KB/s{queue_stats}{sequence_stats}"
+                f" | Latency p50/p95/p99/max: {latency['p50']:.1f}/{latency['p95']:.1f}/{latency['p99']:.1f}/{latency['max']:.1f} ms{capture_stats}"
             )
             self.frame_count = 0
             self.bytes_received = 0
             self.dropped_frames_for_latency = 0
             self.last_fps_time = now
 
+    def is_serial_connection(self, conn):
+        if isinstance(conn, RawStream):
+            return True
+        return bool(serial and hasattr(serial, "Serial") and isinstance(conn, serial.Serial))
+
     def read_from_connection(self, conn, chunk_size=None, recv_buffer=None):
         if chunk_size is None:
             chunk_size = self.socket_chunk_size
         try:
+            if isinstance(conn, RawStream):
+                if recv_buffer is None:
+                    return conn.read(chunk_size)
+                received = conn.readinto(recv_buffer)
+                if received is None:
+                    return None
+                return recv_buffer[:received]
             if serial and hasattr(serial, "Serial") and isinstance(conn, serial.Serial):
                 return conn.read(min(chunk_size, 4096)) if conn.in_waiting else b""
             if recv_buffer is not None:
@@ -1272,91 +1806,135 @@ class VideoReceiver:
 
     def process_stream(self, conn, forced_transport_name=None):
         logger.info("Processing video stream...")
-        is_serial = serial and hasattr(serial, "Serial") and isinstance(conn, serial.Serial)
+        is_serial = self.is_serial_connection(conn)
+        copy_reads = is_serial and not isinstance(conn, RawStream)
         transport_name = forced_transport_name or ("USB" if is_serial else "Network")
         self.mark_stream_connected(transport_name)
         self.is_video_streaming = True
-
-        buffer = bytearray()
-        parse_offset = 0
+        metric_labels = (("transport", transport_name),)
+        self.stream_metric_labels = metric_labels
+        self.latency_labels = {
+            stage: (*metric_labels, ("stage", stage)) for stage in ("receive", "write", "total", "capture")
+        }
+        self.clock_sync = ClockSync()
+        session_stop = threading.Event()
+        self.control_wakeup.clear()
+        self.decoder_failovers = 0
+        self.session_pipeline_failures = {}
+        self.decoder_stall_started = None
+        with self.keyframe_lock:
+            self.keyframe_request_reason = None
+            self.keyframe_request_sent_at = None
+            self.recovery_started_at = None
+
+        classify = classify_access_unit if self.stream_drop_policy == "nal" else None
+        self.awaiting_idr = False
+        reassembler = FrameReassembler(self.stream_buffer_size, self.max_frame_size, classify=classify)
+        writer = DecoderWriter(
+            reassembler,
+            self.write_frame_to_decoder,
+            max_frames=self.decoder_queue_frames,
+            should_drop=lambda frame: self.expire_late_frame(reassembler, frame),
+            on_overflow=lambda frame: self.drop_overflow_frame(reassembler, frame),
+            on_error=lambda error: self.recover_decoder(error, reassembler, session_stop),
+            max_recovery_frames=self.decoder_failover_queue_frames,
+            write_batch=self.write_frames_to_decoder,
+            max_batch_frames=self.decoder_batch_frames
+        )
+        self.stream_reassembler = reassembler
+        self.decoder_writer = writer
+        self.sequence_reported = (0, 0)
+        negotiated_protocol = None
+        self.last_copied_bytes = 0
+        if self.decoder_warm and classify:
+            self.awaiting_idr = True
+        self.request_keyframe(KEYFRAME_REASON_SESSION)
+        decoder = self.decoder
+        if decoder:
+            self.pipeline_scores.record_session(decoder.pipeline_info, decoder.backend)
+            self.reset_decoder_sample()
         last_data_time = time.time()
-        recv_array = None
-        recv_view = None
-        if not is_serial:
-            recv_array = bytearray(self.socket_chunk_size)
-            recv_view = memoryview(recv_array)
+        peer_closed = False
+        writer.start()
+        watchdog_stop = threading.Event()
+        if self.decoder_stall_timeout > 0:
+            threading.Thread(target=self.run_decoder_watchdog, args=(watchdog_stop,), daemon=True).start()
 
         try:
+            if self.stream_splice and self.can_splice(conn, is_serial):
+                result = self.splice_stream(conn, metric_labels, reassembler)
+                if result is not None:
+                    return result
+
             while self.running:
                 try:
-                    chunk = self.read_from_connection(conn, recv_buffer=recv_view)
+                    if writer.error:
+                        logger.error(f"Decoder could not be recovered ({writer.error}) - dropping the connection")
+                        self.is_video_streaming = False
+                        self.show_chromium_kiosk()
+                        return False
+
+                    recv_view = reassembler.writable()
+                    if not recv_view:
+                        recv_view.release()
+                        writer.make_room()
+                        continue
+                    if copy_reads:
+                        chunk = self.read_from_connection(conn, chunk_size=len(recv_view))
+                        recv_view.release()
+                    else:
+                        chunk = self.read_from_connection(conn, recv_buffer=recv_view)
                     if chunk is None:
                         logger.info("Connection closed by peer.")
+                        peer_closed = True
                         break
                     if not chunk:
                         if is_serial:
                             if time.time() - last_data_time > self.serial_idle_timeout:
                                 logger.info("USB stream idle, reconnecting...")
                                 return False
-                            time.sleep(0.001)
+                            if copy_reads:
+                                time.sleep(0.001)
                         continue
                     if is_serial:
                         last_data_time = time.time()
+                    if copy_reads:
+                        reassembler.write(chunk)
+                    else:
+                        reassembler.commit(len(chunk))
+
+                    if reassembler.protocol != negotiated_protocol:
+                        negotiated_protocol = reassembler.protocol
+                        self.on_protocol_negotiated(conn, reassembler, transport_name, session_stop)
 
-                    buffer.extend(chunk)
-                    chunk_len = len(chunk)
-                    self.bytes_received += chunk_len
+                    self.bytes_received += len(chunk)
+                    self.metrics.inc("deskextend_bytes_received_total", len(chunk), metric_labels)
 
                     if self.stream_drop_backlog_bytes > 0:
-                        dropped_bytes, dropped_frames = self.drop_stale_buffer_frames(buffer, parse_offset)
+                        dropped_bytes, dropped_frames = self.drop_stale_buffer_frames(reassembler)
                         if dropped_bytes:
-                            parse_offset += dropped_bytes
                             self.dropped_frames_for_latency += dropped_frames
+                            if not reassembler.classify:
+                                self.request_keyframe(KEYFRAME_REASON_DROP)
+                            self.metrics.inc(
+                                "deskextend_frames_dropped_total",
+                                dropped_frames,
+                                (*metric_labels, ("reason", "backlog"))
+                            )
 
-                    while len(buffer) - parse_offset >= 4:
-                        frame_size = struct.unpack_from(">I", buffer, parse_offset)[0]
-
-                        if frame_size > self.max_frame_size:
-                            logger.warning(f"Invalid frame size: {frame_size} - Connection considered corrupt, dropping.")
+                    while True:
+                        try:
+                            frame = reassembler.next_frame()
+                        except FrameSizeError as e:
+                            logger.warning(f"Invalid frame size: {e.frame_size} - Connection considered corrupt, dropping.")
                             return False
-
-                        frame_total = 4 + frame_size
-                        if len(buffer) - parse_offset < frame_total:
+                        if frame is None:
                             break
-
-                        frame_start = parse_offset + 4
-                        frame_end = frame_start + frame_size
-                        frame_view = memoryview(buffer)[frame_start:frame_end]
-                        parse_offset += frame_total
-
-                        if self.decoder_process and self.decoder_process.stdin:
-                            try:
-                                self.decoder_process.stdin.write(frame_view)
-                                self.update_fps()
-                            except BrokenPipeError:
-                                frame_view.release()
-                                logger.error("Decoder pipe broken - restarting...")
-                                self.is_video_streaming = False
-                                self.show_chromium_kiosk()
-                                return False
-                            except Exception as e:
-                                frame_view.release()
-                                logger.error(f"Decoder write error: {e}")
-                                self.is_video_streaming = False
-                                self.show_chromium_kiosk()
-                                return False
-                        frame_view.release()
-
-                    if parse_offset:
-                        if parse_offset == len(buffer):
-                            buffer.clear()
-                            parse_offset = 0
-                        elif parse_offset >= self.stream_compact_threshold:
-                            del buffer[:parse_offset]
-                            parse_offset = 0
-                        elif parse_offset >= (len(buffer) // 2):
-                            del buffer[:parse_offset]
-                            parse_offset = 0
+                        if frame.flags & FLAG_CONTROL:
+                            self.handle_control_frame(conn, frame)
+                            reassembler.release(frame)
+                            continue
+                        writer.push(frame)
 
                 except socket.error as e:
                     logger.error(f"Socket error: {e}")
@@ -1365,42 +1943,533 @@ class VideoReceiver:
                     logger.error(f"Stream error: {e}")
                     break
         finally:
+            session_stop.set()
+            self.control_wakeup.set()
+            writer.stop(drain=peer_closed)
+            watchdog_stop.set()
+            if reassembler.protocol == PROTOCOL_V2:
+                self.flush_sequence_metrics(reassembler)
+                tracker = reassembler.sequence
+                logger.info(
+                    "%s stream sequence summary: received=%d lost=%d reordered=%d",
+                    transport_name,
+                    tracker.received,
+                    tracker.lost,
+                    tracker.reordered
+                )
             self.is_video_streaming = False
+            self.stream_reassembler = None
+            self.decoder_writer = None
+            self.pipeline_scores.save()
             self.mark_stream_disconnected(transport_name)
 
         return True
 
-    def drop_stale_buffer_frames(self, buffer, parse_offset):
-        available = len(buffer) - parse_offset
-        if available <= self.stream_drop_backlog_bytes:
-            return 0, 0
+    def can_splice(self, conn, is_serial):
+        reasons = []
+        if not hasattr(os, "splice"):
+            reasons.append("os.splice is not available")
+        if is_serial:
+            reasons.append("the transport is a serial port")
+        decoder = self.decoder
+        if not decoder or decoder.backend != "subprocess":
+            reasons.append("the decoder is not a gst-launch subprocess")
+        if self.max_frame_age > 0:
+            reasons.append("frame deadlines are enabled")
+        if self.stream_drop_backlog_bytes > 0:
+            reasons.append("backlog dropping is enabled")
+        if reasons:
+            logger.warning("DESKEXTEND_STREAM_SPLICE is set but this stream is not spliced: %s", ", ".join(reasons))
+            return False
+        return True
 
-        keep_frames = max(1, self.stream_keep_latest_frames)
-        cursor = parse_offset
-        frame_offsets = []
+    def peek_stream_magic(self, conn):
+        while self.running:
+            try:
+                peeked = conn.recv(len(HELLO_MAGIC), socket.MSG_PEEK)
+            except socket.timeout:
+                continue
+            if not peeked or len(peeked) == len(HELLO_MAGIC) or not HELLO_MAGIC.startswith(peeked):
+                return peeked
+            time.sleep(0.001)
+        return None
+
+    def splice_stream(self, conn, metric_labels, reassembler):
+        peeked = self.peek_stream_magic(conn)
+        if peeked == HELLO_MAGIC:
+            logger.info("Sender negotiates v2 framing, not splicing this stream")
+            return None
+        if not peeked:
+            logger.info("Connection closed by peer.")
+            return True
 
-        while len(buffer) - cursor >= 4:
-            frame_size = struct.unpack_from(">I", buffer, cursor)[0]
+        logger.info("Splicing stream payloads from the socket straight into the decoder")
+        fd = conn.fileno()
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        header = bytearray(V1_HEADER.size)
+        number = 0
+        while self.running:
+            started = self.splice_read_header(conn, header)
+            if started is None:
+                logger.info("Connection closed by peer.")
+                return True
+            frame_size = V1_HEADER.unpack(header)[0]
             if frame_size > self.max_frame_size:
-                return 0, 0
-            frame_total = 4 + frame_size
-            if len(buffer) - cursor < frame_total:
+                logger.warning(f"Invalid frame size: {frame_size} - Connection considered corrupt, dropping.")
+                return False
+            self.bytes_received += V1_HEADER.size
+            self.metrics.inc("deskextend_bytes_received_total", V1_HEADER.size, metric_labels)
+
+            remaining = frame_size
+            while remaining and self.running:
+                decoder = self.decoder
+                if decoder is None:
+                    logger.warning("Decoder went away mid-frame, continuing on the copy path")
+                    return self.resume_copy_path(conn, reassembler, remaining)
+                try:
+                    moved = decoder.splice_from(fd, remaining) if poller.poll(100) else None
+                except BrokenPipeError as e:
+                    if not self.recover_decoder(e, None):
+                        logger.error(f"Decoder could not be recovered ({e}) - dropping the connection")
+                        self.is_video_streaming = False
+                        self.show_chromium_kiosk()
+                        return False
+                    return self.resume_copy_path(conn, reassembler, remaining)
+                if moved is None:
+                    continue
+                if moved == 0:
+                    logger.info("Connection closed by peer.")
+                    return True
+                remaining -= moved
+                self.bytes_received += moved
+                self.metrics.inc("deskextend_bytes_received_total", moved, metric_labels)
+            if remaining:
+                continue
+            written = time.monotonic()
+            number += 1
+            self.record_written_frames((StreamFrame((), frame_size, 0, number=number, arrival=written, started=started),), written)
+        return True
+
+    def resume_copy_path(self, conn, reassembler, remaining):
+        if not self.discard_from_connection(conn, remaining):
+            return True
+        reassembler.protocol = PROTOCOL_V1
+        reassembler.classify = classify_access_unit
+        self.awaiting_idr = True
+        logger.info("Resuming on the copy path at the next keyframe")
+        return None
+
+    def splice_read_header(self, conn, header):
+        view = memoryview(header)
+        received = 0
+        started = None
+        while received < len(header):
+            if not self.running:
+                return None
+            try:
+                count = conn.recv_into(view[received:])
+            except socket.timeout:
+                continue
+            if count == 0:
+                return None
+            if started is None:
+                started = time.monotonic()
+            received += count
+        return started
+
+    def discard_from_connection(self, conn, size):
+        scratch = bytearray(min(size, 64 * 1024))
+        while size > 0 and self.running:
+            try:
+                count = conn.recv_into(scratch, min(size, len(scratch)))
+            except socket.timeout:
+                continue
+            if count == 0:
+                return False
+            size -= count
+        return True
+
+    def on_protocol_negotiated(self, conn, reassembler, transport_name, session_stop):
+        if reassembler.protocol != PROTOCOL_V2:
+            logger.info("%s stream uses v1 framing", transport_name)
+            return
+        logger.info("%s stream negotiated v2 framing", transport_name)
+        try:
+            self.send_to_connection(conn, pack_hello(PROTOCOL_V2))
+        except Exception as e:
+            logger.warning(f"Could not acknowledge v2 framing: {e}")
+            return
+
+        if reassembler.hello_flags & HELLO_FLAG_CONTROL:
+            threading.Thread(
+                target=self.run_control_channel,
+                args=(conn, session_stop),
+                daemon=True
+            ).start()
+
+    def run_control_channel(self, conn, session_stop):
+        next_ping = next_feedback = time.monotonic()
+        feedback_state = self.feedback_snapshot()
+        while self.running and not session_stop.is_set():
+            self.control_wakeup.clear()
+            now = time.monotonic()
+            try:
+                next_keyframe_request = self.send_keyframe_request(conn, now)
+                if self.clock_sync_interval > 0 and now >= next_ping:
+                    self.send_to_connection(conn, pack_ping(now))
+                    next_ping = now + self.clock_sync_interval
+                if self.feedback_interval > 0 and now >= next_feedback:
+                    if now > feedback_state["time"]:
+                        feedback_state = self.send_feedback(conn, feedback_state)
+                    next_feedback = now + self.feedback_interval
+            except Exception as e:
+                logger.debug(f"Control channel send failed: {e}")
+                return
+            deadlines = []
+            if self.clock_sync_interval > 0:
+                deadlines.append(next_ping)
+            if self.feedback_interval > 0:
+                deadlines.append(next_feedback)
+            if next_keyframe_request is not None:
+                deadlines.append(next_keyframe_request)
+            timeout = max(0.01, min(deadlines) - time.monotonic()) if deadlines else None
+            self.control_wakeup.wait(timeout)
+
+    def request_keyframe(self, reason):
+        now = time.monotonic()
+        with self.keyframe_lock:
+            if self.recovery_started_at is None:
+                self.recovery_started_at = now
+                self.recovery_reason = reason
+            coalesced = self.keyframe_request_reason is not None
+            if not coalesced:
+                self.keyframe_request_reason = reason
+        if coalesced:
+            self.metrics.inc(
+                "deskextend_keyframe_requests_coalesced_total",
+                1,
+                (*self.stream_metric_labels, ("reason", KEYFRAME_REASONS[reason]))
+            )
+        self.control_wakeup.set()
+
+    def send_keyframe_request(self, conn, now):
+        with self.keyframe_lock:
+            reason = self.keyframe_request_reason
+            if reason is None:
+                return None
+            sent_at = self.keyframe_request_sent_at
+            if sent_at is not None and now < sent_at + self.keyframe_request_interval:
+                return sent_at + self.keyframe_request_interval
+            self.keyframe_request_reason = None
+            self.keyframe_request_sent_at = now
+        reassembler = self.stream_reassembler
+        expected = reassembler.sequence.expected if reassembler else None
+        self.send_to_connection(conn, pack_keyframe_request(reason, expected or 0))
+        self.metrics.inc(
+            "deskextend_keyframe_requests_total",
+            1,
+            (*self.stream_metric_labels, ("reason", KEYFRAME_REASONS[reason]))
+        )
+        logger.info("Requested a keyframe from the sender (%s)", KEYFRAME_REASONS[reason])
+        return None
+
+    def finish_recovery(self, written):
+        with self.keyframe_lock:
+            started = self.recovery_started_at
+            reason = self.recovery_reason
+            self.recovery_started_at = None
+        if started is None:
+            return
+        recovery = written - started
+        self.metrics.observe(
+            "deskextend_keyframe_recovery_seconds",
+            recovery,
+            (*self.stream_metric_labels, ("reason", KEYFRAME_REASONS[reason]))
+        )
+        logger.info("Picture recovered %.0f ms after %s", recovery * 1000, KEYFRAME_REASONS[reason])
+
+    def feedback_snapshot(self):
+        labels = self.stream_metric_labels
+        metrics = self.metrics
+        return {
+            "time": time.monotonic(),
+            "frames": metrics.get("deskextend_frames_written_total", labels),
+            "bytes": metrics.get("deskextend_bytes_received_total", labels),
+            "dropped": sum(
+                metrics.get("deskextend_frames_dropped_total", (*labels, ("reason", reason)))
+                for reason in ("backlog", "overflow", "expired")
+            ),
+        }
+
+    def send_feedback(self, conn, previous):
+        current = self.feedback_snapshot()
+        elapsed = current["time"] - previous["time"]
+        writer = self.decoder_writer
+        reassembler = self.stream_reassembler
+        temperature = self.get_cpu_temp()
+        self.send_to_connection(conn, pack_feedback(
+            writer.depth() if writer else 0,
+            (current["frames"] - previous["frames"]) / elapsed,
+            current["dropped"] - previous["dropped"],
+            (current["bytes"] - previous["bytes"]) * 8 / elapsed / 1000,
+            reassembler.buffered() if reassembler else 0,
+            temperature if temperature else None,
+            elapsed
+        ))
+        self.metrics.inc("deskextend_feedback_reports_total", 1, self.stream_metric_labels)
+        return current
+
+    def handle_control_frame(self, conn, frame):
+        payload = b"".join(frame.segments)
+        message_type, values = unpack_control(payload)
+        if message_type == CONTROL_PONG and values:
+            ping_sent, peer_received, peer_replied = (from_microseconds(value) for value in values)
+            clock = self.clock_sync
+            if clock and clock.add_sample(ping_sent, peer_received, peer_replied, frame.arrival):
+                logger.debug("Clock sync: offset %.3f ms, rtt %.3f ms", clock.offset * 1000, clock.rtt * 1000)
+        elif message_type == CONTROL_PING and values:
+            try:
+                self.send_to_connection(conn, pack_pong(values[0], frame.arrival, time.monotonic()))
+            except Exception as e:
+                logger.debug(f"Clock sync reply failed: {e}")
+
+    def send_to_connection(self, conn, data):
+        with self.connection_send_lock:
+            if self.is_serial_connection(conn):
+                conn.write(data)
+                return
+            conn.sendall(data)
+
+    def flush_sequence_metrics(self, reassembler):
+        tracker = reassembler.sequence
+        gaps, reordered = self.sequence_reported
+        if tracker.gaps > gaps:
+            self.metrics.inc("deskextend_frames_missing_total", tracker.gaps - gaps, self.stream_metric_labels)
+        if tracker.reordered > reordered:
+            self.metrics.inc("deskextend_frames_reordered_total", tracker.reordered - reordered, self.stream_metric_labels)
+        self.sequence_reported = (tracker.gaps, tracker.reordered)
+
+    def recover_decoder(self, error, reassembler, session_stop=None):
+        if not self.running or (session_stop and session_stop.is_set()):
+            logger.info(f"Decoder failed while the session was closing ({error}), not replacing it")
+            return False
+        failed = self.decoder
+        if isinstance(error, DecoderStallError):
+            logger.error(f"Decoder stalled mid-session: {error}")
+        elif isinstance(error, BrokenPipeError):
+            logger.error("Decoder pipe broken mid-session")
+        else:
+            logger.error(f"Decoder write error: {error}")
+        if self.decoder_failovers >= self.max_decoder_failovers:
+            logger.error(f"Decoder failed {self.decoder_failovers + 1} times this session, giving up")
+            return False
+        self.decoder_failovers += 1
+        if self.decoder_stall_started is None:
+            self.decoder_stall_started = time.monotonic() - (failed.stalled_for() if failed else 0.0)
+        if reassembler and (reassembler.classify or reassembler.protocol == PROTOCOL_V2):
+            self.awaiting_idr = True
+        self.request_keyframe(KEYFRAME_REASON_DECODER)
+
+        demote = None
+        if failed:
+            self.metrics.inc(
+                "deskextend_decoder_failovers_total",
+                1,
+                (("pipeline", failed.name), ("backend", failed.backend))
+            )
+            failures = self.session_pipeline_failures.get(failed.name, 0) + 1
+            self.session_pipeline_failures[failed.name] = failures
+            if failures > 1:
+                demote = failed.pipeline_info
+                logger.info(f"{failed.name} failed {failures} times this session, trying other pipelines first")
+
+        with self.decoder_lock:
+            self.stop_decoder()
+            self.decoder_warm = False
+            if not self.running or (session_stop and session_stop.is_set()):
+                return False
+            pipelines = self.detect_decoder_pipeline()
+            if not self.start_decoder(pipelines, demote=demote):
+                return False
+            self.decoder_signature = self.pipeline_signature(pipelines)
+        logger.info(
+            "Decoder replaced by %s %.0f ms after the failure, resuming at the next keyframe",
+            self.decoder_type,
+            (time.monotonic() - self.decoder_stall_started) * 1000
+        )
+        return True
+
+    def run_decoder_watchdog(self, stop_event):
+        interval = min(0.25, self.decoder_stall_timeout / 4)
+        while self.running and not stop_event.wait(interval):
+            decoder = self.decoder
+            if not decoder:
+                continue
+            stalled = decoder.stalled_for()
+            if stalled < self.decoder_stall_timeout:
+                continue
+            logger.error(f"Decoder {decoder.name} made no progress for {stalled:.1f}s, killing it")
+            self.metrics.inc(
+                "deskextend_decoder_stalls_total",
+                1,
+                (("pipeline", decoder.name), ("backend", decoder.backend))
+            )
+            decoder.kill()
+            while self.decoder is decoder and not stop_event.wait(interval):
+                pass
+
+    def finish_decoder_stall(self, written):
+        stall = written - self.decoder_stall_started
+        self.decoder_stall_started = None
+        self.metrics.observe("deskextend_decoder_stall_seconds", stall, self.stream_metric_labels)
+        logger.info("Picture resumed %.0f ms after the decoder failed", stall * 1000)
+
+    def write_frame_to_decoder(self, frame):
+        self.write_frames_to_decoder((frame,))
+
+    def write_frames_to_decoder(self, frames):
+        decoder = self.decoder
+        if not decoder:
+            return
+        blocked = decoder.blocked_seconds
+        write_calls = decoder.write_calls
+        try:
+            for frame in frames:
+                self.prime_decoder(decoder, frame)
+            if len(frames) == 1:
+                decoder.write(frames[0])
+            else:
+                decoder.write_frames(frames)
+        finally:
+            blocked = decoder.blocked_seconds - blocked
+            if blocked > 0:
+                self.metrics.inc("deskextend_decoder_write_blocked_seconds_total", blocked, self.stream_metric_labels)
+            self.metrics.inc("deskextend_decoder_write_calls_total", decoder.write_calls - write_calls, self.stream_metric_labels)
+        self.record_written_frames(frames, time.monotonic())
+
+    def record_written_frames(self, frames, written):
+        self.metrics.inc("deskextend_frames_written_total", len(frames), self.stream_metric_labels)
+        for frame in frames:
+            self.record_frame_latency(frame, written)
+            if frame.kind == FRAME_IDR and self.recovery_started_at is not None:
+                self.finish_recovery(written)
+            if self.decoder_stall_started is not None and frame.kind != FRAME_CONFIG:
+                self.finish_decoder_stall(written)
+            if self.session_started_at is not None:
+                logger.info(
+                    "First frame written %.0f ms after session start (%s decoder)",
+                    (time.monotonic() - self.session_started_at) * 1000,
+                    "warm" if self.decoder_warm else "cold"
+                )
+                self.session_started_at = None
+            self.update_fps()
+
+    def prime_decoder(self, decoder, frame):
+        carries_sps = False
+        if frame.kind not in (FRAME_REF, FRAME_NONREF):
+            carries_sps = self.observe_parameter_sets(frame)
+        if decoder is self.primed_decoder:
+            return
+        self.primed_decoder = decoder
+        parameter_sets = self.parameter_sets
+        if carries_sps or not parameter_sets.ready():
+            return
+        data = parameter_sets.annex_b()
+        decoder.write(StreamFrame((data,), len(data), 0, FRAME_CONFIG))
+        self.metrics.inc("deskextend_parameter_set_injections_total", 1, self.stream_metric_labels)
+        logger.info("Primed %s with cached SPS/PPS (%s)", decoder.name, self.describe_stream_format())
+
+    def observe_parameter_sets(self, frame):
+        head = b""
+        for segment in frame.segments:
+            head += bytes(segment[:PARAMETER_SCAN_BYTES - len(head)])
+            if len(head) >= PARAMETER_SCAN_BYTES:
                 break
-            frame_offsets.append(cursor)
-            cursor += frame_total
+        previous = self.parameter_sets.format
+        carries_sps = self.parameter_sets.observe(head, complete=len(head) == frame.size)
+        if carries_sps and self.parameter_sets.format != previous:
+            if previous is None:
+                logger.info("Cached stream parameter sets: %s", self.describe_stream_format())
+            else:
+                logger.info("Stream format changed, replaced cached parameter sets: %s", self.describe_stream_format())
+        return carries_sps
+
+    def describe_stream_format(self):
+        stream_format = self.parameter_sets.format
+        if not stream_format:
+            return "unparsed SPS"
+        profile, level, width, height = stream_format
+        return f"{width}x{height}, profile {profile}, level {level / 10:.1f}"
+
+    def record_frame_latency(self, frame, written):
+        labels = self.latency_labels
+        if not labels:
+            return
+        total = written - frame.started
+        self.metrics.observe("deskextend_frame_latency_seconds", frame.arrival - frame.started, labels["receive"])
+        self.metrics.observe("deskextend_frame_latency_seconds", written - frame.arrival, labels["write"])
+        self.metrics.observe("deskextend_frame_latency_seconds", total, labels["total"])
+        self.interval_latency.observe(total)
+        clock = self.clock_sync
+        if frame.captured is not None and clock and clock.synchronized():
+            capture = written - clock.to_local(frame.captured)
+            self.metrics.observe("deskextend_frame_latency_seconds", max(0.0, capture), labels["capture"])
+            self.interval_capture_latency.observe(max(0.0, capture))
+
+    @staticmethod
+    def can_request_keyframe(reassembler):
+        return reassembler.protocol == PROTOCOL_V2 and bool(reassembler.hello_flags & HELLO_FLAG_CONTROL)
+
+    def drop_overflow_frame(self, reassembler, frame):
+        if frame.kind in (FRAME_IDR, FRAME_REF) and self.can_request_keyframe(reassembler):
+            self.awaiting_idr = True
+            self.request_keyframe(KEYFRAME_REASON_DROP)
+        self.dropped_frames_for_latency += 1
+        self.metrics.inc("deskextend_frames_dropped_total", 1, (*self.stream_metric_labels, ("reason", "overflow")))
+        reassembler.count_drop(frame)
+
+    def expire_late_frame(self, reassembler, frame):
+        if frame.kind == FRAME_IDR:
+            self.awaiting_idr = False
+            return False
+        if frame.kind == FRAME_CONFIG:
+            return False
 
-        complete_frames = len(frame_offsets)
-        if complete_frames <= keep_frames:
+        if not self.awaiting_idr:
+            if self.max_frame_age <= 0:
+                return False
+            age = time.monotonic() - frame.arrival
+            if age <= self.max_frame_age:
+                return False
+            logger.debug("Frame %d is %.1f ms old (deadline %.1f ms), dropping", frame.number, age * 1000, self.max_frame_age * 1000)
+            if frame.kind == FRAME_REF:
+                self.awaiting_idr = True
+                self.request_keyframe(KEYFRAME_REASON_DROP)
+
+        self.dropped_frames_for_latency += 1
+        self.metrics.inc("deskextend_frames_dropped_total", 1, (*self.stream_metric_labels, ("reason", "expired")))
+        reassembler.count_drop(frame)
+        return True
+
+    def drop_stale_buffer_frames(self, reassembler):
+        if reassembler.buffered() <= self.stream_drop_backlog_bytes:
             return 0, 0
 
-        drop_count = complete_frames - keep_frames
-        new_offset = frame_offsets[drop_count]
+        keep_frames = max(1, self.stream_keep_latest_frames)
+        if reassembler.classify:
+            dropped_bytes, drop_count = reassembler.drop_to_decodable(keep_frames)
+        else:
+            dropped_bytes, drop_count = reassembler.drop_stale(keep_frames)
         if drop_count > 0:
             logger.debug("Dropped %d stale buffered frames to reduce latency", drop_count)
-        return max(0, new_offset - parse_offset), drop_count
+        return dropped_bytes, drop_count
 
     def run_usb(self):
         self.running = True
+        self.wait_for_usb_gadget()
+        if self.usb_function in NETWORK_FUNCTIONS:
+            return self.run_usb_network()
 
         logger.info(f"Starting USB mode on device: {self.usb_device}")
         retry_delay = 1.0
@@ -1414,7 +2483,7 @@ class VideoReceiver:
                     time.sleep(0.5)
                     continue
 
-                self.refresh_usb_devices()
+                self.poll_usb_devices()
 
                 if self.usb_device:
                     opened = self.open_usb()
@@ -1427,7 +2496,7 @@ class VideoReceiver:
                                 break
                         if not opened:
                             logger.warning("Retrying USB connection in 3 seconds...")
-                            time.sleep(retry_delay)
+                            self.wait_for_usb_device(retry_delay)
                             retry_delay = min(max_retry_delay, retry_delay * 1.5)
                             continue
                 else:
@@ -1439,7 +2508,7 @@ class VideoReceiver:
                             break
                     if not opened:
                         logger.warning("No USB device found, retrying in 3 seconds...")
-                        time.sleep(retry_delay)
+                        self.wait_for_usb_device(retry_delay)
                         retry_delay = min(max_retry_delay, retry_delay * 1.5)
                         continue
 
@@ -1455,7 +2524,7 @@ class VideoReceiver:
                         after_delay=5.0
                     )
 
-                    if not self.start_decoder():
+                    if not self.ensure_decoder():
                         self.close_usb()
                         self.show_chromium_kiosk()
                         time.sleep(retry_delay)
@@ -1472,13 +2541,7 @@ class VideoReceiver:
 
                     self.close_usb()
 
-                    if self.decoder_process:
-                        self.decoder_process.terminate()
-                        try:
-                            self.decoder_process.wait(timeout=3)
-                        except subprocess.TimeoutExpired:
-                            self.decoder_process.kill()
-                        self.decoder_process = None
+                    self.finish_decoder_session()
 
                     logger.info("USB connection closed, waiting for next connection...")
                     self.show_chromium_kiosk()
@@ -1514,7 +2577,7 @@ class VideoReceiver:
                     time.sleep(0.5)
                     continue
 
-                self.refresh_usb_devices()
+                self.poll_usb_devices()
 
                 if not self.usb_device and time.time() >= next_usb_scan:
                     devices = self.get_available_usb_devices()
@@ -1558,7 +2621,7 @@ class VideoReceiver:
                                 appear_timeout=3.0,
                                 after_delay=5.0
                             )
-                            if not self.start_decoder():
+                            if not self.ensure_decoder():
                                 self.close_usb()
                                 usb_active = False
                                 self.show_chromium_kiosk()
@@ -1572,13 +2635,7 @@ class VideoReceiver:
                                 self.process_stream(self.serial_conn)
                                 self.close_usb()
                                 usb_active = False
-                                if self.decoder_process:
-                                    self.decoder_process.terminate()
-                                    try:
-                                        self.decoder_process.wait(timeout=3)
-                                    except subprocess.TimeoutExpired:
-                                        self.decoder_process.kill()
-                                    self.decoder_process = None
+                                self.finish_decoder_session()
                                 logger.info("USB connection closed")
                                 self.show_chromium_kiosk()
                                 time.sleep(1)
@@ -1619,7 +2676,7 @@ class VideoReceiver:
 
                         self.configure_client_socket(conn)
 
-                        if not self.start_decoder():
+                        if not self.ensure_decoder():
                             conn.close()
                             self.sock.close()
                             self.show_chromium_kiosk()
@@ -1633,13 +2690,7 @@ class VideoReceiver:
 
                         conn.close()
 
-                        if self.decoder_process:
-                            self.decoder_process.terminate()
-                            try:
-                                self.decoder_process.wait(timeout=3)
-                            except subprocess.TimeoutExpired:
-                                self.decoder_process.kill()
-                            self.decoder_process = None
+                        self.finish_decoder_session()
 
                         self.sock.close()
                         logger.info("Network connection closed")
@@ -1664,6 +2715,7 @@ class VideoReceiver:
     def run(self):
         self.running = True
         self.start_usb_monitor()
+        self.prewarm_decoder()
 
         if self.mode == "usb":
             self.run_usb()
@@ -1690,7 +2742,15 @@ class VideoReceiver:
         usb_thread.join()
         network_thread.join()
 
-    def run_network(self):
+    def run_usb_network(self):
+        address = usb_network_address().split("/")[0]
+        if self.mode != "usb":
+            logger.info(f"USB {self.usb_function.upper()} link at {address} is served by the network listener")
+            return
+        self.host = address
+        self.run_network(transport_name="USB")
+
+    def run_network(self, transport_name="Network"):
         self.running = True
 
         if not self.bind_socket_for_mode(ethernet_only=False):
@@ -1702,7 +2762,7 @@ class VideoReceiver:
 
         while self.running:
             try:
-                if self.is_transport_busy_for("Network"):
+                if self.is_transport_busy_for(transport_name):
                     time.sleep(0.5)
                     continue
 
@@ -1716,7 +2776,7 @@ class VideoReceiver:
                     conn.close()
                     continue
 
-                if not self.try_claim_transport("Network"):
+                if not self.try_claim_transport(transport_name):
                     conn.close()
                     continue
 
@@ -1730,7 +2790,7 @@ class VideoReceiver:
                     self.configure_client_socket(conn)
                     conn.settimeout(5.0)
 
-                    if not self.start_decoder():
+                    if not self.ensure_decoder():
                         conn.close()
                         self.show_chromium_kiosk()
                         continue
@@ -1739,22 +2799,16 @@ class VideoReceiver:
                     self.bytes_received = 0
                     self.last_fps_time = time.time()
 
-                    self.process_stream(conn, forced_transport_name="Network")
+                    self.process_stream(conn, forced_transport_name=transport_name)
 
                     conn.close()
 
-                    if self.decoder_process:
-                        self.decoder_process.terminate()
-                        try:
-                            self.decoder_process.wait(timeout=3)
-                        except subprocess.TimeoutExpired:
-                            self.decoder_process.kill()
-                        self.decoder_process = None
+                    self.finish_decoder_session()
 
-                    logger.info("Network connection closed, waiting for next connection...")
+                    logger.info(f"{transport_name} connection closed, waiting for next connection...")
                     self.show_chromium_kiosk()
                 finally:
-                    self.release_transport("Network")
+                    self.release_transport(transport_name)
 
             except socket.timeout:
                 continue
@@ -1803,7 +2857,7 @@ class VideoReceiver:
                     self.configure_client_socket(conn)
                     conn.settimeout(5.0)
 
-                    if not self.start_decoder():
+                    if not self.ensure_decoder():
                         conn.close()
                         self.show_chromium_kiosk()
                         continue
@@ -1815,13 +2869,7 @@ class VideoReceiver:
                     self.process_stream(conn, forced_transport_name="Ethernet")
                     conn.close()
 
-                    if self.decoder_process:
-                        self.decoder_process.terminate()
-                        try:
-                            self.decoder_process.wait(timeout=3)
-                        except subprocess.TimeoutExpired:
-                            self.decoder_process.kill()
-                        self.decoder_process = None
+                    self.finish_decoder_session()
 
                     logger.info("Ethernet connection closed, waiting for next connection...")
                     self.show_chromium_kiosk()
@@ -1839,15 +2887,17 @@ class VideoReceiver:
     def stop(self):
         self.running = False
 
-        if self.decoder_process:
-            self.decoder_process.terminate()
-            try:
-                self.decoder_process.wait(timeout=3)
-            except subprocess.TimeoutExpired:
-                self.decoder_process.kill()
+        writer = self.decoder_writer
+        if writer:
+            writer.stop()
+
+        self.stop_decoder()
 
         self.stop_chromium_kiosk()
 
+        if self.display_watcher:
+            self.display_watcher.stop()
+
         if self.sock:
             self.sock.close()
 
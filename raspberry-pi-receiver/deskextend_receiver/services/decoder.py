@@ -0,0 +1,471 @@
+import fcntl
+import logging
+import os
+import select
+import subprocess
+import threading
+import time
+from collections import deque
+
+try:
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+except Exception:
+    gi = None
+    Gst = None
+
+logger = logging.getLogger(__name__)
+
+READY_TIMEOUT = 2.0
+READY_GRACE = 0.1
+READY_MARKERS = (
+    "Pipeline is PREROLLING",
+    "Pipeline is PREROLLED",
+    "Pipeline is live",
+    "Setting pipeline to PLAYING",
+)
+QOS_DROP_MARKERS = (
+    "buffers are being dropped",
+    "computer is too slow",
+)
+
+WRITE_POLL_INTERVAL_MS = 50
+IOV_MAX = 1024
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+PIPE_MAX_SIZE_PATH = "/proc/sys/fs/pipe-max-size"
+
+APPSRC_NAME = "deskextend_src"
+APPSRC_CAPS = "video/x-h264,stream-format=byte-stream,alignment=au"
+APPSRC_MAX_BYTES = 1024 * 1024
+
+
+class DecoderStallError(BrokenPipeError):
+    pass
+
+
+def launch_description(cmd, max_bytes=APPSRC_MAX_BYTES):
+    elements = list(cmd)
+    if elements and elements[0] == "gst-launch-1.0":
+        elements = elements[1:]
+    while elements and elements[0].startswith("-"):
+        elements = elements[1:]
+    if elements[:2] == ["fdsrc", "fd=0"]:
+        elements = [
+            "appsrc",
+            f"name={APPSRC_NAME}",
+            "is-live=true",
+            "do-timestamp=true",
+            "format=time",
+            "block=true",
+            f"max-bytes={max_bytes}",
+            f"caps={APPSRC_CAPS}",
+            *elements[2:]
+        ]
+    return " ".join(elements)
+
+
+def replace_sink(cmd, sink):
+    if "!" not in cmd:
+        return list(cmd)
+    last_link = len(cmd) - 1 - cmd[::-1].index("!")
+    return [*cmd[:last_link + 1], *sink.split(), "sync=false"]
+
+
+def gstreamer_available():
+    return Gst is not None
+
+
+def set_pipe_size(fd, size):
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError:
+        try:
+            with open(PIPE_MAX_SIZE_PATH, "r") as f:
+                limit = int(f.read().strip())
+            if limit < size:
+                fcntl.fcntl(fd, F_SETPIPE_SZ, limit)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Could not resize decoder pipe to {size} bytes: {e}")
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except OSError:
+        return None
+
+
+class SubprocessDecoder:
+    backend = "subprocess"
+
+    def __init__(self, pipeline_info, env=None, pipe_size=0):
+        self.name = pipeline_info["name"]
+        self.pipeline_info = pipeline_info
+        self.cmd = pipeline_info["cmd"]
+        self.env = env
+        self.pipe_size = pipe_size
+        self.pipe_capacity = None
+        self.write_calls = 0
+        self.process = None
+        self.ready = threading.Event()
+        self.error_lines = deque(maxlen=20)
+        self.qos_dropped = 0
+        self.poller = None
+        self.blocked_since = None
+        self.blocked_seconds = 0.0
+        self.stalled = False
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def start(self, settle_time=READY_TIMEOUT):
+        self.launch()
+        return self.wait_ready(settle_time)
+
+    def launch(self):
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env,
+            bufsize=0
+        )
+        os.set_blocking(self.process.stdin.fileno(), False)
+        if self.pipe_size > 0:
+            self.pipe_capacity = set_pipe_size(self.process.stdin.fileno(), self.pipe_size)
+        self.poller = select.poll()
+        self.poller.register(self.process.stdin.fileno(), select.POLLOUT)
+        threading.Thread(target=self.monitor_output, daemon=True).start()
+        threading.Thread(target=self.monitor_errors, daemon=True).start()
+
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.process.poll() is None:
+            if self.ready.wait(min(0.02, max(0.0, deadline - time.monotonic()))):
+                time.sleep(READY_GRACE)
+                break
+
+        if self.process.poll() is None:
+            return True
+        time.sleep(0.05)
+        logger.warning(f"Failed: {' | '.join(self.error_lines)[:200]}")
+        return False
+
+    def monitor_output(self):
+        process = self.process
+        while process and process.stdout:
+            try:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8", errors="ignore")
+                if any(marker in line for marker in READY_MARKERS):
+                    self.ready.set()
+                self.count_qos_drop(line)
+            except Exception:
+                break
+
+    def count_qos_drop(self, line):
+        if any(marker in line for marker in QOS_DROP_MARKERS):
+            self.qos_dropped += 1
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame):
+        self.write_segments(frame.segments)
+
+    def write_frames(self, frames):
+        self.write_segments([segment for frame in frames for segment in frame.segments])
+
+    def write_segments(self, segments):
+        fd = self.process.stdin.fileno()
+        pending = [memoryview(segment) for segment in segments if len(segment)]
+        index = 0
+        while index < len(pending):
+            try:
+                written = os.writev(fd, pending[index:index + IOV_MAX])
+            except BlockingIOError:
+                written = 0
+            except BrokenPipeError:
+                if self.stalled:
+                    raise DecoderStallError(f"{self.name} was killed after making no progress") from None
+                raise
+            self.write_calls += 1
+            if not written:
+                self.wait_writable()
+                continue
+            self.blocked_since = None
+            while written:
+                remaining = len(pending[index])
+                if written < remaining:
+                    pending[index] = pending[index][written:]
+                    break
+                written -= remaining
+                index += 1
+
+    def splice_from(self, fd, count):
+        try:
+            moved = os.splice(fd, self.process.stdin.fileno(), count, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        except BlockingIOError:
+            self.wait_writable()
+            return None
+        except BrokenPipeError:
+            if self.stalled:
+                raise DecoderStallError(f"{self.name} was killed after making no progress") from None
+            raise
+        self.write_calls += 1
+        if moved:
+            self.blocked_since = None
+        return moved
+
+    def wait_writable(self):
+        started = time.monotonic()
+        if self.blocked_since is None:
+            self.blocked_since = started
+        try:
+            while not self.poller.poll(WRITE_POLL_INTERVAL_MS):
+                if self.stalled:
+                    raise DecoderStallError(f"{self.name} was killed after making no progress")
+                if self.process.poll() is not None:
+                    raise BrokenPipeError(f"{self.name} exited with code {self.process.returncode}")
+        finally:
+            self.blocked_seconds += time.monotonic() - started
+
+    def stalled_for(self):
+        blocked_since = self.blocked_since
+        return time.monotonic() - blocked_since if blocked_since is not None else 0.0
+
+    def kill(self):
+        self.stalled = True
+        if self.process:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+
+    def monitor_errors(self):
+        process = self.process
+        while process and process.stderr:
+            try:
+                line = process.stderr.readline()
+                if not line:
+                    break
+
+                line = line.decode("utf-8", errors="ignore").strip()
+                if line:
+                    self.error_lines.append(line)
+                    self.count_qos_drop(line)
+                if line and ("ERROR" in line or "WARN" in line):
+                    logger.warning(f"GStreamer: {line}")
+            except Exception:
+                break
+
+    def stop(self, timeout=3.0):
+        if not self.process:
+            return
+        try:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        except Exception:
+            pass
+
+
+class AppSrcDecoder:
+    backend = "appsrc"
+
+    def __init__(self, pipeline_info, env=None, max_bytes=APPSRC_MAX_BYTES):
+        self.name = pipeline_info["name"]
+        self.pipeline_info = pipeline_info
+        self.cmd = pipeline_info["cmd"]
+        self.description = launch_description(self.cmd, max_bytes)
+        self.pipeline = None
+        self.appsrc = None
+        self.bus_thread = None
+        self.running = False
+        self.playing = threading.Event()
+        self.error = None
+        self.qos_processed = 0
+        self.qos_dropped = 0
+        self.latency_ns = 0
+        self.blocked_since = None
+        self.blocked_seconds = 0.0
+        self.write_calls = 0
+        self.stalled = False
+
+    @property
+    def pid(self):
+        return None
+
+    def start(self, settle_time=READY_TIMEOUT):
+        self.launch()
+        return self.wait_ready(settle_time)
+
+    def launch(self):
+        if Gst is None:
+            raise RuntimeError("PyGObject/GStreamer not available for in-process decoding")
+        if not Gst.is_initialized():
+            Gst.init(None)
+
+        self.pipeline = Gst.parse_launch(self.description)
+        self.appsrc = self.pipeline.get_by_name(APPSRC_NAME)
+        if self.appsrc is None:
+            self.pipeline = None
+            raise RuntimeError(f"Pipeline has no appsrc element: {self.description}")
+
+        self.running = True
+        self.bus_thread = threading.Thread(target=self.watch_bus, daemon=True)
+        self.bus_thread.start()
+
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            self.error = self.error or "state change to PLAYING failed"
+
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + max(timeout, 0.1)
+        while time.monotonic() < deadline and not self.error and not self.playing.is_set():
+            self.playing.wait(0.05)
+
+        if self.error or not self.playing.is_set():
+            logger.warning(f"Failed: {self.error or 'pipeline did not reach PLAYING'}")
+            self.stop()
+            return False
+        return True
+
+    def is_alive(self):
+        return self.running and self.error is None
+
+    def write(self, frame):
+        if not self.is_alive():
+            raise BrokenPipeError(self.error or "in-process decoder stopped")
+        buffer = self.make_buffer(frame)
+        started = time.monotonic()
+        self.blocked_since = started
+        try:
+            result = self.appsrc.emit("push-buffer", buffer)
+        finally:
+            self.blocked_since = None
+            self.blocked_seconds += time.monotonic() - started
+        self.write_calls += 1
+        if result != Gst.FlowReturn.OK:
+            if self.stalled:
+                raise DecoderStallError(f"{self.name} was killed after making no progress")
+            raise BrokenPipeError(f"appsrc push-buffer returned {result.value_nick}")
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    @staticmethod
+    def make_buffer(frame):
+        buffer = Gst.Buffer.new_allocate(None, frame.size, None)
+        mapped, info = buffer.map(Gst.MapFlags.WRITE)
+        if mapped:
+            try:
+                target = info.data
+                if isinstance(target, memoryview) and not target.readonly:
+                    offset = 0
+                    for segment in frame.segments:
+                        target[offset:offset + len(segment)] = segment
+                        offset += len(segment)
+                    return buffer
+            finally:
+                buffer.unmap(info)
+        return Gst.Buffer.new_wrapped(b"".join(frame.segments))
+
+    def watch_bus(self):
+        bus = self.pipeline.get_bus()
+        mask = (
+            Gst.MessageType.ERROR
+            | Gst.MessageType.WARNING
+            | Gst.MessageType.EOS
+            | Gst.MessageType.QOS
+            | Gst.MessageType.LATENCY
+            | Gst.MessageType.STATE_CHANGED
+        )
+        while self.running:
+            message = bus.timed_pop_filtered(100 * Gst.MSECOND, mask)
+            if message is None:
+                continue
+            try:
+                self.handle_message(message)
+            except Exception as e:
+                logger.debug(f"Bus message handling failed: {e}")
+
+    def handle_message(self, message):
+        message_type = message.type
+        if message_type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            self.error = error.message
+            logger.warning(f"GStreamer: ERROR {error.message} ({debug})")
+        elif message_type == Gst.MessageType.WARNING:
+            warning, debug = message.parse_warning()
+            logger.warning(f"GStreamer: WARN {warning.message}")
+        elif message_type == Gst.MessageType.EOS:
+            self.error = "end of stream"
+        elif message_type == Gst.MessageType.QOS:
+            _, processed, dropped = message.parse_qos_stats()
+            self.qos_processed = max(self.qos_processed, processed)
+            self.qos_dropped = max(self.qos_dropped, dropped)
+        elif message_type == Gst.MessageType.LATENCY:
+            self.pipeline.recalculate_latency()
+            query = Gst.Query.new_latency()
+            if self.pipeline.query(query):
+                _, min_latency, _ = query.parse_latency()
+                self.latency_ns = min_latency
+        elif message_type == Gst.MessageType.STATE_CHANGED:
+            if message.src == self.pipeline:
+                _, new_state, _ = message.parse_state_changed()
+                if new_state == Gst.State.PLAYING:
+                    self.playing.set()
+
+    def stalled_for(self):
+        blocked_since = self.blocked_since
+        return time.monotonic() - blocked_since if blocked_since is not None else 0.0
+
+    def kill(self):
+        self.stalled = True
+        self.stop(timeout=0.5)
+
+    def stop(self, timeout=3.0):
+        self.running = False
+        if self.pipeline is not None:
+            try:
+                self.pipeline.set_state(Gst.State.NULL)
+            except Exception:
+                pass
+        if self.bus_thread and self.bus_thread is not threading.current_thread():
+            self.bus_thread.join(timeout=timeout)
+        self.pipeline = None
+        self.appsrc = None
+
+
+def create_decoder(pipeline_info, backend="subprocess", env=None, pipe_size=0):
+    if backend == "appsrc":
+        return AppSrcDecoder(pipeline_info, env=env, max_bytes=pipe_size or APPSRC_MAX_BYTES)
+    return SubprocessDecoder(pipeline_info, env=env, pipe_size=pipe_size)
+
+
+def probe_decoders(decoders, timeout=READY_TIMEOUT):
+    launched = []
+    for decoder in decoders:
+        try:
+            decoder.launch()
+            launched.append(decoder)
+        except Exception as e:
+            logger.warning(f"Failed to launch {decoder.name}: {e}")
+
+    results = []
+    deadline = time.monotonic() + timeout
+    for decoder in decoders:
+        if decoder not in launched:
+            results.append((decoder, False))
+            continue
+        results.append((decoder, decoder.wait_ready(max(0.0, deadline - time.monotonic()))))
+
+    for decoder in launched:
+        decoder.stop()
+    return results
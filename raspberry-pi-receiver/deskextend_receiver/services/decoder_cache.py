@@ -0,0 +1,126 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from ..utils.display import DRM_ROOT, get_screen_resolution, has_vaapi_sink, read_connectors, x_display_available
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_DIR_PATTERNS = [
+    "/usr/lib/gstreamer-1.0",
+    "/usr/lib/*/gstreamer-1.0",
+    "/usr/local/lib/gstreamer-1.0",
+    "/usr/local/lib/*/gstreamer-1.0",
+]
+
+STATUS_OK = "ok"
+STATUS_BROKEN = "broken"
+BROKEN_TTL = 3600.0
+
+
+def default_cache_dir():
+    configured = os.environ.get("DESKEXTEND_CACHE_DIR", "").strip()
+    if configured:
+        return configured
+    return os.path.join(os.path.expanduser("~"), ".cache", "deskextend")
+
+
+def _mtime(path):
+    try:
+        return int(os.stat(path).st_mtime)
+    except OSError:
+        return None
+
+
+def gstreamer_fingerprint():
+    paths = set(glob.glob(os.path.join(os.path.expanduser("~"), ".cache", "gstreamer-1.0", "registry.*.bin")))
+    if os.environ.get("GST_REGISTRY"):
+        paths.add(os.environ["GST_REGISTRY"])
+    for pattern in PLUGIN_DIR_PATTERNS:
+        paths.update(glob.glob(pattern))
+    for path in os.environ.get("GST_PLUGIN_PATH", "").split(os.pathsep):
+        if path:
+            paths.add(path)
+    return [[path, _mtime(path)] for path in sorted(paths)]
+
+
+def display_fingerprint(drm_root=DRM_ROOT):
+    connectors = [[name, status, mode] for name, (status, mode) in sorted(read_connectors(drm_root).items())]
+    return {"display": os.environ.get("DISPLAY", ""), "x_server": x_display_available(), "connectors": connectors}
+
+
+def pipeline_key(pipeline_info, backend):
+    return f"{backend}:{' '.join(pipeline_info['cmd'])}"
+
+
+class DecoderCapabilityCache:
+    def __init__(self, path=None, broken_ttl=BROKEN_TTL):
+        self.path = path or os.path.join(default_cache_dir(), "decoder-capabilities.json")
+        self.broken_ttl = broken_ttl
+        self.lock = threading.Lock()
+        self.data = None
+
+    def fingerprint(self):
+        return {"gstreamer": gstreamer_fingerprint(), "display": display_fingerprint()}
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.data, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write decoder capability cache {self.path}: {e}")
+
+    def capabilities(self):
+        with self.lock:
+            fingerprint = self.fingerprint()
+            if self.data is None:
+                self.data = self.load()
+            if self.data and self.data.get("fingerprint") == fingerprint:
+                return self.data
+
+            if self.data:
+                logger.info("GStreamer plugins or display mode changed, re-probing decoder capabilities")
+            screen_res = get_screen_resolution()
+            self.data = {
+                "fingerprint": fingerprint,
+                "vaapi_sink": has_vaapi_sink(),
+                "screen_resolution": list(screen_res) if screen_res else None,
+                "pipelines": {},
+            }
+            self.save()
+            return self.data
+
+    def pipeline_status(self, pipeline_info, backend):
+        with self.lock:
+            if not self.data:
+                return None
+            entry = self.data["pipelines"].get(pipeline_key(pipeline_info, backend))
+            if not isinstance(entry, dict):
+                return None
+            if entry["status"] == STATUS_BROKEN and time.time() - entry["checked"] > self.broken_ttl:
+                return None
+            return entry["status"]
+
+    def record(self, pipeline_info, backend, status):
+        with self.lock:
+            if not self.data:
+                return
+            key = pipeline_key(pipeline_info, backend)
+            entry = self.data["pipelines"].get(key)
+            if status == STATUS_OK and isinstance(entry, dict) and entry["status"] == STATUS_OK:
+                return
+            self.data["pipelines"][key] = {"status": status, "checked": time.time()}
+            self.save()
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class DecoderWriter:
+    def __init__(self, reassembler, write_frame, max_frames=30, should_drop=None, on_overflow=None, on_error=None,
+                 max_recovery_frames=0, write_batch=None, max_batch_frames=1):
+        self.reassembler = reassembler
+        self.write_frame = write_frame
+        self.write_batch = write_batch
+        self.max_batch_frames = max(1, int(max_batch_frames))
+        self.max_frames = max(1, int(max_frames))
+        self.max_recovery_frames = max(self.max_frames, int(max_recovery_frames))
+        self.should_drop = should_drop
+        self.on_overflow = on_overflow
+        self.on_error = on_error
+        self.recovering = False
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.error = None
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frames_expired = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=3.0, drain=False):
+        with self.condition:
+            if drain:
+                end_time = time.monotonic() + timeout
+                while self.running and self.queue and time.monotonic() < end_time:
+                    self.condition.wait(0.1)
+            self.running = False
+            self.condition.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        with self.condition:
+            while self.queue:
+                frame, _ = self.queue.popleft()
+                self.reassembler.release(frame)
+
+    def depth(self):
+        return len(self.queue)
+
+    def push(self, frame):
+        with self.condition:
+            if len(self.queue) >= (self.max_recovery_frames if self.recovering else self.max_frames):
+                self._drop_oldest()
+            self.queue.append((frame, time.monotonic()))
+            if len(self.queue) > self.max_depth:
+                self.max_depth = len(self.queue)
+            self.condition.notify_all()
+
+    def make_room(self, timeout=0.1):
+        with self.condition:
+            if self.queue:
+                self._drop_oldest()
+                return True
+            self.condition.wait(timeout)
+        return False
+
+    def reset_stats(self):
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frames_expired = 0
+        self.batches = 0
+        self.max_depth = len(self.queue)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def recover(self, error):
+        if not self.on_error or not self.running:
+            return False
+        self.recovering = True
+        try:
+            return self.on_error(error)
+        except Exception as e:
+            logger.error(f"Decoder recovery failed: {e}")
+            return False
+        finally:
+            self.recovering = False
+
+    def _drop_oldest(self):
+        frame, _ = self.queue.popleft()
+        self.frames_dropped += 1
+        logger.debug("Decoder queue full, dropped frame %d", frame.number)
+        if self.on_overflow:
+            self.on_overflow(frame)
+        self.reassembler.release(frame)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait(0.5)
+                if not self.running:
+                    return
+                batch = [self.queue.popleft()]
+                while self.queue and len(batch) < self.max_batch_frames:
+                    batch.append(self.queue.popleft())
+
+            now = time.monotonic()
+            for _, queued_at in batch:
+                waited = now - queued_at
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+
+            try:
+                frames = []
+                for frame, _ in batch:
+                    if self.should_drop and self.should_drop(frame):
+                        self.frames_expired += 1
+                    else:
+                        frames.append(frame)
+                if len(frames) > 1 and self.write_batch:
+                    self.write_batch(frames)
+                    self.batches += 1
+                else:
+                    for frame in frames:
+                        self.write_frame(frame)
+                self.frames_written += len(frames)
+            except Exception as e:
+                if not self.recover(e):
+                    self.error = e
+                    self.running = False
+            finally:
+                for frame, _ in batch:
+                    self.reassembler.release(frame)
+                with self.condition:
+                    self.condition.notify_all()
+
+            if self.error:
+                return
@@ -15,10 +15,12 @@ def install_dependencies():
     ]
 
     optional_deps = [
-        "xrandr",
         "wmctrl",
         "chromium",
-        "unclutter"
+        "unclutter",
+        "python3-gi",
+        "gir1.2-gstreamer-1.0",
+        "python3-gst-1.0"
     ]
 
     try:
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+from .decoder_cache import default_cache_dir, pipeline_key
+
+logger = logging.getLogger(__name__)
+
+MIN_SCORED_SECONDS = 30.0
+CPU_WEIGHT = 0.25
+
+
+def process_cpu_seconds(pid=None):
+    if not psutil:
+        return None
+    try:
+        times = psutil.Process(pid).cpu_times() if pid else psutil.Process().cpu_times()
+        return times.user + times.system
+    except Exception:
+        return None
+
+
+def delivered_ratio(entry):
+    frames = entry.get("frames", 0)
+    offered = frames + entry.get("late_frames", 0)
+    if not offered:
+        return None
+    return max(0, frames - entry.get("dropped_buffers", 0)) / offered
+
+
+def score_entry(entry, cpu_count=None):
+    seconds = entry.get("seconds", 0.0)
+    if seconds < MIN_SCORED_SECONDS:
+        return None
+    delivered = delivered_ratio(entry) or 0.0
+    restart_rate = entry.get("restarts", 0) / max(1, entry.get("sessions", 0))
+    cpu_load = 0.0
+    if entry.get("cpu_seconds_sampled", 0.0) > 0:
+        cores = cpu_count or os.cpu_count() or 1
+        cpu_load = min(1.0, entry["cpu_seconds"] / entry["cpu_seconds_sampled"] / cores)
+    return 100.0 * delivered * (1.0 - CPU_WEIGHT * cpu_load) / (1.0 + restart_rate)
+
+
+class PipelineScoreboard:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), "pipeline-scores.json")
+        self.lock = threading.Lock()
+        self.entries = self.load()
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data.get("pipelines", {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"pipelines": self.entries}
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write pipeline scores {self.path}: {e}")
+
+    def _entry(self, pipeline_info, backend):
+        key = pipeline_key(pipeline_info, backend)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = {
+                "name": pipeline_info["name"],
+                "backend": backend,
+                "sessions": 0,
+                "frames": 0,
+                "seconds": 0.0,
+                "dropped_buffers": 0,
+                "late_frames": 0,
+                "restarts": 0,
+                "cpu_seconds": 0.0,
+                "cpu_seconds_sampled": 0.0,
+                "last_used": 0,
+            }
+            self.entries[key] = entry
+        self.dirty = True
+        return entry
+
+    def record_session(self, pipeline_info, backend):
+        with self.lock:
+            entry = self._entry(pipeline_info, backend)
+            entry["sessions"] += 1
+            entry["last_used"] = int(time.time())
+
+    def record_sample(self, pipeline_info, backend, frames, seconds, dropped_buffers=0, cpu_seconds=None, late_frames=0):
+        with self.lock:
+            entry = self._entry(pipeline_info, backend)
+            entry["frames"] += frames
+            entry["seconds"] += seconds
+            entry["dropped_buffers"] += dropped_buffers
+            entry["late_frames"] = entry.get("late_frames", 0) + late_frames
+            if cpu_seconds is not None:
+                entry["cpu_seconds"] += cpu_seconds
+                entry["cpu_seconds_sampled"] += seconds
+
+    def record_restart(self, pipeline_info, backend):
+        with self.lock:
+            entry = self._entry(pipeline_info, backend)
+            entry["restarts"] += 1
+
+    def score(self, pipeline_info, backend):
+        with self.lock:
+            entry = self.entries.get(pipeline_key(pipeline_info, backend))
+            return score_entry(entry) if entry else None
+
+    def rank(self, pipelines, backend):
+        scores = [self.score(pipeline_info, backend) for pipeline_info in pipelines]
+        if all(score is None for score in scores):
+            return list(pipelines)
+        order = sorted(
+            range(len(pipelines)),
+            key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i)
+        )
+        return [pipelines[i] for i in order]
+
+    def summary(self):
+        with self.lock:
+            items = []
+            for key, entry in self.entries.items():
+                seconds = entry.get("seconds", 0.0)
+                delivered = delivered_ratio(entry)
+                score = score_entry(entry)
+                items.append({
+                    "key": key,
+                    "name": entry.get("name"),
+                    "backend": entry.get("backend"),
+                    "sessions": entry.get("sessions", 0),
+                    "restarts": entry.get("restarts", 0),
+                    "seconds": round(seconds, 1),
+                    "fps": round(entry.get("frames", 0) / seconds, 1) if seconds else 0.0,
+                    "dropped_buffers": entry.get("dropped_buffers", 0),
+                    "late_frames": entry.get("late_frames", 0),
+                    "delivered_percent": round(delivered * 100, 1) if delivered is not None else None,
+                    "cpu_percent": round(entry["cpu_seconds"] / entry["cpu_seconds_sampled"] * 100, 1)
+                    if entry.get("cpu_seconds_sampled") else None,
+                    "score": round(score, 2) if score is not None else None,
+                    "last_used": entry.get("last_used", 0),
+                })
+            items.sort(key=lambda item: (item["score"] is None, -(item["score"] or 0.0)))
+            return items
@@ -1,4 +1,5 @@
 import os
+import struct
 import subprocess
 import time
 import logging
@@ -7,11 +8,52 @@ logger = logging.getLogger(__name__)
 
 CONFIGFS_MOUNT = "/sys/kernel/config"
 GADGET_NAME = "deskextend"
-GADGET_DIR = f"{CONFIGFS_MOUNT}/usb_gadget/{GADGET_NAME}"
-CONFIG_DIR = f"{GADGET_DIR}/configs/c.1"
-FUNC_DIR = f"{GADGET_DIR}/functions/acm.usb0"
-STRINGS_DIR = f"{GADGET_DIR}/strings/0x409"
-CONFIG_STRINGS_DIR = f"{CONFIG_DIR}/strings/0x409"
+FFS_NAME = "deskextend"
+FFS_MOUNT = f"/dev/ffs-{FFS_NAME}"
+DEFAULT_USB_ADDRESS = "10.55.0.1/24"
+
+FUNCTIONS = {
+    "acm": {"instance": "acm.usb0", "module": "usb_f_acm", "configuration": "CDC ACM", "device_class": "0x02"},
+    "ncm": {"instance": "ncm.usb0", "module": "usb_f_ncm", "configuration": "CDC NCM", "device_class": "0x02"},
+    "ecm": {"instance": "ecm.usb0", "module": "usb_f_ecm", "configuration": "CDC ECM", "device_class": "0x02"},
+    "ffs": {"instance": f"ffs.{FFS_NAME}", "module": "usb_f_fs", "configuration": "DeskExtend Bulk", "device_class": "0x00"},
+}
+NETWORK_FUNCTIONS = ("ncm", "ecm")
+
+FUNCTIONFS_DESCRIPTORS_MAGIC_V2 = 3
+FUNCTIONFS_STRINGS_MAGIC = 2
+FUNCTIONFS_HAS_FS_DESC = 1
+FUNCTIONFS_HAS_HS_DESC = 2
+INTERFACE_DESCRIPTOR = struct.Struct("<BBBBBBBBB")
+ENDPOINT_DESCRIPTOR = struct.Struct("<BBBBHB")
+ENDPOINT_OUT = 0x01
+ENDPOINT_IN = 0x82
+FFS_INTERFACE_NAME = "DeskExtend Stream"
+
+_ffs_ep0 = None
+
+
+def usb_function_name(function=None):
+    name = (function or os.environ.get("DESKEXTEND_USB_FUNCTION", "acm")).strip().lower()
+    if name not in FUNCTIONS:
+        raise ValueError(f"Unknown USB gadget function '{name}' (expected one of: {', '.join(FUNCTIONS)})")
+    return name
+
+
+def usb_network_address():
+    return os.environ.get("DESKEXTEND_USB_ADDRESS", DEFAULT_USB_ADDRESS).strip()
+
+
+def gadget_dirs(configfs_root=CONFIGFS_MOUNT):
+    gadget_dir = os.path.join(configfs_root, "usb_gadget", GADGET_NAME)
+    config_dir = os.path.join(gadget_dir, "configs", "c.1")
+    return {
+        "gadget": gadget_dir,
+        "config": config_dir,
+        "functions": os.path.join(gadget_dir, "functions"),
+        "strings": os.path.join(gadget_dir, "strings", "0x409"),
+        "config_strings": os.path.join(config_dir, "strings", "0x409"),
+    }
 
 
 def _write(path, value):
@@ -19,6 +61,14 @@ def _write(path, value):
         file_handle.write(f"{value}\n")
 
 
+def _read(path):
+    try:
+        with open(path) as file_handle:
+            return file_handle.read().strip()
+    except OSError:
+        return None
+
+
 def _ensure_configfs():
     if os.path.exists(CONFIGFS_MOUNT):
         return True
@@ -27,20 +77,31 @@ def _ensure_configfs():
     return os.path.exists(CONFIGFS_MOUNT)
 
 
-def _cleanup_existing_gadget():
-    if not os.path.isdir(GADGET_DIR):
+def _cleanup_existing_gadget(configfs_root=CONFIGFS_MOUNT, ffs_mount=FFS_MOUNT):
+    global _ffs_ep0
+    dirs = gadget_dirs(configfs_root)
+    if not os.path.isdir(dirs["gadget"]):
         return
     try:
-        udc_path = os.path.join(GADGET_DIR, "UDC")
+        udc_path = os.path.join(dirs["gadget"], "UDC")
         if os.path.exists(udc_path):
             _write(udc_path, "")
         time.sleep(0.2)
 
-        symlink_path = os.path.join(CONFIG_DIR, "acm.usb0")
-        if os.path.islink(symlink_path):
-            os.unlink(symlink_path)
+        function_paths = []
+        for spec in FUNCTIONS.values():
+            symlink_path = os.path.join(dirs["config"], spec["instance"])
+            if os.path.islink(symlink_path):
+                os.unlink(symlink_path)
+            function_paths.append(os.path.join(dirs["functions"], spec["instance"]))
+
+        if _ffs_ep0 is not None:
+            os.close(_ffs_ep0)
+            _ffs_ep0 = None
+        if os.path.ismount(ffs_mount):
+            subprocess.run(["umount", ffs_mount], check=False)
 
-        for path in [CONFIG_STRINGS_DIR, FUNC_DIR, CONFIG_DIR, STRINGS_DIR, GADGET_DIR]:
+        for path in [dirs["config_strings"], *function_paths, dirs["config"], dirs["strings"], dirs["gadget"]]:
             if os.path.isdir(path):
                 try:
                     os.rmdir(path)
@@ -50,6 +111,107 @@ def _cleanup_existing_gadget():
         logger.warning("USB gadget cleanup warning: %s", error)
 
 
+def gadget_attributes(function, configfs_root=CONFIGFS_MOUNT):
+    spec = FUNCTIONS[function]
+    dirs = gadget_dirs(configfs_root)
+    device_serial = os.environ.get("DESKEXTEND_NAME", "RaspberryPi")
+    return [
+        (os.path.join(dirs["gadget"], "idVendor"), "0x0525"),
+        (os.path.join(dirs["gadget"], "idProduct"), "0xa4a7"),
+        (os.path.join(dirs["gadget"], "bcdDevice"), "0x0100"),
+        (os.path.join(dirs["gadget"], "bcdUSB"), "0x0200"),
+        (os.path.join(dirs["gadget"], "bDeviceClass"), spec["device_class"]),
+        (os.path.join(dirs["gadget"], "bDeviceSubClass"), "0x00"),
+        (os.path.join(dirs["gadget"], "bDeviceProtocol"), "0x00"),
+        (os.path.join(dirs["strings"], "manufacturer"), "DeskExtend"),
+        (os.path.join(dirs["strings"], "product"), "DeskExtend Receiver"),
+        (os.path.join(dirs["strings"], "serialnumber"), f"DeskExtend-{device_serial}"),
+        (os.path.join(dirs["config"], "MaxPower"), "250"),
+        (os.path.join(dirs["config_strings"], "configuration"), spec["configuration"]),
+    ]
+
+
+def gadget_matches(function, configfs_root=CONFIGFS_MOUNT):
+    dirs = gadget_dirs(configfs_root)
+    if not os.path.isdir(dirs["gadget"]):
+        return False
+    if not _read(os.path.join(dirs["gadget"], "UDC")):
+        return False
+    for path, value in gadget_attributes(function, configfs_root):
+        if _read(path) != value:
+            return False
+    instance = FUNCTIONS[function]["instance"]
+    try:
+        links = [name for name in os.listdir(dirs["config"]) if os.path.islink(os.path.join(dirs["config"], name))]
+    except OSError:
+        return False
+    if links != [instance]:
+        return False
+    return os.path.realpath(os.path.join(dirs["config"], instance)) == os.path.realpath(
+        os.path.join(dirs["functions"], instance)
+    )
+
+
+def build_gadget_tree(function="acm", configfs_root=CONFIGFS_MOUNT):
+    spec = FUNCTIONS[function]
+    dirs = gadget_dirs(configfs_root)
+    for path, value in gadget_attributes(function, configfs_root):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, value)
+
+    function_dir = os.path.join(dirs["functions"], spec["instance"])
+    os.makedirs(function_dir, exist_ok=True)
+
+    function_link = os.path.join(dirs["config"], spec["instance"])
+    if not os.path.lexists(function_link):
+        os.symlink(function_dir, function_link)
+
+    return function_dir
+
+
+def functionfs_descriptors():
+    def interface(max_packet):
+        return (
+            INTERFACE_DESCRIPTOR.pack(INTERFACE_DESCRIPTOR.size, 4, 0, 0, 2, 0xFF, 0, 0, 1)
+            + ENDPOINT_DESCRIPTOR.pack(ENDPOINT_DESCRIPTOR.size, 5, ENDPOINT_OUT, 2, max_packet, 0)
+            + ENDPOINT_DESCRIPTOR.pack(ENDPOINT_DESCRIPTOR.size, 5, ENDPOINT_IN, 2, max_packet, 0)
+        )
+
+    body = struct.pack("<II", 3, 3) + interface(64) + interface(512)
+    header = struct.pack(
+        "<III",
+        FUNCTIONFS_DESCRIPTORS_MAGIC_V2,
+        12 + len(body),
+        FUNCTIONFS_HAS_FS_DESC | FUNCTIONFS_HAS_HS_DESC
+    )
+    return header + body
+
+
+def functionfs_strings():
+    body = struct.pack("<IIH", 1, 1, 0x0409) + FFS_INTERFACE_NAME.encode() + b"\0"
+    return struct.pack("<II", FUNCTIONFS_STRINGS_MAGIC, 8 + len(body)) + body
+
+
+def _start_functionfs(mount=FFS_MOUNT):
+    global _ffs_ep0
+    os.makedirs(mount, exist_ok=True)
+    if not os.path.ismount(mount):
+        result = subprocess.run(["mount", "-t", "functionfs", FFS_NAME, mount], check=False)
+        if result.returncode != 0:
+            logger.error("Could not mount FunctionFS at %s", mount)
+            return False
+    ep0 = os.open(os.path.join(mount, "ep0"), os.O_RDWR)
+    try:
+        os.write(ep0, functionfs_descriptors())
+        os.write(ep0, functionfs_strings())
+    except OSError as error:
+        os.close(ep0)
+        logger.error("Writing FunctionFS descriptors failed: %s", error)
+        return False
+    _ffs_ep0 = ep0
+    return True
+
+
 def _pick_udc(timeout=10.0):
     end_time = time.time() + timeout
     while time.time() < end_time:
@@ -63,72 +225,91 @@ def _pick_udc(timeout=10.0):
     return None
 
 
-def _wait_for_gadget_tty(timeout=8.0):
+def _wait_for_path(path, timeout=8.0):
     end_time = time.time() + timeout
     while time.time() < end_time:
-        if os.path.exists("/dev/ttyGS0"):
+        if os.path.exists(path):
             return True
         time.sleep(0.2)
     return False
 
 
-def setup_usb_gadget():
-    if os.geteuid() != 0:
-        print("USB gadget setup requires root privileges. Run with: sudo python3 receiver.py --setup-usb")
-        return False
+def _function_ready(function, function_dir):
+    if function in NETWORK_FUNCTIONS:
+        ifname = _read(os.path.join(function_dir, "ifname"))
+        return bool(ifname) and os.path.exists(f"/sys/class/net/{ifname}")
+    if function == "ffs":
+        return _ffs_ep0 is not None
+    return os.path.exists("/dev/ttyGS0")
 
-    if not _ensure_configfs():
-        logger.error("ConfigFS is not available. Ensure CONFIG_USB_GADGET and CONFIG_CONFIGFS_FS are enabled.")
-        return False
 
-    try:
-        subprocess.run(["modprobe", "libcomposite"], check=False)
-        subprocess.run(["modprobe", "dwc2"], check=False)
-        subprocess.run(["modprobe", "usb_f_acm"], check=False)
-    except Exception:
-        pass
+def _configure_usb_network(function_dir, address):
+    ifname = _read(os.path.join(function_dir, "ifname"))
+    if not ifname or not _wait_for_path(f"/sys/class/net/{ifname}"):
+        logger.error("USB gadget configured but its network interface did not appear")
+        return False
+    if address:
+        subprocess.run(["ip", "addr", "replace", address, "dev", ifname], check=False)
+    subprocess.run(["ip", "link", "set", ifname, "up"], check=False)
+    logger.info("USB network interface %s ready (%s)", ifname, address or "no address")
+    return True
 
-    _cleanup_existing_gadget()
 
+def setup_usb_gadget(function=None, configfs_root=CONFIGFS_MOUNT, udc=None, ffs_mount=FFS_MOUNT):
     try:
-        os.makedirs(GADGET_DIR, exist_ok=True)
+        function = usb_function_name(function)
+    except ValueError as error:
+        logger.error("%s", error)
+        return False
 
-        _write(os.path.join(GADGET_DIR, "idVendor"), "0x0525")
-        _write(os.path.join(GADGET_DIR, "idProduct"), "0xa4a7")
-        _write(os.path.join(GADGET_DIR, "bcdDevice"), "0x0100")
-        _write(os.path.join(GADGET_DIR, "bcdUSB"), "0x0200")
-        _write(os.path.join(GADGET_DIR, "bDeviceClass"), "0x02")
-        _write(os.path.join(GADGET_DIR, "bDeviceSubClass"), "0x00")
-        _write(os.path.join(GADGET_DIR, "bDeviceProtocol"), "0x00")
+    if configfs_root == CONFIGFS_MOUNT:
+        if os.geteuid() != 0:
+            print("USB gadget setup requires root privileges. Run with: sudo python3 receiver.py --setup-usb")
+            return False
 
-        os.makedirs(STRINGS_DIR, exist_ok=True)
-        _write(os.path.join(STRINGS_DIR, "manufacturer"), "DeskExtend")
-        _write(os.path.join(STRINGS_DIR, "product"), "DeskExtend Receiver")
+        if not _ensure_configfs():
+            logger.error("ConfigFS is not available. Ensure CONFIG_USB_GADGET and CONFIG_CONFIGFS_FS are enabled.")
+            return False
 
-        device_serial = os.environ.get("DESKEXTEND_NAME", "RaspberryPi")
-        _write(os.path.join(STRINGS_DIR, "serialnumber"), f"DeskExtend-{device_serial}")
+    function_dir = os.path.join(gadget_dirs(configfs_root)["functions"], FUNCTIONS[function]["instance"])
+    if gadget_matches(function, configfs_root) and _function_ready(function, function_dir):
+        logger.info("USB gadget (%s) already configured and bound, skipping rebuild", function)
+        if function in NETWORK_FUNCTIONS:
+            return _configure_usb_network(function_dir, usb_network_address())
+        return True
 
-        os.makedirs(CONFIG_DIR, exist_ok=True)
-        _write(os.path.join(CONFIG_DIR, "MaxPower"), "250")
+    if configfs_root == CONFIGFS_MOUNT:
+        try:
+            subprocess.run(["modprobe", "libcomposite"], check=False)
+            subprocess.run(["modprobe", "dwc2"], check=False)
+            subprocess.run(["modprobe", FUNCTIONS[function]["module"]], check=False)
+        except Exception:
+            pass
 
-        os.makedirs(CONFIG_STRINGS_DIR, exist_ok=True)
-        _write(os.path.join(CONFIG_STRINGS_DIR, "configuration"), "CDC ACM")
+    _cleanup_existing_gadget(configfs_root, ffs_mount)
 
-        os.makedirs(FUNC_DIR, exist_ok=True)
+    try:
+        function_dir = build_gadget_tree(function, configfs_root)
 
-        function_link = os.path.join(CONFIG_DIR, "acm.usb0")
-        if not os.path.exists(function_link):
-            os.symlink(FUNC_DIR, function_link)
+        if function == "ffs" and not _start_functionfs(ffs_mount):
+            return False
 
-        udc_device = _pick_udc(timeout=10.0)
+        udc_device = udc or _pick_udc(timeout=10.0)
         if not udc_device:
             logger.error("Cannot find USB device controller in /sys/class/udc")
             return False
 
-        _write(os.path.join(GADGET_DIR, "UDC"), udc_device)
-        logger.info("USB gadget configured and bound to UDC: %s", udc_device)
+        _write(os.path.join(gadget_dirs(configfs_root)["gadget"], "UDC"), udc_device)
+        logger.info("USB gadget (%s) configured and bound to UDC: %s", function, udc_device)
+
+        if function in NETWORK_FUNCTIONS:
+            return _configure_usb_network(function_dir, usb_network_address())
+
+        if function == "ffs":
+            logger.info("FunctionFS bulk endpoints ready in %s", ffs_mount)
+            return True
 
-        if not _wait_for_gadget_tty(timeout=8.0):
+        if not _wait_for_path("/dev/ttyGS0", timeout=8.0):
             logger.error("USB gadget configured but /dev/ttyGS0 did not appear")
             return False
 
@@ -0,0 +1,28 @@
+import threading
+from collections import deque
+
+
+class ClockSync:
+    def __init__(self, window=8):
+        self.samples = deque(maxlen=max(1, int(window)))
+        self.lock = threading.Lock()
+        self.offset = None
+        self.rtt = None
+        self.sample_count = 0
+
+    def add_sample(self, sent_at, peer_received_at, peer_replied_at, received_at):
+        rtt = (received_at - sent_at) - (peer_replied_at - peer_received_at)
+        if rtt < 0:
+            return False
+        offset = ((peer_received_at - sent_at) + (peer_replied_at - received_at)) / 2
+        with self.lock:
+            self.samples.append((rtt, offset))
+            self.rtt, self.offset = min(self.samples)
+            self.sample_count += 1
+        return True
+
+    def synchronized(self):
+        return self.offset is not None
+
+    def to_local(self, peer_time):
+        return peer_time - self.offset
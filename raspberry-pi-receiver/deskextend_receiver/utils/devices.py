@@ -2,21 +2,22 @@ import glob
 import os
 
 
-def detect_all_devices():
+def detect_all_devices(root="/dev"):
     ordered = []
     seen = set()
 
-    preferred = ["/dev/ttyGS0"]
+    preferred = [os.path.join(root, "ttyGS0")]
+    preferred.extend(os.path.dirname(path) for path in sorted(glob.glob(os.path.join(root, "ffs-*", "ep1"))))
     for path in preferred:
         if os.path.exists(path) and path not in seen:
             seen.add(path)
             ordered.append(path)
 
     primary_patterns = [
-        "/dev/serial/by-id/*",
-        "/dev/ttyGS*",
-        "/dev/ttyACM*",
-        "/dev/ttyUSB*"
+        os.path.join(root, "serial", "by-id", "*"),
+        os.path.join(root, "ttyGS*"),
+        os.path.join(root, "ttyACM*"),
+        os.path.join(root, "ttyUSB*")
     ]
 
     for pattern in primary_patterns:
@@ -1,29 +1,163 @@
+import glob
 import os
+import re
+import select
+import socket
 import subprocess
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+DRM_ROOT = "/sys/class/drm"
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 64 * 1024
+MODE_PATTERN = re.compile(r"(\d+)x(\d+)")
 
-def get_screen_resolution():
-    try:
-        result = subprocess.run(
-            r"xrandr | grep '\*' | tr -s ' ' | cut -d' ' -f2",
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            resolution = result.stdout.strip().split("\n")[0]
-            if "x" in resolution:
-                width, height = resolution.split("x")
-                return int(width), int(height)
-    except Exception as e:
-        logger.warning(f"Failed to get screen resolution: {e}")
+
+def read_connectors(drm_root=DRM_ROOT):
+    connectors = {}
+    for status_path in sorted(glob.glob(os.path.join(drm_root, "*", "status"))):
+        connector_dir = os.path.dirname(status_path)
+        try:
+            with open(status_path, "r") as f:
+                status = f.read().strip()
+        except OSError:
+            continue
+        mode = ""
+        if status == "connected":
+            try:
+                with open(os.path.join(connector_dir, "modes"), "r") as f:
+                    mode = f.readline().strip()
+            except OSError:
+                pass
+        connectors[os.path.basename(connector_dir)] = (status, mode)
+    return connectors
+
+
+def connected_resolution(connectors):
+    for name in sorted(connectors):
+        status, mode = connectors[name]
+        match = MODE_PATTERN.match(mode) if status == "connected" else None
+        if match:
+            return int(match.group(1)), int(match.group(2))
     return None
 
 
+def x_display_available(display=None):
+    display = display if display is not None else os.environ.get("DISPLAY", ":0")
+    match = re.match(r"^(?:unix)?:(\d+)", display)
+    if not match:
+        return False
+    return os.path.exists(f"/tmp/.X11-unix/X{match.group(1)}")
+
+
+def parse_uevent(data):
+    fields = data.split(b"\0")
+    if not fields or fields[0].startswith(b"libudev"):
+        return None
+    event = {}
+    for field in fields[1:]:
+        key, separator, value = field.partition(b"=")
+        if separator:
+            event[key.decode(errors="replace")] = value.decode(errors="replace")
+    return event
+
+
+class DrmConnectorWatcher:
+    def __init__(self, on_change, drm_root=DRM_ROOT, rescan_interval=60.0):
+        self.on_change = on_change
+        self.drm_root = drm_root
+        self.rescan_interval = rescan_interval
+        self.connectors = read_connectors(drm_root)
+        self.sock = None
+        self.thread = None
+        self.running = False
+        self.uevents = 0
+
+    def open_socket(self):
+        if not hasattr(socket, "AF_NETLINK"):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+        except OSError as e:
+            logger.warning(f"DRM uevents unavailable ({e}), rescanning connectors every {self.rescan_interval:.0f}s")
+            return None
+        return sock
+
+    def refresh(self):
+        connectors = read_connectors(self.drm_root)
+        if connectors == self.connectors:
+            return False
+        self.connectors = connectors
+        self.on_change(connectors)
+        return True
+
+    def handle_uevent(self, data):
+        event = parse_uevent(data)
+        if not event or event.get("SUBSYSTEM") != "drm":
+            return False
+        self.uevents += 1
+        return self.refresh()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.sock = self.open_socket()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                sock = self.sock
+                if sock is None:
+                    ready = []
+                    time.sleep(self.rescan_interval)
+                else:
+                    ready, _, _ = select.select([sock], [], [], self.rescan_interval)
+                if not self.running:
+                    break
+                if ready:
+                    self.handle_uevent(sock.recv(UEVENT_BUFFER_SIZE))
+                else:
+                    self.refresh()
+            except Exception as e:
+                if not self.running:
+                    break
+                logger.warning(f"DRM connector watcher error: {e}")
+                time.sleep(1.0)
+
+    def stop(self):
+        self.running = False
+        sock, self.sock = self.sock, None
+        if sock:
+            sock.close()
+
+
+def read_preferred_mode(drm_root=DRM_ROOT):
+    for status_path in sorted(glob.glob(os.path.join(drm_root, "*", "status"))):
+        try:
+            with open(status_path, "r") as f:
+                if f.read().strip() == "disconnected":
+                    continue
+            with open(os.path.join(os.path.dirname(status_path), "modes"), "r") as f:
+                match = MODE_PATTERN.match(f.readline().strip())
+        except OSError:
+            continue
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    return None
+
+
+def get_screen_resolution(drm_root=DRM_ROOT):
+    return connected_resolution(read_connectors(drm_root)) or read_preferred_mode(drm_root)
+
+
 def has_vaapi_sink():
     try:
         result = subprocess.run(
@@ -0,0 +1,185 @@
+import struct
+
+from .h264 import FRAME_CONFIG, FRAME_IDR, FRAME_NONREF, FRAME_REF, FRAME_UNKNOWN
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+
+V1_HEADER = struct.Struct(">I")
+V2_HEADER = struct.Struct(">IIBBH")
+HELLO = struct.Struct(">4sBBH")
+HELLO_MAGIC = b"DXS2"
+HELLO_FLAG_CONTROL = 0x01
+
+FLAG_KEYFRAME = 0x01
+FLAG_DISCARDABLE = 0x02
+FLAG_CONFIG = 0x04
+FLAG_TIMESTAMP = 0x08
+FLAG_CONTROL = 0x10
+
+TIMESTAMP = struct.Struct(">Q")
+
+CONTROL_PING = 1
+CONTROL_PONG = 2
+CONTROL_FEEDBACK = 3
+CONTROL_KEYFRAME_REQUEST = 4
+
+KEYFRAME_REASON_DROP = 1
+KEYFRAME_REASON_DECODER = 2
+KEYFRAME_REASON_SESSION = 3
+KEYFRAME_REASONS = {
+    KEYFRAME_REASON_DROP: "drop",
+    KEYFRAME_REASON_DECODER: "decoder",
+    KEYFRAME_REASON_SESSION: "session",
+}
+
+PING = struct.Struct(">BQ")
+PONG = struct.Struct(">BQQQ")
+FEEDBACK = struct.Struct(">BHHHIIhH")
+KEYFRAME_REQUEST = struct.Struct(">BBI")
+FEEDBACK_FIELDS = (
+    "queue_depth",
+    "decode_fps",
+    "dropped_frames",
+    "receive_kbps",
+    "buffered_bytes",
+    "cpu_temp",
+    "interval_ms",
+)
+TEMPERATURE_UNKNOWN = -32768
+
+SEQUENCE_MASK = 0xFFFFFFFF
+SEQUENCE_HALF = 0x80000000
+
+
+def pack_hello(version=PROTOCOL_V2, flags=0):
+    return HELLO.pack(HELLO_MAGIC, version, flags, 0)
+
+
+def unpack_hello(data):
+    magic, version, flags, _ = HELLO.unpack(data)
+    if magic != HELLO_MAGIC:
+        return None
+    return version, flags
+
+
+def pack_v1_frame(payload):
+    return V1_HEADER.pack(len(payload)) + payload
+
+
+def pack_v2_frame(payload, sequence, flags=0, extension=b""):
+    return V2_HEADER.pack(len(payload), sequence & SEQUENCE_MASK, flags, len(extension), 0) + extension + payload
+
+
+def to_microseconds(seconds):
+    return int(seconds * 1_000_000) & 0xFFFFFFFFFFFFFFFF
+
+
+def from_microseconds(value):
+    return value / 1_000_000
+
+
+def pack_timestamp(seconds):
+    return TIMESTAMP.pack(to_microseconds(seconds))
+
+
+def pack_control(payload):
+    return pack_v2_frame(payload, 0, FLAG_CONTROL)
+
+
+def pack_ping(sent_at):
+    return pack_control(PING.pack(CONTROL_PING, to_microseconds(sent_at)))
+
+
+def pack_pong(ping_sent_us, received_at, replied_at):
+    return pack_control(PONG.pack(CONTROL_PONG, ping_sent_us, to_microseconds(received_at), to_microseconds(replied_at)))
+
+
+def _clamp(value, limit):
+    return max(0, min(int(value), limit))
+
+
+def pack_feedback(queue_depth, decode_fps, dropped_frames, receive_kbps, buffered_bytes, cpu_temp, interval):
+    temperature = TEMPERATURE_UNKNOWN if cpu_temp is None else max(-32767, min(int(cpu_temp * 10), 32767))
+    return pack_control(FEEDBACK.pack(
+        CONTROL_FEEDBACK,
+        _clamp(queue_depth, 0xFFFF),
+        _clamp(decode_fps * 100, 0xFFFF),
+        _clamp(dropped_frames, 0xFFFF),
+        _clamp(receive_kbps, 0xFFFFFFFF),
+        _clamp(buffered_bytes, 0xFFFFFFFF),
+        temperature,
+        _clamp(interval * 1000, 0xFFFF)
+    ))
+
+
+def feedback_report(values):
+    report = dict(zip(FEEDBACK_FIELDS, values))
+    report["decode_fps"] /= 100
+    report["cpu_temp"] = None if report["cpu_temp"] == TEMPERATURE_UNKNOWN else report["cpu_temp"] / 10
+    return report
+
+
+def pack_keyframe_request(reason, sequence=0):
+    return pack_control(KEYFRAME_REQUEST.pack(CONTROL_KEYFRAME_REQUEST, reason, sequence & SEQUENCE_MASK))
+
+
+def unpack_control(payload):
+    if not payload:
+        return None, ()
+    message_type = payload[0]
+    if message_type == CONTROL_PING and len(payload) >= PING.size:
+        return message_type, PING.unpack_from(payload)[1:]
+    if message_type == CONTROL_PONG and len(payload) >= PONG.size:
+        return message_type, PONG.unpack_from(payload)[1:]
+    if message_type == CONTROL_FEEDBACK and len(payload) >= FEEDBACK.size:
+        return message_type, FEEDBACK.unpack_from(payload)[1:]
+    if message_type == CONTROL_KEYFRAME_REQUEST and len(payload) >= KEYFRAME_REQUEST.size:
+        return message_type, KEYFRAME_REQUEST.unpack_from(payload)[1:]
+    return message_type, ()
+
+
+def frame_kind(flags):
+    if flags & FLAG_CONTROL:
+        return FRAME_UNKNOWN
+    if flags & FLAG_KEYFRAME:
+        return FRAME_IDR
+    if flags & FLAG_CONFIG:
+        return FRAME_CONFIG
+    if flags & FLAG_DISCARDABLE:
+        return FRAME_NONREF
+    return FRAME_REF
+
+
+def kind_flags(kind):
+    if kind == FRAME_IDR:
+        return FLAG_KEYFRAME | FLAG_CONFIG
+    if kind == FRAME_CONFIG:
+        return FLAG_CONFIG
+    if kind == FRAME_NONREF:
+        return FLAG_DISCARDABLE
+    return 0
+
+
+class SequenceTracker:
+    def __init__(self):
+        self.expected = None
+        self.received = 0
+        self.gaps = 0
+        self.lost = 0
+        self.reordered = 0
+
+    def observe(self, sequence):
+        self.received += 1
+        if self.expected is None:
+            self.expected = (sequence + 1) & SEQUENCE_MASK
+            return
+        gap = (sequence - self.expected) & SEQUENCE_MASK
+        if gap < SEQUENCE_HALF:
+            self.gaps += gap
+            self.lost += gap
+            self.expected = (sequence + 1) & SEQUENCE_MASK
+        else:
+            self.reordered += 1
+            if self.lost:
+                self.lost -= 1
@@ -0,0 +1,195 @@
+START_CODE = b"\x00\x00\x01"
+
+NAL_SLICE = 1
+NAL_IDR = 5
+NAL_SPS = 7
+NAL_PPS = 8
+
+FRAME_UNKNOWN = 0
+FRAME_IDR = 1
+FRAME_REF = 2
+FRAME_NONREF = 3
+FRAME_CONFIG = 4
+
+FRAME_TYPE_NAMES = {
+    FRAME_UNKNOWN: "unknown",
+    FRAME_IDR: "idr",
+    FRAME_REF: "ref",
+    FRAME_NONREF: "nonref",
+    FRAME_CONFIG: "config",
+}
+
+
+def iter_nal_headers(data, start=0, end=None):
+    if end is None:
+        end = len(data)
+    cursor = data.find(START_CODE, start, end)
+    while cursor != -1 and cursor + 3 < end:
+        header = data[cursor + 3]
+        yield cursor + 3, header
+        cursor = data.find(START_CODE, cursor + 4, end)
+
+
+def classify_access_unit(data, start=0, end=None):
+    has_config = False
+    for _, header in iter_nal_headers(data, start, end):
+        nal_type = header & 0x1F
+        if nal_type == NAL_IDR:
+            return FRAME_IDR
+        if nal_type == NAL_SLICE:
+            return FRAME_REF if header & 0x60 else FRAME_NONREF
+        if nal_type in (NAL_SPS, NAL_PPS):
+            has_config = True
+    return FRAME_CONFIG if has_config else FRAME_UNKNOWN
+
+
+HIGH_PROFILES = (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135)
+PARAMETER_SCAN_BYTES = 4096
+ANNEX_B_START = b"\x00\x00\x00\x01"
+
+
+def iter_nal_units(data, start=0, end=None):
+    if end is None:
+        end = len(data)
+    previous = None
+    for position, header in iter_nal_headers(data, start, end):
+        if previous is not None:
+            yield previous[0], _trim_trailing_zeros(data, previous[0], position - 3), previous[1]
+        previous = (position, header)
+    if previous is not None:
+        yield previous[0], end, previous[1]
+
+
+def _trim_trailing_zeros(data, start, end):
+    while end > start and data[end - 1] == 0:
+        end -= 1
+    return end
+
+
+class BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def bit(self):
+        value = (self.data[self.position >> 3] >> (7 - (self.position & 7))) & 1
+        self.position += 1
+        return value
+
+    def bits(self, count):
+        value = 0
+        for _ in range(count):
+            value = (value << 1) | self.bit()
+        return value
+
+    def ue(self):
+        zeros = 0
+        while not self.bit():
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("invalid exp-Golomb code")
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _skip_scaling_list(reader, size):
+    last = next_scale = 8
+    for _ in range(size):
+        if next_scale:
+            next_scale = (last + reader.se() + 256) % 256
+        last = next_scale or last
+
+
+def parse_sps(nal):
+    try:
+        reader = BitReader(bytes(nal[1:]).replace(b"\x00\x00\x03", b"\x00\x00"))
+        profile = reader.bits(8)
+        reader.bits(8)
+        level = reader.bits(8)
+        reader.ue()
+        chroma_format = 1
+        if profile in HIGH_PROFILES:
+            chroma_format = reader.ue()
+            if chroma_format == 3:
+                reader.bit()
+            reader.ue()
+            reader.ue()
+            reader.bit()
+            if reader.bit():
+                for index in range(12 if chroma_format == 3 else 8):
+                    if reader.bit():
+                        _skip_scaling_list(reader, 16 if index < 6 else 64)
+        reader.ue()
+        poc_type = reader.ue()
+        if poc_type == 0:
+            reader.ue()
+        elif poc_type == 1:
+            reader.bit()
+            reader.se()
+            reader.se()
+            for _ in range(reader.ue()):
+                reader.se()
+        reader.ue()
+        reader.bit()
+        width_mbs = reader.ue() + 1
+        height_units = reader.ue() + 1
+        frame_mbs_only = reader.bit()
+        if not frame_mbs_only:
+            reader.bit()
+        reader.bit()
+        crop = (0, 0, 0, 0)
+        if reader.bit():
+            crop = (reader.ue(), reader.ue(), reader.ue(), reader.ue())
+    except (IndexError, ValueError):
+        return None
+
+    field_factor = 2 - frame_mbs_only
+    crop_x = 1 if chroma_format in (0, 3) else 2
+    crop_y = field_factor * (2 if chroma_format == 1 else 1)
+    width = width_mbs * 16 - crop_x * (crop[0] + crop[1])
+    height = field_factor * height_units * 16 - crop_y * (crop[2] + crop[3])
+    return profile, level, width, height
+
+
+class ParameterSetCache:
+    def __init__(self):
+        self.sps = None
+        self.pps = None
+        self.format = None
+
+    def observe(self, data, complete=True):
+        carries_sps = False
+        units = list(iter_nal_units(data))
+        for index, (start, end, header) in enumerate(units):
+            nal_type = header & 0x1F
+            if nal_type in (NAL_IDR, NAL_SLICE):
+                break
+            if nal_type not in (NAL_SPS, NAL_PPS):
+                continue
+            if not complete and index == len(units) - 1:
+                break
+            nal = bytes(data[start:end])
+            if nal_type == NAL_SPS:
+                carries_sps = True
+                stream_format = parse_sps(nal)
+                if stream_format != self.format:
+                    self.pps = None
+                    self.format = stream_format
+                self.sps = nal
+            else:
+                self.pps = nal
+        return carries_sps
+
+    def ready(self):
+        return self.sps is not None and self.pps is not None
+
+    def clear(self):
+        self.sps = None
+        self.pps = None
+        self.format = None
+
+    def annex_b(self):
+        return ANNEX_B_START + self.sps + ANNEX_B_START + self.pps
@@ -0,0 +1,109 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT = struct.Struct("iIII")
+DEVICE_PREFIXES = ("ttyGS", "ttyACM", "ttyUSB", "ffs-", "serial")
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.inotify_init1
+    _libc.inotify_add_watch
+except (OSError, AttributeError):
+    _libc = None
+
+
+def inotify_available():
+    return _libc is not None and hasattr(select, "poll")
+
+
+class DeviceWatcher:
+    def __init__(self, root="/dev"):
+        if not inotify_available():
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.root = root
+        self.by_id = os.path.join(root, "serial", "by-id")
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.watches = {}
+        self.poller = select.poll()
+        self.poller.register(self.fd, select.POLLIN)
+        self.events = 0
+        self.wakeups = 0
+        self.add_watch(root)
+        self.watch_existing()
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path):
+        descriptor = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if descriptor < 0:
+            if path == self.root:
+                error = ctypes.get_errno()
+                raise OSError(error, f"Cannot watch {path}: {os.strerror(error)}")
+            return False
+        self.watches[descriptor] = path
+        return True
+
+    def watch_existing(self):
+        for path in (os.path.join(self.root, "serial"), self.by_id):
+            if path not in self.watches.values() and os.path.isdir(path):
+                self.add_watch(path)
+
+    def read_events(self):
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + EVENT.size <= len(data):
+                descriptor, mask, _, size = EVENT.unpack_from(data, offset)
+                name = data[offset + EVENT.size:offset + EVENT.size + size].rstrip(b"\0").decode(errors="replace")
+                offset += EVENT.size + size
+                self.events += 1
+                if mask & IN_Q_OVERFLOW:
+                    relevant = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(descriptor, None)
+                    continue
+                if self.watches.get(descriptor) != self.root or name.startswith(DEVICE_PREFIXES):
+                    relevant = True
+        if relevant:
+            self.watch_existing()
+        return relevant
+
+    def wait(self, timeout=None):
+        if self.fd is None:
+            return False
+        events = self.poller.poll(None if timeout is None else timeout * 1000)
+        self.wakeups += 1
+        if not events:
+            return False
+        return self.read_events()
+
+    def close(self):
+        fd, self.fd = self.fd, None
+        if fd is not None:
+            os.close(fd)
@@ -0,0 +1,162 @@
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015,
+    0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0,
+)
+
+RECOVERY_BUCKETS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                if index == len(self.bounds):
+                    return self.max
+                return min(self.bounds[index], self.max)
+        return self.max
+
+    def summary(self, scale=1000.0):
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count * scale, 2) if self.count else 0.0,
+            "p50": round(self.quantile(0.50) * scale, 2),
+            "p95": round(self.quantile(0.95) * scale, 2),
+            "p99": round(self.quantile(0.99) * scale, 2),
+            "max": round(self.max * scale, 2),
+        }
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.descriptions = {}
+        self.values = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def counter(self, name, help_text):
+        self.descriptions[name] = ("counter", help_text)
+
+    def gauge(self, name, help_text):
+        self.descriptions[name] = ("gauge", help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.descriptions[name] = ("histogram", help_text, tuple(buckets))
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.descriptions[name][2]))
+        histogram.observe(value)
+
+    def histogram_summaries(self, name, scale=1000.0):
+        with self.lock:
+            items = [(labels, histogram) for (metric, labels), histogram in self.histograms.items() if metric == name]
+        return [(dict(labels), histogram.summary(scale)) for labels, histogram in sorted(items, key=lambda item: item[0])]
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, labels=()):
+        self.values[(name, labels)] = value
+
+    def get(self, name, labels=()):
+        return self.values.get((name, labels), 0)
+
+    def render(self):
+        for collector in self.collectors:
+            collector()
+        with self.lock:
+            samples = sorted(self.values.items(), key=lambda item: item[0])
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+
+        lines = []
+        current = None
+        for (name, labels), value in samples:
+            if name != current:
+                current = name
+                self._describe(lines, name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        current = None
+        for (name, labels), histogram in histograms:
+            if name != current:
+                current = name
+                self._describe(lines, name)
+            for bound, total in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {total}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _describe(self, lines, name):
+        description = self.descriptions.get(name, ("untyped", ""))
+        if description[1]:
+            lines.append(f"# HELP {name} {description[1]}")
+        lines.append(f"# TYPE {name} {description[0]}")
@@ -0,0 +1,446 @@
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+
+from .framing import (
+    FLAG_CONTROL,
+    FLAG_TIMESTAMP,
+    HELLO,
+    HELLO_MAGIC,
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    TIMESTAMP,
+    V1_HEADER,
+    V2_HEADER,
+    SequenceTracker,
+    frame_kind,
+    from_microseconds,
+)
+from .h264 import FRAME_CONFIG, FRAME_IDR, FRAME_NONREF, FRAME_TYPE_NAMES, FRAME_UNKNOWN
+
+HEADER = V1_HEADER
+MAX_HEADER_SIZE = V2_HEADER.size + 255
+CLASSIFY_WRAPPED_BYTES = 4096
+FRAME_SKIPPED = 0x40
+
+
+class FrameSizeError(ValueError):
+    def __init__(self, frame_size):
+        super().__init__(f"Invalid frame size: {frame_size}")
+        self.frame_size = frame_size
+
+
+class StreamFrame:
+    __slots__ = (
+        "segments", "size", "end", "kind", "number", "sequence", "flags", "captured", "arrival", "started", "released"
+    )
+
+    def __init__(self, segments, size, end, kind=FRAME_UNKNOWN, number=0, arrival=0.0, started=None, sequence=None,
+                 flags=0, captured=None):
+        self.segments = segments
+        self.size = size
+        self.end = end
+        self.kind = kind
+        self.number = number
+        self.sequence = sequence
+        self.flags = flags
+        self.captured = captured
+        self.arrival = arrival
+        self.started = arrival if started is None else started
+        self.released = False
+
+    def release(self):
+        for segment in self.segments:
+            segment.release()
+        self.segments = ()
+
+
+class FrameIndex:
+    COLUMNS = (
+        ("offsets", "q", 0),
+        ("sizes", "q", 0),
+        ("heads", "h", 0),
+        ("kinds", "b", 0),
+        ("sequences", "q", 0),
+        ("flags", "B", 0),
+        ("captures", "d", 0.0),
+        ("arrivals", "d", 0.0),
+        ("starts", "d", 0.0),
+    )
+
+    def __init__(self, capacity=256):
+        self.capacity = max(1, int(capacity))
+        for name, typecode, empty in self.COLUMNS:
+            setattr(self, name, array(typecode, [empty]) * self.capacity)
+        self.head = 0
+        self.count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def first_number(self):
+        return self.total - self.count
+
+    def append(self, offset, size, kind=FRAME_UNKNOWN, arrival=0.0, started=0.0, head=HEADER.size, sequence=0,
+               flags=0, captured=0.0):
+        if self.count == self.capacity:
+            self._grow()
+        slot = (self.head + self.count) % self.capacity
+        self.offsets[slot] = offset
+        self.sizes[slot] = size
+        self.heads[slot] = head
+        self.kinds[slot] = kind
+        self.sequences[slot] = sequence
+        self.flags[slot] = flags
+        self.captures[slot] = captured
+        self.arrivals[slot] = arrival
+        self.starts[slot] = started
+        self.count += 1
+        self.total += 1
+
+    def offset_at(self, position):
+        return self.offsets[(self.head + position) % self.capacity]
+
+    def size_at(self, position):
+        return self.sizes[(self.head + position) % self.capacity]
+
+    def head_at(self, position):
+        return self.heads[(self.head + position) % self.capacity]
+
+    def kind_at(self, position):
+        return self.kinds[(self.head + position) % self.capacity]
+
+    def mark_skipped(self, position):
+        self.kinds[(self.head + position) % self.capacity] |= FRAME_SKIPPED
+
+    def popleft(self):
+        slot = self.head
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+        return (
+            self.offsets[slot],
+            self.sizes[slot],
+            self.heads[slot],
+            self.kinds[slot],
+            self.sequences[slot],
+            self.flags[slot],
+            self.captures[slot],
+            self.arrivals[slot],
+            self.starts[slot],
+        )
+
+    def discard(self, count):
+        count = min(count, self.count)
+        self.head = (self.head + count) % self.capacity
+        self.count -= count
+
+    def _grow(self):
+        order = [(self.head + position) % self.capacity for position in range(self.count)]
+        new_capacity = self.capacity * 2
+        for name, typecode, empty in self.COLUMNS:
+            column = getattr(self, name)
+            grown = array(typecode, [column[slot] for slot in order])
+            grown.extend(array(typecode, [empty]) * (new_capacity - self.count))
+            setattr(self, name, grown)
+        self.capacity = new_capacity
+        self.head = 0
+
+
+class FrameReassembler:
+    def __init__(self, capacity, max_frame_size, classify=None, protocol=None):
+        self.capacity = max(MAX_HEADER_SIZE, int(capacity))
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.release_pos = 0
+        self.scan_pos = 0
+        self.outstanding = deque()
+        self.lock = threading.Lock()
+        self.index = FrameIndex()
+        self.invalid_frame_size = None
+        self.classify = classify
+        self.latest_idr_number = None
+        self.nonref_cursor = 0
+        self.dropped_by_type = {name: 0 for name in FRAME_TYPE_NAMES.values()}
+        self.copied_bytes = 0
+        self.grow_count = 0
+        self.frame_started = None
+        self.protocol = protocol
+        self.hello_flags = 0
+        self.sequence = SequenceTracker()
+
+    def buffered(self):
+        return self.write_pos - self.read_pos
+
+    def complete_frames(self):
+        return len(self.index)
+
+    def pending(self):
+        return len(self.outstanding)
+
+    def free_space(self):
+        return self.capacity - (self.write_pos - self.release_pos)
+
+    def writable(self):
+        with self.lock:
+            if not self.outstanding and self.release_pos == self.write_pos:
+                self.read_pos = self.write_pos = self.release_pos = self.scan_pos = 0
+            free = self.free_space()
+            start = self.write_pos % self.capacity
+            return self.view[start:min(self.capacity, start + max(0, free))]
+
+    def commit(self, size):
+        now = time.monotonic()
+        with self.lock:
+            if self.frame_started is None:
+                self.frame_started = now
+            self.write_pos += size
+            self._index_new_frames(now)
+
+    def write(self, data):
+        data = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            target = self.writable()
+            if not target:
+                raise BufferError("Reassembly buffer is full")
+            size = min(len(target), len(data) - offset)
+            target[:size] = data[offset:offset + size]
+            target.release()
+            self.commit(size)
+            offset += size
+
+    def next_frame(self):
+        with self.lock:
+            while self.index:
+                number = self.index.first_number()
+                start, frame_size, head, kind, sequence, flags, captured, arrival, started = self.index.popleft()
+                self.read_pos = start + head + frame_size
+                if kind & FRAME_SKIPPED:
+                    if not self.outstanding:
+                        self.release_pos = self.read_pos
+                    continue
+                segments = self._segments(start + head, frame_size)
+                if self.protocol != PROTOCOL_V2:
+                    sequence = None
+                frame = StreamFrame(
+                    segments,
+                    frame_size,
+                    self.read_pos,
+                    kind,
+                    number,
+                    arrival,
+                    started,
+                    sequence,
+                    flags,
+                    captured if flags & FLAG_TIMESTAMP else None
+                )
+                self.outstanding.append(frame)
+                return frame
+        if self.invalid_frame_size is not None:
+            raise FrameSizeError(self.invalid_frame_size)
+        return None
+
+    def release(self, frame):
+        frame.release()
+        with self.lock:
+            frame.released = True
+            while self.outstanding and self.outstanding[0].released:
+                self.release_pos = self.outstanding.popleft().end
+            if not self.outstanding:
+                self.release_pos = self.read_pos
+
+    def drop_stale(self, keep_frames):
+        with self.lock:
+            complete = len(self.index)
+            if complete <= keep_frames:
+                return 0, 0
+            return self._discard_leading(complete - keep_frames)
+
+    def drop_to_decodable(self, keep_frames):
+        with self.lock:
+            return self._drop_to_decodable(keep_frames)
+
+    def _drop_to_decodable(self, keep_frames):
+        first_number = self.index.first_number()
+        if self.latest_idr_number is not None and self.latest_idr_number > first_number:
+            target = self.latest_idr_number - first_number
+            if target > 0 and self.index.kind_at(target - 1) == FRAME_CONFIG:
+                target -= 1
+            if target > 0:
+                return self._discard_leading(target)
+
+        dropped_bytes = 0
+        drop_count = 0
+        last_candidate = len(self.index) - max(0, keep_frames)
+        position = max(0, self.nonref_cursor - first_number)
+        while position < last_candidate:
+            if self.index.kind_at(position) == FRAME_NONREF:
+                self.index.mark_skipped(position)
+                self.dropped_by_type[FRAME_TYPE_NAMES[FRAME_NONREF]] += 1
+                dropped_bytes += self.index.head_at(position) + self.index.size_at(position)
+                drop_count += 1
+            position += 1
+        self.nonref_cursor = max(self.nonref_cursor, first_number + position)
+        return dropped_bytes, drop_count
+
+    def _discard_leading(self, count):
+        drop_count = 0
+        for position in range(count):
+            kind = self.index.kind_at(position)
+            if not kind & FRAME_SKIPPED:
+                self.dropped_by_type[FRAME_TYPE_NAMES[kind]] += 1
+                drop_count += 1
+        new_offset = self.index.offset_at(count)
+        self.index.discard(count)
+        dropped_bytes = new_offset - self.read_pos
+        self.read_pos = new_offset
+        if not self.outstanding:
+            self.release_pos = self.read_pos
+        return dropped_bytes, drop_count
+
+    def count_drop(self, frame):
+        self.dropped_by_type[FRAME_TYPE_NAMES[frame.kind]] += 1
+
+    def _index_new_frames(self, arrival):
+        while self.invalid_frame_size is None:
+            if self.protocol is None and not self._detect_protocol():
+                return
+            available = self.write_pos - self.scan_pos
+            sequence = 0
+            flags = 0
+            captured = 0.0
+            if self.protocol == PROTOCOL_V2:
+                if available < V2_HEADER.size:
+                    return
+                frame_size, sequence, flags, extension_size, _ = self._peek(self.scan_pos, V2_HEADER)
+                head = V2_HEADER.size + extension_size
+            else:
+                if available < HEADER.size:
+                    return
+                frame_size = self._peek(self.scan_pos, HEADER)[0]
+                head = HEADER.size
+            if frame_size > self.max_frame_size:
+                self.invalid_frame_size = frame_size
+                return
+            frame_total = head + frame_size
+            if frame_total > self.capacity:
+                self._grow(frame_total)
+            if available < frame_total:
+                return
+            if self.protocol == PROTOCOL_V2:
+                kind = frame_kind(flags)
+                if not flags & FLAG_CONTROL:
+                    self.sequence.observe(sequence)
+                if flags & FLAG_TIMESTAMP and head - V2_HEADER.size >= TIMESTAMP.size:
+                    captured = from_microseconds(self._peek(self.scan_pos + V2_HEADER.size, TIMESTAMP)[0])
+                else:
+                    flags &= ~FLAG_TIMESTAMP
+            elif self.classify:
+                kind = self._classify(self.scan_pos + head, frame_size)
+            else:
+                kind = FRAME_UNKNOWN
+            if kind == FRAME_IDR:
+                self.latest_idr_number = self.index.total
+            self.index.append(
+                self.scan_pos,
+                frame_size,
+                kind,
+                arrival,
+                self.frame_started or arrival,
+                head,
+                sequence,
+                flags,
+                captured
+            )
+            self.scan_pos += frame_total
+            self.frame_started = arrival if self.write_pos > self.scan_pos else None
+
+    def _classify(self, position, size):
+        index = position % self.capacity
+        if index + size <= self.capacity:
+            return self.classify(self.buffer, index, index + size)
+        head = bytearray()
+        for segment in self._segments(position, min(size, CLASSIFY_WRAPPED_BYTES)):
+            head += segment
+            segment.release()
+        return self.classify(head)
+
+    def _detect_protocol(self):
+        available = self.write_pos - self.scan_pos
+        if available < len(HELLO_MAGIC):
+            return False
+        if self._peek_bytes(self.scan_pos, len(HELLO_MAGIC)) != HELLO_MAGIC:
+            self.protocol = PROTOCOL_V1
+            return True
+        if available < HELLO.size:
+            return False
+        _, version, hello_flags, _ = self._peek(self.scan_pos, HELLO)
+        self.protocol = PROTOCOL_V2 if version >= PROTOCOL_V2 else PROTOCOL_V1
+        self.hello_flags = hello_flags
+        self.scan_pos += HELLO.size
+        self.read_pos = self.scan_pos
+        if not self.outstanding:
+            self.release_pos = self.read_pos
+        return True
+
+    def _peek_bytes(self, position, size):
+        index = position % self.capacity
+        if index + size <= self.capacity:
+            return bytes(self.view[index:index + size])
+        head = self.capacity - index
+        return bytes(self.view[index:]) + bytes(self.view[:size - head])
+
+    def _peek(self, position, header):
+        index = position % self.capacity
+        if index + header.size <= self.capacity:
+            return header.unpack_from(self.buffer, index)
+        return header.unpack(self._peek_bytes(position, header.size))
+
+    def _segments(self, position, size):
+        index = position % self.capacity
+        if index + size <= self.capacity:
+            return (self.view[index:index + size],)
+        head = self.capacity - index
+        return (self.view[index:], self.view[:size - head])
+
+    def _grow(self, min_capacity):
+        limit = max(self.max_frame_size + MAX_HEADER_SIZE, min_capacity)
+        if self.capacity >= limit:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+        new_capacity = min(max(new_capacity, self.capacity * 2), limit)
+
+        new_buffer = bytearray(new_capacity)
+        new_view = memoryview(new_buffer)
+        live = self.write_pos - self.release_pos
+        for segment_start, segment in self._ranges(self.release_pos, live):
+            offset = 0
+            while offset < len(segment):
+                index = (segment_start + offset) % new_capacity
+                size = min(len(segment) - offset, new_capacity - index)
+                new_view[index:index + size] = segment[offset:offset + size]
+                offset += size
+            segment.release()
+
+        self.buffer = new_buffer
+        self.view = new_view
+        self.capacity = new_capacity
+        self.copied_bytes += live
+        self.grow_count += 1
+        return True
+
+    def _ranges(self, position, size):
+        ranges = []
+        for segment in self._segments(position, size) if size else ():
+            ranges.append((position, segment))
+            position += len(segment)
+        return ranges
@@ -0,0 +1,292 @@
+import errno
+import os
+import select
+import threading
+import time
+from collections import deque
+
+try:
+    import termios
+except ImportError:
+    termios = None
+
+READ_EVENTS = select.POLLIN | select.POLLPRI
+CLOSED_EVENTS = select.POLLHUP | select.POLLERR | select.POLLNVAL
+CLOSED_ERRNOS = (errno.EIO, errno.ENXIO, errno.ENODEV, errno.EBADF, errno.ESHUTDOWN)
+MAX_READ_SIZE = 64 * 1024
+ENDPOINT_QUEUE_BYTES = 4 * 1024 * 1024
+
+
+def raw_tty_available():
+    return termios is not None and hasattr(select, "poll")
+
+
+def make_raw(fd):
+    iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(fd)
+    iflag &= ~(
+        termios.IGNBRK | termios.BRKINT | termios.PARMRK | termios.ISTRIP
+        | termios.INLCR | termios.IGNCR | termios.ICRNL | termios.IXON | termios.IXOFF
+    )
+    oflag &= ~termios.OPOST
+    lflag &= ~(termios.ECHO | termios.ECHONL | termios.ICANON | termios.ISIG | termios.IEXTEN)
+    cflag &= ~(termios.CSIZE | termios.PARENB | getattr(termios, "CRTSCTS", 0))
+    cflag |= termios.CS8 | termios.CREAD | termios.CLOCAL
+    cc[termios.VMIN] = 1
+    cc[termios.VTIME] = 0
+    termios.tcsetattr(fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, ispeed, ospeed, cc])
+
+
+class RawStream:
+    def __init__(self, path, fd, write_fd=None, timeout=1.0, write_timeout=1.0):
+        self.path = path
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.fd = fd
+        self.write_fd = fd if write_fd is None else write_fd
+        self.reader = select.poll()
+        self.reader.register(self.fd, READ_EVENTS)
+        self.writer = select.poll()
+        self.writer.register(self.write_fd, select.POLLOUT)
+        self.read_calls = 0
+        self.bytes_read = 0
+
+    def fileno(self):
+        return self.fd
+
+    @property
+    def is_open(self):
+        return self.fd is not None
+
+    def readinto(self, buffer):
+        if self.fd is None:
+            return None
+        events = self.reader.poll(None if self.timeout is None else self.timeout * 1000)
+        if not events:
+            return 0
+        try:
+            received = os.readv(self.fd, [buffer])
+        except BlockingIOError:
+            return 0
+        except OSError as e:
+            if e.errno in CLOSED_ERRNOS:
+                return None
+            raise
+        self.read_calls += 1
+        if received == 0:
+            return None if events[0][1] & CLOSED_EVENTS else 0
+        self.bytes_read += received
+        return received
+
+    def read(self, size):
+        buffer = bytearray(size)
+        received = self.readinto(buffer)
+        if received is None:
+            return None
+        return bytes(buffer[:received])
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self.fd is None:
+                raise BrokenPipeError(errno.EPIPE, f"{self.path} is closed")
+            try:
+                written = os.write(self.write_fd, view)
+            except BlockingIOError:
+                written = 0
+            except OSError as e:
+                if e.errno in CLOSED_ERRNOS:
+                    raise BrokenPipeError(e.errno, f"{self.path}: {e.strerror}")
+                raise
+            view = view[written:]
+            if view and not self.writer.poll(self.write_timeout * 1000):
+                raise TimeoutError(f"Write to {self.path} timed out")
+        return len(data)
+
+    def close(self):
+        fd, self.fd = self.fd, None
+        if fd is None:
+            return
+        os.close(fd)
+        if self.write_fd != fd:
+            os.close(self.write_fd)
+
+
+class RawTTY(RawStream):
+    def __init__(self, path, timeout=1.0, write_timeout=1.0):
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            make_raw(fd)
+            termios.tcflush(fd, termios.TCIFLUSH)
+        except Exception:
+            os.close(fd)
+            raise
+        super().__init__(path, fd, timeout=timeout, write_timeout=write_timeout)
+
+
+class FunctionFSEndpoints:
+    def __init__(self, path, max_queued=ENDPOINT_QUEUE_BYTES):
+        self.path = path
+        self.read_fd = os.open(os.path.join(path, "ep1"), os.O_RDONLY)
+        try:
+            self.write_fd = os.open(os.path.join(path, "ep2"), os.O_WRONLY)
+        except Exception:
+            os.close(self.read_fd)
+            raise
+        self.max_queued = max(MAX_READ_SIZE, int(max_queued))
+        self.chunks = deque()
+        self.queued = 0
+        self.writes = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.error = None
+        self.threads = 2
+        threading.Thread(target=self.read_endpoint, daemon=True).start()
+        threading.Thread(target=self.write_endpoint, daemon=True).start()
+
+    def read_endpoint(self):
+        while True:
+            with self.condition:
+                while not self.closed and self.queued >= self.max_queued:
+                    self.condition.wait()
+                if self.closed:
+                    break
+            try:
+                chunk = os.read(self.read_fd, MAX_READ_SIZE)
+            except OSError as e:
+                chunk = b""
+                if e.errno not in CLOSED_ERRNOS:
+                    self.error = e
+            with self.condition:
+                if chunk:
+                    self.chunks.append(memoryview(chunk))
+                    self.queued += len(chunk)
+                else:
+                    self.closed = True
+                self.condition.notify_all()
+        self.finish_thread()
+
+    def write_endpoint(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.writes:
+                    self.condition.wait()
+                if self.closed:
+                    break
+                view, done = self.writes[0]
+            try:
+                written = os.write(self.write_fd, view)
+            except OSError as e:
+                with self.condition:
+                    if e.errno not in CLOSED_ERRNOS:
+                        self.error = e
+                    self.closed = True
+                    self.condition.notify_all()
+                break
+            with self.condition:
+                if written < len(view):
+                    self.writes[0] = (view[written:], done)
+                else:
+                    self.writes.popleft()
+                    done.set()
+        self.finish_thread()
+
+    def finish_thread(self):
+        with self.condition:
+            self.threads -= 1
+            last = self.threads == 0
+            self.condition.notify_all()
+        with _endpoints_lock:
+            if _endpoints.get(self.path) is self:
+                del _endpoints[self.path]
+        if last:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+
+    def readinto(self, buffer, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while not self.chunks and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return 0
+                self.condition.wait(remaining)
+            if not self.chunks:
+                return None
+            target = memoryview(buffer)
+            received = 0
+            while self.chunks and received < len(target):
+                chunk = self.chunks[0]
+                size = min(len(chunk), len(target) - received)
+                target[received:received + size] = chunk[:size]
+                received += size
+                if size == len(chunk):
+                    self.chunks.popleft()
+                else:
+                    self.chunks[0] = chunk[size:]
+            self.queued -= received
+            self.condition.notify_all()
+        return received
+
+    def write(self, data, timeout):
+        done = threading.Event()
+        with self.condition:
+            if self.closed:
+                raise BrokenPipeError(errno.EPIPE, f"{self.path} is closed")
+            self.writes.append((memoryview(data), done))
+            self.condition.notify_all()
+        if not done.wait(timeout):
+            if self.closed:
+                raise BrokenPipeError(errno.EPIPE, f"{self.path} is closed")
+            raise TimeoutError(f"Write to {self.path} timed out")
+
+    def reset(self):
+        with self.condition:
+            self.chunks.clear()
+            self.queued = 0
+            while len(self.writes) > 1:
+                self.writes.pop()[1].set()
+            self.condition.notify_all()
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def functionfs_endpoints(path):
+    with _endpoints_lock:
+        endpoints = _endpoints.get(path)
+        if endpoints is None or endpoints.closed:
+            endpoints = FunctionFSEndpoints(path)
+            _endpoints[path] = endpoints
+        return endpoints
+
+
+class EndpointStream(RawStream):
+    def __init__(self, path, timeout=1.0, write_timeout=1.0):
+        self.endpoints = functionfs_endpoints(path)
+        super().__init__(path, self.endpoints.read_fd, self.endpoints.write_fd, timeout=timeout,
+                         write_timeout=write_timeout)
+
+    def readinto(self, buffer):
+        if self.fd is None:
+            return None
+        received = self.endpoints.readinto(buffer, self.timeout)
+        if received is None:
+            if self.endpoints.error:
+                raise self.endpoints.error
+            return None
+        if received:
+            self.read_calls += 1
+            self.bytes_read += received
+        return received
+
+    def write(self, data):
+        if self.fd is None:
+            raise BrokenPipeError(errno.EPIPE, f"{self.path} is closed")
+        self.endpoints.write(data, self.write_timeout)
+        return len(data)
+
+    def close(self):
+        fd, self.fd = self.fd, None
+        if fd is not None:
+            self.endpoints.reset()
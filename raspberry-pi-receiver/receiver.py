@@ -8,7 +8,7 @@ import sys
 
 from deskextend_receiver.core import VideoReceiver
 from deskextend_receiver.services.deps import install_dependencies
-from deskextend_receiver.services.usb_gadget import setup_usb_gadget
+from deskextend_receiver.services.usb_gadget import FUNCTIONS, NETWORK_FUNCTIONS, setup_usb_gadget, usb_function_name
 from deskextend_receiver.utils.devices import detect_all_devices, detect_usb_device
 
 logger = logging.getLogger(__name__)
@@ -45,6 +45,11 @@ def build_parser():
     parser.add_argument("--host", default="0.0.0.0", help="Bind address (network/ethernet/hybrid/all mode)")
     parser.add_argument("--port", type=int, default=5900, help="TCP port (network/ethernet/hybrid/all mode)")
     parser.add_argument("--usb-device", help="USB serial device path (use /dev/ttyGS0 for Pi gadget mode)")
+    parser.add_argument(
+        "--usb-function",
+        choices=sorted(FUNCTIONS),
+        help="USB gadget function: acm (serial, default), ncm/ecm (IP over USB) or ffs (FunctionFS bulk endpoints)"
+    )
     parser.add_argument("--eth-interface", help="Force Ethernet interface name for ethernet/hybrid mode (e.g. eth0)")
     parser.add_argument("--name", help="Device name for identification (default: RaspberryPi)")
     parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help="Logging verbosity")
@@ -57,6 +62,9 @@ def pick_usb_device(mode, usb_device):
     if mode not in ["usb", "hybrid", "all"] or usb_device:
         return usb_device
 
+    if usb_function_name() in NETWORK_FUNCTIONS:
+        return None
+
     if os.path.exists("/dev/ttyGS0"):
         logger.info("USB gadget mode detected: /dev/ttyGS0")
         return "/dev/ttyGS0"
@@ -96,6 +104,14 @@ def main():
     args = parser.parse_args()
     configure_logging(args.log_level)
 
+    if args.usb_function:
+        os.environ["DESKEXTEND_USB_FUNCTION"] = args.usb_function
+    try:
+        usb_function = usb_function_name()
+    except ValueError as error:
+        print(error)
+        return 2
+
     if args.install:
         install_dependencies()
         return 0
@@ -104,8 +120,10 @@ def main():
         if os.geteuid() != 0:
             print("USB gadget setup requires root privileges. Run with: sudo python3 receiver.py --setup-usb")
             return 1
-        if setup_usb_gadget():
+        if setup_usb_gadget(usb_function):
             print("USB gadget setup complete!")
+            if usb_function == "ffs":
+                print("FunctionFS endpoints stay up only while this process runs; start the receiver in usb or all mode instead")
             return 0
         print("USB gadget setup failed")
         return 1
@@ -141,6 +159,7 @@ def main():
             else:
                 logger.warning("  No explicit interfaces detected; default routing rules apply")
     if args.mode in ["usb", "hybrid", "all"]:
+        logger.info(f"  USB function: {usb_function}")
         logger.info(f"  USB device: {usb_device or 'auto-detect'}")
 
     signal.signal(signal.SIGINT, signal_handler)
@@ -6,6 +6,18 @@ import socket
 import struct
 import time
 
+from deskextend_receiver.utils.framing import (
+    FLAG_CONTROL,
+    HELLO,
+    HELLO_MAGIC,
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    V1_HEADER,
+    V2_HEADER,
+    SequenceTracker,
+    pack_hello,
+    unpack_hello,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +35,35 @@ def recv_exact(conn, size):
     return bytes(chunk)
 
 
+def read_frame_header(conn, protocol, first_bytes=None):
+    if protocol == PROTOCOL_V2:
+        header = recv_exact(conn, V2_HEADER.size)
+        if header is None:
+            return None
+        frame_size, sequence, flags, extension_size, _ = V2_HEADER.unpack(header)
+        if extension_size and recv_exact(conn, extension_size) is None:
+            return None
+        return frame_size, sequence, flags
+
+    header = first_bytes or recv_exact(conn, V1_HEADER.size)
+    if header is None:
+        return None
+    return V1_HEADER.unpack(header)[0], None, 0
+
+
+def negotiate_protocol(conn):
+    first_bytes = recv_exact(conn, len(HELLO_MAGIC))
+    if first_bytes is None or first_bytes != HELLO_MAGIC:
+        return PROTOCOL_V1, first_bytes
+    rest = recv_exact(conn, HELLO.size - len(HELLO_MAGIC))
+    if rest is None:
+        return PROTOCOL_V1, None
+    version, _ = unpack_hello(first_bytes + rest)
+    protocol = PROTOCOL_V2 if version >= PROTOCOL_V2 else PROTOCOL_V1
+    conn.sendall(pack_hello(protocol))
+    return protocol, b""
+
+
 def create_server_socket(host, port):
     infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)
 
@@ -77,10 +118,19 @@ def run_receiver(host, port, max_frames, timeout, once):
                 session_frames = 0
                 session_bytes = 0
                 last_report = session_start
+                sequence = SequenceTracker()
+
+                try:
+                    protocol, pending_header = negotiate_protocol(conn)
+                except socket.timeout:
+                    logger.warning("Socket timeout while waiting for first frame")
+                    continue
+                logger.info("Stream framing: v%d", protocol)
 
                 while True:
                     try:
-                        header = recv_exact(conn, 4)
+                        header = read_frame_header(conn, protocol, pending_header)
+                        pending_header = None
                     except KeyboardInterrupt:
                         interrupted = True
                         logger.info("Interrupted by user")
@@ -93,7 +143,9 @@ def run_receiver(host, port, max_frames, timeout, once):
                         logger.info("Sender disconnected")
                         break
 
-                    frame_size = struct.unpack("!I", header)[0]
+                    frame_size, frame_sequence, flags = header
+                    if frame_sequence is not None and not flags & FLAG_CONTROL:
+                        sequence.observe(frame_sequence)
 
                     try:
                         payload = recv_exact(conn, frame_size)
@@ -109,6 +161,9 @@ def run_receiver(host, port, max_frames, timeout, once):
                         logger.warning("Disconnected while reading frame payload")
                         break
 
+                    if flags & FLAG_CONTROL:
+                        continue
+
                     session_frames += 1
                     session_bytes += frame_size
                     total_frames += 1
@@ -120,11 +175,13 @@ def run_receiver(host, port, max_frames, timeout, once):
                         session_fps = session_frames / session_elapsed
                         session_mbps = (session_bytes * 8) / session_elapsed / 1_000_000
                         logger.info(
-                            "session_frames=%d last_frame=%d bytes fps=%.2f mbps=%.2f",
+                            "session_frames=%d last_frame=%d bytes fps=%.2f mbps=%.2f lost=%d reordered=%d",
                             session_frames,
                             frame_size,
                             session_fps,
                             session_mbps,
+                            sequence.lost,
+                            sequence.reordered,
                         )
                         last_report = now
 
@@ -137,12 +194,14 @@ def run_receiver(host, port, max_frames, timeout, once):
 
                 session_elapsed = max(time.time() - session_start, 1e-6)
                 logger.info(
-                    "Session summary: frames=%d bytes=%d duration=%.2fs fps=%.2f mbps=%.2f",
+                    "Session summary: frames=%d bytes=%d duration=%.2fs fps=%.2f mbps=%.2f lost=%d reordered=%d",
                     session_frames,
                     session_bytes,
                     session_elapsed,
                     session_frames / session_elapsed,
                     (session_bytes * 8) / session_elapsed / 1_000_000,
+                    sequence.lost,
+                    sequence.reordered,
                 )
 
             if max_frames > 0 and total_frames >= max_frames:
@@ -191,6 +250,7 @@ def main():
     logging.basicConfig(
         level=getattr(logging, args.log_level),
         format="%(asctime)s - %(levelname)s - %(message)s",
+        force=True,
     )
     run_receiver(args.host, args.port, args.max_frames, args.timeout, args.once)
 
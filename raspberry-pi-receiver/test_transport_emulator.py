@@ -12,38 +12,246 @@ try:
 except ImportError:
     serial = None
 
+from deskextend_receiver.utils.framing import (
+    CONTROL_FEEDBACK,
+    CONTROL_KEYFRAME_REQUEST,
+    CONTROL_PING,
+    FLAG_CONFIG,
+    FLAG_CONTROL,
+    FLAG_DISCARDABLE,
+    FLAG_KEYFRAME,
+    FLAG_TIMESTAMP,
+    HELLO,
+    HELLO_FLAG_CONTROL,
+    KEYFRAME_REASONS,
+    PROTOCOL_V2,
+    V2_HEADER,
+    feedback_report,
+    pack_hello,
+    pack_pong,
+    pack_timestamp,
+    pack_v1_frame,
+    pack_v2_frame,
+    unpack_control,
+    unpack_hello,
+)
+
 class HybridTransportEmulator:
-    def __init__(self, port=5900, usb_device=None):
+    def __init__(self, port=5900, usb_device=None, protocol=1, connect=None, frames=10, keyframe_interval=10,
+                 skip_every=0, fps=10.0, clock_sync=False, clock_skew_ms=0.0, bitrate_kbps=None, adaptive=False):
         self.port = port
         self.usb_device = usb_device
+        self.protocol = protocol
+        self.connect = connect
+        self.frames = frames
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.skip_every = skip_every
+        self.fps = max(0.1, fps)
+        self.clock_sync = clock_sync and protocol >= PROTOCOL_V2
+        self.clock_skew = clock_skew_ms / 1000.0
+        self.bitrate_kbps = bitrate_kbps
+        self.max_bitrate_kbps = bitrate_kbps
+        self.adaptive = adaptive and protocol >= PROTOCOL_V2 and bitrate_kbps is not None
+        self.control = self.clock_sync or self.adaptive
+        self.clean_reports = 0
+        self.feedback_reports = 0
         self.running = False
         self.test_data_size = 0
-        
-    def simulate_network_stream(self):
-        print("[NETWORK] Starting network stream simulation")
+        self.sequence = 0
+        self.send_lock = threading.Lock()
+        self.pings_answered = 0
+        self.keyframe_requested = False
+        self.keyframe_requests = 0
+
+    def clock(self):
+        return time.monotonic() + self.clock_skew
+
+    def frame_size(self):
+        if self.bitrate_kbps is None:
+            return 1024
+        return max(64, int(self.bitrate_kbps * 1000 / 8 / self.fps))
+
+    def frame_flags(self, index):
+        if self.keyframe_requested or index % self.keyframe_interval == 0:
+            self.keyframe_requested = False
+            return FLAG_KEYFRAME | FLAG_CONFIG
+        if index % 2:
+            return FLAG_DISCARDABLE
+        return 0
+
+    def encode_frame(self, index, payload):
+        if self.protocol < PROTOCOL_V2:
+            return pack_v1_frame(payload)
+        if self.skip_every and index and index % self.skip_every == 0:
+            self.sequence += 1
+        flags = self.frame_flags(index)
+        extension = b''
+        if self.clock_sync:
+            flags |= FLAG_TIMESTAMP
+            extension = pack_timestamp(self.clock())
+        frame = pack_v2_frame(payload, self.sequence, flags, extension)
+        self.sequence += 1
+        return frame
+
+    def negotiate(self, send, recv, tag):
+        if self.protocol < PROTOCOL_V2:
+            return True
+        send(pack_hello(PROTOCOL_V2, HELLO_FLAG_CONTROL if self.control else 0))
+        reply = recv(HELLO.size)
+        accepted = unpack_hello(reply) if reply and len(reply) == HELLO.size else None
+        if accepted and accepted[0] >= PROTOCOL_V2:
+            print(f"[{tag}] Receiver acknowledged v2 framing")
+            return True
+        print(f"[{tag}] No v2 acknowledgement from receiver")
+        return False
+
+    def send(self, write, data):
+        with self.send_lock:
+            write(data)
+
+    def read_control(self, read, write, stop, tag):
+        buffer = b''
+        while not stop.is_set():
+            try:
+                data = read()
+            except (socket.timeout, BlockingIOError):
+                continue
+            except Exception:
+                break
+            if data is None:
+                break
+            if not data:
+                continue
+            received_at = self.clock()
+            buffer += data
+            while len(buffer) >= V2_HEADER.size:
+                size, _, flags, extension_size, _ = V2_HEADER.unpack_from(buffer)
+                total = V2_HEADER.size + extension_size + size
+                if len(buffer) < total:
+                    break
+                payload = buffer[V2_HEADER.size + extension_size:total]
+                buffer = buffer[total:]
+                if flags & FLAG_CONTROL:
+                    self.handle_control(payload, received_at, write, tag)
+
+    def handle_control(self, payload, received_at, write, tag):
+        message_type, values = unpack_control(payload)
+        if message_type == CONTROL_PING and values:
+            self.send(write, pack_pong(values[0], received_at, self.clock()))
+            self.pings_answered += 1
+        elif message_type == CONTROL_FEEDBACK and values:
+            self.adapt(feedback_report(values), tag)
+        elif message_type == CONTROL_KEYFRAME_REQUEST and values:
+            self.keyframe_requests += 1
+            self.keyframe_requested = True
+            print(f"[{tag}] Keyframe requested ({KEYFRAME_REASONS.get(values[0], values[0])}, from sequence {values[1]})")
+
+    def adapt(self, report, tag):
+        self.feedback_reports += 1
+        if not self.adaptive:
+            return
+        congested = (
+            report["dropped_frames"] > 0
+            or report["queue_depth"] > 1
+            or report["buffered_bytes"] > self.frame_size() * 2
+        )
+        if congested:
+            self.clean_reports = 0
+            target = max(self.max_bitrate_kbps * 0.1, self.bitrate_kbps * 0.7)
+        else:
+            self.clean_reports += 1
+            if self.clean_reports < 3:
+                return
+            target = min(self.max_bitrate_kbps, self.bitrate_kbps * 1.1)
+        if abs(target - self.bitrate_kbps) >= 1:
+            print(
+                f"[{tag}] Feedback queue={report['queue_depth']} fps={report['decode_fps']:.1f} "
+                f"drops={report['dropped_frames']} rx={report['receive_kbps']} kbps temp={report['cpu_temp']}: "
+                f"bitrate {self.bitrate_kbps:.0f} -> {target:.0f} kbps"
+            )
+            self.bitrate_kbps = target
+
+    def stream_frames(self, write, read, tag, fill):
+        stop = threading.Event()
+        if self.control:
+            threading.Thread(target=self.read_control, args=(read, write, stop, tag), daemon=True).start()
+        try:
+            for i in range(self.frames):
+                test_frame = self.encode_frame(i, fill * self.frame_size())
+                self.send(write, test_frame)
+                self.test_data_size += len(test_frame)
+                print(f"[{tag}] Sent frame {i+1}: {len(test_frame)} bytes")
+                time.sleep(1.0 / self.fps)
+        finally:
+            stop.set()
+        if self.clock_sync:
+            print(f"[{tag}] Answered {self.pings_answered} clock sync pings")
+        if self.control:
+            print(f"[{tag}] Received {self.feedback_reports} feedback reports, final bitrate {self.bitrate_kbps or 0:.0f} kbps")
+            print(f"[{tag}] Received {self.keyframe_requests} keyframe requests")
+
+    def open_network_connection(self):
+        if self.connect:
+            print(f"[NETWORK] Connecting to {self.connect}:{self.port}")
+            return socket.create_connection((self.connect, self.port), timeout=5), None
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind(('0.0.0.0', self.port))
         sock.listen(1)
+        print(f"[NETWORK] Listening on 0.0.0.0:{self.port}")
+        conn, addr = sock.accept()
+        print(f"[NETWORK] Accepted connection from {addr}")
+        return conn, sock
+
+    @staticmethod
+    def recv_with_timeout(conn, size, timeout=1.0):
+        conn.settimeout(timeout)
+        data = b''
+        try:
+            while len(data) < size:
+                part = conn.recv(size - len(data))
+                if not part:
+                    break
+                data += part
+        except socket.timeout:
+            pass
+        finally:
+            conn.settimeout(None)
+        return data
+
+    @staticmethod
+    def socket_reader(conn):
+        def read():
+            return conn.recv(4096) or None
+        return read
+
+    def simulate_network_stream(self):
+        print("[NETWORK] Starting network stream simulation")
+        sock = None
+        conn = None
         
         try:
-            print(f"[NETWORK] Listening on 0.0.0.0:{self.port}")
-            conn, addr = sock.accept()
-            print(f"[NETWORK] Accepted connection from {addr}")
-            
-            for i in range(10):
-                test_frame = struct.pack('>I', 1024) + (b'X' * 1024)
-                conn.send(test_frame)
-                self.test_data_size += len(test_frame)
-                print(f"[NETWORK] Sent frame {i+1}: {len(test_frame)} bytes")
-                time.sleep(0.1)
+            conn, sock = self.open_network_connection()
+            accepted = self.negotiate(conn.sendall, lambda size: self.recv_with_timeout(conn, size), "NETWORK")
+            if not accepted and self.connect:
+                conn.close()
+                print("[NETWORK] Reconnecting with v1 framing")
+                self.protocol = 1
+                self.clock_sync = False
+                self.adaptive = False
+                self.control = False
+                conn, _ = self.open_network_connection()
             
-            conn.close()
+            conn.settimeout(0.5)
+            self.stream_frames(conn.sendall, self.socket_reader(conn), "NETWORK", b'X')
         except Exception as e:
             print(f"[NETWORK] Error: {e}")
         finally:
-            sock.close()
-    
+            if conn:
+                conn.close()
+            if sock:
+                sock.close()
+
     def simulate_usb_stream(self):
         if not self.usb_device or serial is None:
             print("[USB] USB simulation skipped - no device or pyserial")
@@ -57,12 +265,11 @@ class HybridTransportEmulator:
                 timeout=1.0
             )
             
-            for i in range(10):
-                test_frame = struct.pack('>I', 1024) + (b'Y' * 1024)
-                ser.write(test_frame)
-                self.test_data_size += len(test_frame)
-                print(f"[USB] Sent frame {i+1}: {len(test_frame)} bytes")
-                time.sleep(0.1)
+            if not self.negotiate(ser.write, ser.read, "USB"):
+                ser.close()
+                return
+
+            self.stream_frames(ser.write, lambda: ser.read(max(1, ser.in_waiting)), "USB", b'Y')
             
             ser.close()
             print("[USB] Connection closed")
@@ -93,10 +300,33 @@ if __name__ == '__main__':
     parser.add_argument('--port', type=int, default=5900)
     parser.add_argument('--usb', help='USB device path')
     parser.add_argument('--mode', choices=['hybrid', 'network', 'usb'], default='hybrid')
+    parser.add_argument('--protocol', type=int, choices=[1, 2], default=1, help='Stream framing version')
+    parser.add_argument('--connect', help='Connect to a receiver at this host instead of listening')
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--keyframe-interval', type=int, default=10)
+    parser.add_argument('--skip-every', type=int, default=0, help='Skip a v2 sequence number every N frames')
+    parser.add_argument('--fps', type=float, default=10.0)
+    parser.add_argument('--clock-sync', action='store_true', help='Stamp capture times and answer clock sync pings (v2)')
+    parser.add_argument('--clock-skew-ms', type=float, default=0.0, help='Offset the sender clock to exercise sync')
+    parser.add_argument('--bitrate-kbps', type=float, help='Size frames for this bitrate instead of 1 KiB')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt the bitrate to receiver feedback (v2, needs --bitrate-kbps)')
     
     args = parser.parse_args()
     
-    emulator = HybridTransportEmulator(port=args.port, usb_device=args.usb)
+    emulator = HybridTransportEmulator(
+        port=args.port,
+        usb_device=args.usb,
+        protocol=args.protocol,
+        connect=args.connect,
+        frames=args.frames,
+        keyframe_interval=args.keyframe_interval,
+        skip_every=args.skip_every,
+        fps=args.fps,
+        clock_sync=args.clock_sync,
+        clock_skew_ms=args.clock_skew_ms,
+        bitrate_kbps=args.bitrate_kbps,
+        adaptive=args.adaptive
+    )
     
     if args.mode == 'hybrid':
         emulator.run_hybrid()
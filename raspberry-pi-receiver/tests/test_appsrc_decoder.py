@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+
+from deskextend_receiver.services.decoder import (
+    APPSRC_NAME,
+    AppSrcDecoder,
+    Gst,
+    create_decoder,
+    gstreamer_available,
+    launch_description,
+    replace_sink,
+)
+from deskextend_receiver.utils.reassembly import StreamFrame
+
+PIPELINE = {
+    "name": "Software avdec + autovideosink",
+    "cmd": ["gst-launch-1.0", "-e", "fdsrc", "fd=0", "!", "queue", "!", "autovideosink", "sync=false"],
+}
+
+
+def fakesink_pipeline():
+    return {**PIPELINE, "cmd": replace_sink(PIPELINE["cmd"], "fakesink")}
+
+
+class LaunchDescriptionTest(unittest.TestCase):
+    def test_appsrc_blocks_at_max_bytes(self):
+        description = launch_description(PIPELINE["cmd"], max_bytes=65536)
+        self.assertTrue(description.startswith(f"appsrc name={APPSRC_NAME} "))
+        self.assertIn("block=true", description)
+        self.assertIn("max-bytes=65536", description)
+        self.assertTrue(description.endswith("! queue ! autovideosink sync=false"))
+
+    def test_pipe_size_bounds_the_appsrc_queue(self):
+        decoder = create_decoder(PIPELINE, backend="appsrc", pipe_size=4096)
+        self.assertIsInstance(decoder, AppSrcDecoder)
+        self.assertIn("max-bytes=4096", decoder.description)
+
+
+@unittest.skipUnless(gstreamer_available(), "PyGObject/GStreamer not installed")
+class AppSrcFakesinkTest(unittest.TestCase):
+    def start(self, pipeline_info, max_bytes=1024 * 1024):
+        decoder = AppSrcDecoder(pipeline_info, max_bytes=max_bytes)
+        self.addCleanup(decoder.stop)
+        self.assertTrue(decoder.start(2.0))
+        return decoder
+
+    def test_frames_reach_fakesink(self):
+        decoder = self.start(fakesink_pipeline())
+        segments = (memoryview(b"\x00\x00\x00\x01\x09\xf0"), memoryview(b"\x00\x00\x00\x01\x65" + b"\x88" * 64))
+        frame = StreamFrame(segments, sum(len(segment) for segment in segments), 0)
+        for _ in range(10):
+            decoder.write(frame)
+
+        self.assertEqual(decoder.write_calls, 10)
+        self.assertTrue(decoder.is_alive())
+        self.assertEqual(decoder.stalled_for(), 0.0)
+
+    def test_buffer_holds_every_segment(self):
+        segments = (memoryview(b"abc"), memoryview(b"defg"))
+        buffer = AppSrcDecoder.make_buffer(StreamFrame(segments, 7, 0))
+        self.assertEqual(buffer.extract_dup(0, buffer.get_size()), b"abcdefg")
+
+    def test_blocked_push_reports_a_stall(self):
+        decoder = self.start(fakesink_pipeline(), max_bytes=64)
+        decoder.pipeline.set_state(Gst.State.PAUSED)
+        frame = StreamFrame((memoryview(b"\x00" * 64),), 64, 0)
+        stalled = []
+
+        def push():
+            try:
+                for _ in range(100):
+                    decoder.write(frame)
+            except BrokenPipeError:
+                pass
+
+        writer = threading.Thread(target=push, daemon=True)
+        writer.start()
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline and not stalled:
+            if decoder.stalled_for() > 0.2:
+                stalled.append(decoder.stalled_for())
+            time.sleep(0.05)
+        decoder.kill()
+        writer.join(2.0)
+
+        self.assertTrue(stalled)
+        self.assertFalse(writer.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from deskextend_receiver.utils.clock_sync import ClockSync
+
+
+def exchange(sync, sent_at, offset, outbound, inbound, hold=0):
+    peer_received_at = sent_at + outbound + offset
+    peer_replied_at = peer_received_at + hold
+    return sync.add_sample(sent_at, peer_received_at, peer_replied_at, peer_replied_at - offset + inbound)
+
+
+class ClockSyncTest(unittest.TestCase):
+    def test_symmetric_exchange(self):
+        sync = ClockSync()
+        self.assertFalse(sync.synchronized())
+
+        self.assertTrue(exchange(sync, 1000, offset=500, outbound=2, inbound=2, hold=3))
+        self.assertTrue(sync.synchronized())
+        self.assertEqual((sync.offset, sync.rtt), (500, 4))
+        self.assertEqual(sync.to_local(1600), 1100)
+
+    def test_asymmetric_paths_split_the_error(self):
+        sync = ClockSync()
+        exchange(sync, 1000, offset=-200, outbound=6, inbound=2)
+        self.assertEqual((sync.offset, sync.rtt), (-198, 8))
+
+    def test_lowest_rtt_sample_wins(self):
+        sync = ClockSync()
+        exchange(sync, 1000, offset=100, outbound=10, inbound=30)
+        exchange(sync, 2000, offset=100, outbound=1, inbound=1)
+        exchange(sync, 3000, offset=100, outbound=20, inbound=5)
+
+        self.assertEqual((sync.offset, sync.rtt), (100, 2))
+        self.assertEqual(sync.sample_count, 3)
+
+    def test_negative_rtt_is_rejected(self):
+        sync = ClockSync()
+        self.assertFalse(sync.add_sample(1000, 1500, 1600, 1050))
+        self.assertFalse(sync.synchronized())
+        self.assertEqual(sync.sample_count, 0)
+
+    def test_old_samples_leave_the_window(self):
+        sync = ClockSync(window=2)
+        exchange(sync, 1000, offset=100, outbound=1, inbound=1)
+        exchange(sync, 2000, offset=300, outbound=5, inbound=5)
+        self.assertEqual(sync.offset, 100)
+
+        exchange(sync, 3000, offset=300, outbound=4, inbound=4)
+        self.assertEqual((sync.offset, sync.rtt), (300, 8))
+        self.assertEqual(len(sync.samples), 2)
+
+    def test_window_is_at_least_one(self):
+        self.assertEqual(ClockSync(window=0).samples.maxlen, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver import core
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.utils.framing import (
+    CONTROL_FEEDBACK,
+    CONTROL_KEYFRAME_REQUEST,
+    FLAG_CONTROL,
+    HELLO_FLAG_CONTROL,
+    KEYFRAME_REASON_DECODER,
+    KEYFRAME_REASON_DROP,
+    PROTOCOL_V2,
+    feedback_report,
+    pack_v1_frame,
+    unpack_control,
+)
+from deskextend_receiver.utils.h264 import FRAME_IDR, FRAME_REF
+from deskextend_receiver.utils.reassembly import FrameReassembler, StreamFrame
+
+LABELS = (("transport", "Network"),)
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ControlSocket:
+    def __init__(self):
+        self.reassembler = FrameReassembler(64 * 1024, 64 * 1024, protocol=PROTOCOL_V2)
+
+    def sendall(self, data):
+        self.reassembler.write(data)
+
+    def messages(self):
+        messages = []
+        while True:
+            frame = self.reassembler.next_frame()
+            if frame is None:
+                return messages
+            assert frame.flags & FLAG_CONTROL
+            messages.append(unpack_control(b"".join(bytes(segment) for segment in frame.segments)))
+            self.reassembler.release(frame)
+
+
+class ControlChannelTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            "DESKEXTEND_CACHE_DIR": cache_dir.name,
+            "DESKEXTEND_KEYFRAME_REQUEST_INTERVAL": "1.0",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = FakeClock()
+        patcher = mock.patch.object(core.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.running = True
+        self.receiver.stream_metric_labels = LABELS
+        self.reassembler = FrameReassembler(64 * 1024, 1024 * 1024, protocol=PROTOCOL_V2)
+        self.reassembler.hello_flags = HELLO_FLAG_CONTROL
+        self.receiver.stream_reassembler = self.reassembler
+        self.conn = ControlSocket()
+
+
+class KeyframeRequestTest(ControlChannelTest):
+    def send(self):
+        return self.receiver.send_keyframe_request(self.conn, self.clock.now)
+
+    def requests(self):
+        return [values for message_type, values in self.conn.messages() if message_type == CONTROL_KEYFRAME_REQUEST]
+
+    def sent(self, reason):
+        return self.receiver.metrics.get("deskextend_keyframe_requests_total", (*LABELS, ("reason", reason)))
+
+    def coalesced(self, reason):
+        return self.receiver.metrics.get("deskextend_keyframe_requests_coalesced_total", (*LABELS, ("reason", reason)))
+
+    def test_one_request_per_interval(self):
+        self.assertIsNone(self.send())
+        self.receiver.request_keyframe(KEYFRAME_REASON_DROP)
+        self.assertIsNone(self.send())
+        self.assertEqual(len(self.requests()), 1)
+
+        self.clock.now += 0.4
+        self.receiver.request_keyframe(KEYFRAME_REASON_DROP)
+        self.assertEqual(self.send(), 101.0)
+        self.clock.now += 0.3
+        self.receiver.request_keyframe(KEYFRAME_REASON_DROP)
+        self.assertEqual(self.send(), 101.0)
+        self.assertEqual(self.requests(), [])
+
+        self.clock.now = 101.0
+        self.assertIsNone(self.send())
+        self.assertEqual(len(self.requests()), 1)
+        self.assertIsNone(self.send())
+        self.assertEqual(self.requests(), [])
+        self.assertEqual(self.sent("drop"), 2)
+        self.assertEqual(self.coalesced("drop"), 1)
+
+    def test_drop_and_decoder_restart_merge_into_one_request(self):
+        for sequence in range(5):
+            self.reassembler.sequence.observe(sequence)
+        self.receiver.drop_overflow_frame(self.reassembler, StreamFrame((), 0, 0, FRAME_REF))
+        self.clock.now += 0.05
+        with mock.patch.object(self.receiver, "start_decoder", return_value=True), \
+                mock.patch.object(self.receiver, "detect_decoder_pipeline", return_value=[]):
+            self.assertTrue(self.receiver.recover_decoder(BrokenPipeError("decoder exited"), self.reassembler))
+
+        self.assertTrue(self.receiver.control_wakeup.is_set())
+        self.assertIsNone(self.send())
+        self.assertEqual(self.requests(), [(KEYFRAME_REASON_DROP, 5)])
+        self.assertEqual(self.sent("drop"), 1)
+        self.assertEqual(self.sent("decoder"), 0)
+        self.assertEqual(self.coalesced("decoder"), 1)
+
+    def test_recovery_is_timed_from_the_first_trigger(self):
+        self.receiver.request_keyframe(KEYFRAME_REASON_DROP)
+        self.clock.now += 0.2
+        self.receiver.request_keyframe(KEYFRAME_REASON_DECODER)
+        self.clock.now += 0.3
+        self.receiver.record_written_frames((StreamFrame((), 0, 0, FRAME_IDR),), self.clock.now)
+
+        histogram = self.receiver.metrics.histograms[("deskextend_keyframe_recovery_seconds", (*LABELS, ("reason", "drop")))]
+        self.assertEqual(histogram.count, 1)
+        self.assertAlmostEqual(histogram.sum, 0.5)
+        self.assertIsNone(self.receiver.recovery_started_at)
+
+
+class FakeWriter:
+    def depth(self):
+        return 4
+
+
+class FeedbackTest(ControlChannelTest):
+    def setUp(self):
+        super().setUp()
+        self.receiver.decoder_writer = FakeWriter()
+        self.reassembler.protocol = None
+        self.reassembler.write(pack_v1_frame(bytes(1000))[:700])
+        patcher = mock.patch.object(self.receiver, "get_cpu_temp", return_value=52.3)
+        self.temperature = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count(self, frames, received, backlog=0, overflow=0, expired=0):
+        metrics = self.receiver.metrics
+        metrics.inc("deskextend_frames_written_total", frames, LABELS)
+        metrics.inc("deskextend_bytes_received_total", received, LABELS)
+        for reason, dropped in (("backlog", backlog), ("overflow", overflow), ("expired", expired)):
+            metrics.inc("deskextend_frames_dropped_total", dropped, (*LABELS, ("reason", reason)))
+
+    def reports(self):
+        return [feedback_report(values) for message_type, values in self.conn.messages() if message_type == CONTROL_FEEDBACK]
+
+    def test_report_carries_deltas_since_the_previous_one(self):
+        self.count(frames=10, received=50_000, overflow=1)
+        previous = self.receiver.feedback_snapshot()
+        self.clock.now += 0.5
+        self.count(frames=30, received=125_000, backlog=2, overflow=1, expired=3)
+
+        current = self.receiver.send_feedback(self.conn, previous)
+
+        self.assertEqual(self.reports(), [{
+            "queue_depth": 4,
+            "decode_fps": 60.0,
+            "dropped_frames": 6,
+            "receive_kbps": 2000,
+            "buffered_bytes": 700,
+            "cpu_temp": 52.3,
+            "interval_ms": 500,
+        }])
+        self.assertEqual(current["frames"], 40)
+        self.assertEqual(current["dropped"], 7)
+        self.assertEqual(self.receiver.metrics.get("deskextend_feedback_reports_total", LABELS), 1)
+
+        self.clock.now += 0.25
+        self.count(frames=5, received=1_000)
+        self.temperature.return_value = None
+        self.receiver.send_feedback(self.conn, current)
+        report, = self.reports()
+        self.assertEqual((report["decode_fps"], report["dropped_frames"], report["receive_kbps"]), (20.0, 0, 32))
+        self.assertIsNone(report["cpu_temp"])
+        self.assertEqual(report["interval_ms"], 250)
+
+    def test_fields_are_clamped_to_the_wire_format(self):
+        previous = self.receiver.feedback_snapshot()
+        self.clock.now += 0.001
+        self.count(frames=1000, received=0, expired=70_000)
+        self.temperature.return_value = -4000.0
+
+        self.receiver.send_feedback(self.conn, previous)
+        report, = self.reports()
+        self.assertEqual(report["decode_fps"], 655.35)
+        self.assertEqual(report["dropped_frames"], 0xFFFF)
+        self.assertEqual(report["cpu_temp"], -3276.7)
+
+
+if __name__ == "__main__":
+    unittest.main()
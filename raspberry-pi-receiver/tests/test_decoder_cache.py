@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services import decoder_cache
+from deskextend_receiver.services.decoder_cache import STATUS_BROKEN, STATUS_OK, DecoderCapabilityCache, pipeline_key
+
+PIPELINES = [
+    {"name": "vaapi", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "vaapih264dec", "!", "vaapisink", "sync=false"]},
+    {"name": "v4l2", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "v4l2h264dec", "!", "autovideosink", "sync=false"]},
+    {"name": "avdec", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "avdec_h264", "!", "autovideosink", "sync=false"]},
+]
+
+
+class DecoderCapabilityCacheTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.path = os.path.join(cache_dir.name, "decoder-capabilities.json")
+        patcher = mock.patch.object(decoder_cache, "get_screen_resolution", return_value=(1920, 1080))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(decoder_cache, "has_vaapi_sink", return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_cache(self, broken_ttl=60.0):
+        cache = DecoderCapabilityCache(self.path, broken_ttl=broken_ttl)
+        cache.capabilities()
+        return cache
+
+    def test_broken_entries_expire(self):
+        cache = self.make_cache()
+        with mock.patch.object(decoder_cache.time, "time", return_value=1000.0):
+            cache.record(PIPELINES[0], "subprocess", STATUS_BROKEN)
+        with mock.patch.object(decoder_cache.time, "time", return_value=1059.0):
+            self.assertEqual(cache.pipeline_status(PIPELINES[0], "subprocess"), STATUS_BROKEN)
+        with mock.patch.object(decoder_cache.time, "time", return_value=1061.0):
+            self.assertIsNone(cache.pipeline_status(PIPELINES[0], "subprocess"))
+
+    def test_ok_entries_do_not_expire(self):
+        cache = self.make_cache()
+        with mock.patch.object(decoder_cache.time, "time", return_value=1000.0):
+            cache.record(PIPELINES[0], "subprocess", STATUS_OK)
+        with mock.patch.object(decoder_cache.time, "time", return_value=100000.0):
+            self.assertEqual(cache.pipeline_status(PIPELINES[0], "subprocess"), STATUS_OK)
+
+    def test_untimed_entries_are_retried(self):
+        cache = self.make_cache()
+        cache.data["pipelines"][pipeline_key(PIPELINES[0], "subprocess")] = STATUS_BROKEN
+        self.assertIsNone(cache.pipeline_status(PIPELINES[0], "subprocess"))
+
+    def test_x_server_is_part_of_the_fingerprint(self):
+        with mock.patch.object(decoder_cache, "x_display_available", return_value=False):
+            cache = self.make_cache()
+            cache.record(PIPELINES[0], "subprocess", STATUS_BROKEN)
+        with mock.patch.object(decoder_cache, "x_display_available", return_value=True):
+            cache = DecoderCapabilityCache(self.path)
+            cache.capabilities()
+            self.assertIsNone(cache.pipeline_status(PIPELINES[0], "subprocess"))
+
+
+class FakeDecoder:
+    backend = "subprocess"
+    qos_dropped = 0
+    pid = None
+
+    def __init__(self, pipeline_info, broken, log):
+        self.name = pipeline_info["name"]
+        self.pipeline_info = pipeline_info
+        self.cmd = pipeline_info["cmd"]
+        self.broken = broken
+        self.log = log
+        self.running = False
+
+    def launch(self):
+        self.running = True
+        self.log.append(("launch", self.name, self.cmd[-2], self.running_displays()))
+
+    def running_displays(self):
+        return sum(1 for decoder in FakeDecoder.instances if decoder.running and decoder.cmd[-2] != "fakesink")
+
+    def wait_ready(self, timeout):
+        return not self.broken
+
+    def start(self, settle_time=None):
+        self.launch()
+        return self.wait_ready(settle_time)
+
+    def is_alive(self):
+        return self.running
+
+    def stop(self, timeout=3.0):
+        self.running = False
+
+
+class ProbeDecodersTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.arrange_decoder_window = lambda delay=5.0: None
+        self.receiver.decoder_cache.data = {"pipelines": {}}
+        self.receiver.decoder_cache.save = lambda: None
+        self.log = []
+        FakeDecoder.instances = []
+
+    def create_decoder(self, broken_decoders=(), broken_displays=()):
+        def create(pipeline_info, backend="subprocess", env=None, pipe_size=0):
+            probing = pipeline_info["cmd"][-2] == "fakesink"
+            broken = pipeline_info["name"] in (broken_decoders if probing else broken_displays)
+            decoder = FakeDecoder(pipeline_info, broken, self.log)
+            FakeDecoder.instances.append(decoder)
+            return decoder
+        return mock.patch("deskextend_receiver.core.create_decoder", side_effect=create)
+
+    def test_display_sinks_start_one_at_a_time(self):
+        with self.create_decoder(broken_decoders={"vaapi"}, broken_displays={"v4l2"}):
+            self.assertTrue(self.receiver.start_decoder(PIPELINES))
+
+        self.assertEqual(self.receiver.decoder.name, "avdec")
+        probes = [entry for entry in self.log if entry[2] == "fakesink"]
+        displays = [entry for entry in self.log if entry[2] != "fakesink"]
+        self.assertEqual(len(probes), 3)
+        self.assertEqual([entry[1] for entry in displays], ["v4l2", "avdec"])
+        self.assertTrue(all(entry[3] == 1 for entry in displays))
+
+        cache = self.receiver.decoder_cache
+        self.assertEqual(cache.pipeline_status(PIPELINES[0], "subprocess"), STATUS_BROKEN)
+        self.assertEqual(cache.pipeline_status(PIPELINES[1], "subprocess"), STATUS_BROKEN)
+        self.assertEqual(cache.pipeline_status(PIPELINES[2], "subprocess"), STATUS_OK)
+
+
+if __name__ == "__main__":
+    unittest.main()
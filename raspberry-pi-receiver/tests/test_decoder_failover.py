@@ -0,0 +1,192 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services.decoder_writer import DecoderWriter
+from deskextend_receiver.utils.framing import pack_v1_frame
+from deskextend_receiver.utils.h264 import ANNEX_B_START, classify_access_unit
+from deskextend_receiver.utils.reassembly import FrameReassembler
+
+PIPELINE = {"name": "Software avdec + autovideosink", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0"]}
+SPS = bytes.fromhex("67640028ace80780227e54")
+PPS = b"\x68\xee\x3c\x80"
+PARAMETER_SETS = ANNEX_B_START + SPS + ANNEX_B_START + PPS
+IDR = ANNEX_B_START + b"\x65\x88\x84\x00"
+SLICE = ANNEX_B_START + b"\x41\x9a\x02"
+
+
+class RecordingDecoder:
+    backend = "subprocess"
+    qos_dropped = 0
+    pid = None
+    blocked_seconds = 0.0
+
+    def __init__(self, error=None):
+        self.name = PIPELINE["name"]
+        self.pipeline_info = PIPELINE
+        self.error = error
+        self.alive = True
+        self.write_calls = 0
+        self.written = []
+
+    def write(self, frame):
+        if self.error:
+            raise self.error
+        self.write_calls += 1
+        self.written.append(b"".join(bytes(segment) for segment in frame.segments))
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+    def is_alive(self):
+        return self.alive
+
+    def stalled_for(self):
+        return 0.0
+
+    def stop(self, timeout=3.0):
+        self.alive = False
+
+
+class DecoderFailoverTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.running = True
+        self.receiver.stream_metric_labels = (("transport", "Network"),)
+        self.replacements = []
+        self.start_gate = threading.Event()
+        self.start_gate.set()
+        self.starting = threading.Event()
+        patches = [
+            mock.patch.object(self.receiver, "arrange_decoder_window"),
+            mock.patch.object(self.receiver, "show_chromium_kiosk"),
+            mock.patch.object(self.receiver, "detect_decoder_pipeline", return_value=[PIPELINE]),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.receiver, "start_decoder", side_effect=self.start_replacement)
+        self.start_decoder = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.failing = RecordingDecoder(BrokenPipeError("decoder exited"))
+        self.receiver.decoder = self.failing
+        self.session_stop = threading.Event()
+
+    def start_replacement(self, pipelines=None, demote=None):
+        self.starting.set()
+        self.start_gate.wait(5)
+        decoder = RecordingDecoder()
+        self.replacements.append(decoder)
+        self.receiver.adopt_decoder(decoder)
+        return True
+
+    def session(self, classify=classify_access_unit, max_frames=30, max_recovery_frames=120):
+        receiver = self.receiver
+        self.reassembler = FrameReassembler(64 * 1024, 1024 * 1024, classify=classify)
+        self.writer = DecoderWriter(
+            self.reassembler,
+            receiver.write_frame_to_decoder,
+            max_frames=max_frames,
+            should_drop=lambda frame: receiver.expire_late_frame(self.reassembler, frame),
+            on_overflow=lambda frame: receiver.drop_overflow_frame(self.reassembler, frame),
+            on_error=lambda error: receiver.recover_decoder(error, self.reassembler, self.session_stop),
+            max_recovery_frames=max_recovery_frames,
+            write_batch=receiver.write_frames_to_decoder
+        )
+        receiver.decoder_writer = self.writer
+        self.addCleanup(self.writer.stop)
+        self.writer.start()
+        return self.writer
+
+    def push(self, *payloads):
+        for payload in payloads:
+            self.reassembler.write(pack_v1_frame(payload))
+            self.writer.push(self.reassembler.next_frame())
+
+    def wait_for_writer(self):
+        self.writer.stop(drain=True)
+        self.writer.thread.join(2.0)
+
+    def test_failed_write_replaces_the_decoder_and_primes_it(self):
+        self.receiver.parameter_sets.observe(PARAMETER_SETS)
+        self.session()
+        self.push(SLICE, SLICE, IDR, SLICE)
+        self.wait_for_writer()
+
+        self.assertIsNone(self.writer.error)
+        self.assertEqual(len(self.replacements), 1)
+        replacement = self.replacements[0]
+        self.assertIs(self.receiver.decoder, replacement)
+        self.assertFalse(self.failing.alive)
+        self.assertEqual(replacement.written, [PARAMETER_SETS, IDR, SLICE])
+        self.assertEqual(self.writer.frames_expired, 1)
+        self.assertEqual(self.receiver.decoder_failovers, 1)
+        self.assertEqual(
+            self.receiver.metrics.get("deskextend_decoder_failovers_total", (("pipeline", PIPELINE["name"]), ("backend", "subprocess"))),
+            1
+        )
+
+    def test_frames_queued_during_recovery_survive_up_to_the_recovery_limit(self):
+        self.start_gate.clear()
+        self.session(classify=None, max_frames=2, max_recovery_frames=5)
+        self.push(b"frame-0")
+        self.assertTrue(self.starting.wait(2.0))
+        self.push(*(f"frame-{number}".encode() for number in range(1, 7)))
+        self.assertEqual(self.writer.depth(), 5)
+        self.start_gate.set()
+        self.wait_for_writer()
+
+        self.assertEqual(self.writer.frames_dropped, 1)
+        self.assertEqual(self.replacements[0].written, [f"frame-{number}".encode() for number in range(2, 7)])
+
+    def test_no_recovery_after_stop(self):
+        self.session()
+        with mock.patch.object(self.receiver, "stop_chromium_kiosk"):
+            self.receiver.stop()
+
+        self.assertFalse(self.writer.recover(BrokenPipeError("decoder exited")))
+        self.assertFalse(self.receiver.recover_decoder(BrokenPipeError("decoder exited"), self.reassembler, self.session_stop))
+        self.start_decoder.assert_not_called()
+        self.assertIsNone(self.receiver.decoder)
+
+    def test_no_recovery_once_the_session_stops(self):
+        self.session_stop.set()
+        self.session()
+        self.push(SLICE)
+        self.writer.thread.join(2.0)
+
+        self.assertIsInstance(self.writer.error, BrokenPipeError)
+        self.start_decoder.assert_not_called()
+        self.assertIs(self.receiver.decoder, self.failing)
+
+    def test_session_closing_while_the_old_decoder_stops(self):
+        stop_decoder = self.receiver.stop_decoder
+
+        def stop_and_close():
+            stop_decoder()
+            self.session_stop.set()
+
+        with mock.patch.object(self.receiver, "stop_decoder", side_effect=stop_and_close):
+            self.assertFalse(self.receiver.recover_decoder(BrokenPipeError("decoder exited"), None, self.session_stop))
+        self.start_decoder.assert_not_called()
+
+    def test_gives_up_after_too_many_failovers(self):
+        self.receiver.max_decoder_failovers = 2
+        for _ in range(2):
+            self.receiver.decoder = RecordingDecoder()
+            self.assertTrue(self.receiver.recover_decoder(BrokenPipeError("decoder exited"), None))
+        self.assertFalse(self.receiver.recover_decoder(BrokenPipeError("decoder exited"), None))
+        self.assertEqual(self.start_decoder.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
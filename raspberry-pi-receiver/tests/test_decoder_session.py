@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver import core
+from deskextend_receiver.core import VideoReceiver
+
+WINDOW_PIPELINE = {
+    "name": "Software avdec + autovideosink",
+    "cmd": ["gst-launch-1.0", "-e", "fdsrc", "fd=0", "!", "avdec_h264", "!", "autovideosink", "sync=false"],
+}
+PLANE_PIPELINE = {
+    "name": "Hardware v4l2 + kmssink (low latency)",
+    "cmd": ["gst-launch-1.0", "-e", "fdsrc", "fd=0", "!", "v4l2h264dec", "!", "kmssink", "sync=false"],
+}
+
+
+class FakeDecoder:
+    backend = "subprocess"
+    qos_dropped = 0
+    pid = None
+
+    def __init__(self, pipeline_info):
+        self.name = pipeline_info["name"]
+        self.pipeline_info = pipeline_info
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def stop(self, timeout=3.0):
+        self.alive = False
+
+
+class InlineThread:
+    def __init__(self, target=None, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class DecoderSessionTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patches = [
+            mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name}),
+            mock.patch.object(VideoReceiver, "has_wmctrl", staticmethod(lambda: True)),
+            mock.patch.object(core.threading, "Thread", InlineThread),
+            mock.patch.object(core.subprocess, "run", side_effect=self.record_wmctrl),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.wmctrl_calls = []
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.running = True
+
+    def record_wmctrl(self, cmd, **kwargs):
+        self.wmctrl_calls.append(cmd)
+
+    def decoder_window_actions(self):
+        return [cmd[-1] for cmd in self.wmctrl_calls if cmd[:2] == ["wmctrl", "-r"] and cmd[2] in core.DECODER_WINDOW_NAMES]
+
+    def adopt(self, pipeline_info):
+        decoder = FakeDecoder(pipeline_info)
+        self.receiver.decoder = decoder
+        self.receiver.decoder_signature = self.receiver.pipeline_signature([pipeline_info])
+        return decoder
+
+    def test_warm_decoder_drops_behind_the_kiosk_between_sessions(self):
+        decoder = self.adopt(WINDOW_PIPELINE)
+
+        self.receiver.finish_decoder_session()
+
+        self.assertIs(self.receiver.decoder, decoder)
+        self.assertTrue(decoder.is_alive())
+        self.assertTrue(self.receiver.decoder_idle)
+        actions = self.decoder_window_actions()
+        self.assertIn("remove,fullscreen,above", actions)
+        self.assertIn("add,hidden", actions)
+        self.assertNotIn("add,fullscreen,above", actions)
+
+    def test_next_session_brings_the_warm_decoder_back(self):
+        self.adopt(WINDOW_PIPELINE)
+        self.receiver.finish_decoder_session()
+        self.wmctrl_calls.clear()
+
+        with mock.patch.object(self.receiver, "detect_decoder_pipeline", return_value=[WINDOW_PIPELINE]):
+            self.assertTrue(self.receiver.ensure_decoder())
+
+        self.assertFalse(self.receiver.decoder_idle)
+        self.assertTrue(self.receiver.decoder_warm)
+        actions = self.decoder_window_actions()
+        self.assertIn("add,fullscreen,above", actions)
+        self.assertNotIn("add,hidden", actions)
+
+    def test_display_plane_sink_is_not_kept_warm(self):
+        decoder = self.adopt(PLANE_PIPELINE)
+
+        with mock.patch.object(self.receiver, "prewarm_decoder") as prewarm:
+            self.receiver.finish_decoder_session()
+
+        self.assertIsNone(self.receiver.decoder)
+        self.assertFalse(decoder.is_alive())
+        prewarm.assert_not_called()
+
+    def test_prewarmed_display_plane_sink_is_stopped(self):
+        def start_plane_decoder(pipelines=None, demote=None):
+            self.adopt(PLANE_PIPELINE)
+            return True
+
+        with mock.patch.object(self.receiver, "detect_decoder_pipeline", return_value=[PLANE_PIPELINE]), \
+                mock.patch.object(self.receiver, "start_decoder", side_effect=start_plane_decoder):
+            self.receiver.prewarm_decoder()
+
+        self.assertIsNone(self.receiver.decoder)
+
+    def test_no_prewarm_without_wmctrl(self):
+        with mock.patch.object(VideoReceiver, "has_wmctrl", staticmethod(lambda: False)), \
+                mock.patch.object(self.receiver, "ensure_decoder") as ensure:
+            self.receiver.prewarm_decoder()
+
+        ensure.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
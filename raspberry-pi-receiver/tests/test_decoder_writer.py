@@ -0,0 +1,227 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services.decoder_writer import DecoderWriter
+from deskextend_receiver.utils.framing import HELLO_FLAG_CONTROL, PROTOCOL_V1, PROTOCOL_V2
+from deskextend_receiver.utils.h264 import FRAME_CONFIG, FRAME_IDR, FRAME_NONREF, FRAME_REF
+from deskextend_receiver.utils.reassembly import FrameReassembler, StreamFrame
+
+
+class ReleaseLog:
+    def __init__(self):
+        self.released = []
+
+    def release(self, frame):
+        self.released.append(frame.number)
+
+
+class DecoderWriterTest(unittest.TestCase):
+    def test_default_queue_absorbs_a_burst(self):
+        gate = threading.Event()
+        written = []
+
+        def write_frame(frame):
+            gate.wait(5)
+            written.append(frame.number)
+
+        writer = DecoderWriter(ReleaseLog(), write_frame)
+        writer.start()
+        try:
+            for number in range(writer.max_frames):
+                writer.push(StreamFrame((), 0, 0, FRAME_REF, number))
+            gate.set()
+            writer.stop(drain=True)
+        finally:
+            gate.set()
+            writer.stop()
+
+        self.assertEqual(writer.frames_dropped, 0)
+        self.assertEqual(written, list(range(writer.max_frames)))
+
+    def test_overflow_drops_oldest_frame(self):
+        dropped = []
+        releases = ReleaseLog()
+        writer = DecoderWriter(releases, lambda frame: None, max_frames=2, on_overflow=dropped.append)
+        for number in range(3):
+            writer.push(StreamFrame((), 0, 0, FRAME_REF, number))
+
+        self.assertEqual([frame.number for frame in dropped], [0])
+        self.assertEqual(releases.released, [0])
+        self.assertEqual(writer.depth(), 2)
+
+    def test_batches_respect_the_frame_limit(self):
+        batches = []
+        singles = []
+        releases = ReleaseLog()
+        writer = DecoderWriter(
+            releases,
+            lambda frame: singles.append(frame.number),
+            write_batch=lambda frames: batches.append([frame.number for frame in frames]),
+            max_batch_frames=3
+        )
+        for number in range(7):
+            writer.push(StreamFrame((), 0, 0, FRAME_REF, number))
+        writer.start()
+        writer.stop(drain=True)
+
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(singles, [6])
+        self.assertEqual(writer.batches, 2)
+        self.assertEqual(writer.frames_written, 7)
+        self.assertEqual(releases.released, list(range(7)))
+
+    def test_expired_frames_are_left_out_of_the_batch(self):
+        batches = []
+        writer = DecoderWriter(
+            ReleaseLog(),
+            lambda frame: None,
+            should_drop=lambda frame: frame.number % 2 == 1,
+            write_batch=lambda frames: batches.append([frame.number for frame in frames]),
+            max_batch_frames=4
+        )
+        for number in range(4):
+            writer.push(StreamFrame((), 0, 0, FRAME_REF, number))
+        writer.start()
+        writer.stop(drain=True)
+
+        self.assertEqual(batches, [[0, 2]])
+        self.assertEqual((writer.frames_written, writer.frames_expired), (2, 2))
+
+
+class OverflowRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+
+    def reassembler(self, protocol, hello_flags=0):
+        reassembler = FrameReassembler(64 * 1024, 1024 * 1024, protocol=protocol)
+        reassembler.hello_flags = hello_flags
+        return reassembler
+
+    def test_v1_overflow_keeps_the_rest_of_the_gop(self):
+        reassembler = self.reassembler(PROTOCOL_V1)
+        with mock.patch.object(self.receiver, "request_keyframe") as request:
+            self.receiver.drop_overflow_frame(reassembler, StreamFrame((), 0, 0, FRAME_REF))
+
+        self.assertFalse(self.receiver.awaiting_idr)
+        request.assert_not_called()
+        self.assertEqual(self.receiver.dropped_frames_for_latency, 1)
+
+    def test_v2_overflow_waits_for_a_requested_keyframe(self):
+        reassembler = self.reassembler(PROTOCOL_V2, HELLO_FLAG_CONTROL)
+        with mock.patch.object(self.receiver, "request_keyframe") as request:
+            self.receiver.drop_overflow_frame(reassembler, StreamFrame((), 0, 0, FRAME_REF))
+
+        self.assertTrue(self.receiver.awaiting_idr)
+        request.assert_called_once()
+
+    def test_v2_without_control_channel_keeps_the_gop(self):
+        reassembler = self.reassembler(PROTOCOL_V2)
+        self.receiver.drop_overflow_frame(reassembler, StreamFrame((), 0, 0, FRAME_REF))
+        self.assertFalse(self.receiver.awaiting_idr)
+
+    def test_nonref_overflow_never_waits_for_a_keyframe(self):
+        reassembler = self.reassembler(PROTOCOL_V2, HELLO_FLAG_CONTROL)
+        self.receiver.drop_overflow_frame(reassembler, StreamFrame((), 0, 0, FRAME_NONREF))
+        self.assertFalse(self.receiver.awaiting_idr)
+
+
+class DeadlineDropTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            "DESKEXTEND_CACHE_DIR": cache_dir.name,
+            "DESKEXTEND_MAX_FRAME_AGE_MS": "50",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.stream_metric_labels = (("transport", "Network"),)
+        self.reassembler = FrameReassembler(64 * 1024, 1024 * 1024)
+        patcher = mock.patch.object(self.receiver, "request_keyframe")
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def frame(self, kind, age, number=0):
+        return StreamFrame((), 0, 0, kind, number, arrival=time.monotonic() - age)
+
+    def expire(self, kind, age):
+        return self.receiver.expire_late_frame(self.reassembler, self.frame(kind, age))
+
+    def expired_total(self):
+        return self.receiver.metrics.get("deskextend_frames_dropped_total", (("transport", "Network"), ("reason", "expired")))
+
+    def test_late_reference_frame_waits_for_the_next_idr(self):
+        self.assertTrue(self.expire(FRAME_REF, 0.2))
+        self.assertTrue(self.receiver.awaiting_idr)
+        self.request.assert_called_once()
+        self.assertEqual(self.expired_total(), 1)
+        self.assertEqual(self.reassembler.dropped_by_type["ref"], 1)
+
+        self.assertTrue(self.expire(FRAME_REF, 0.0))
+        self.assertTrue(self.expire(FRAME_NONREF, 0.0))
+        self.assertFalse(self.expire(FRAME_CONFIG, 0.0))
+        self.assertFalse(self.expire(FRAME_IDR, 0.0))
+        self.assertFalse(self.receiver.awaiting_idr)
+        self.assertFalse(self.expire(FRAME_REF, 0.0))
+        self.assertEqual(self.expired_total(), 3)
+
+    def test_late_nonref_frame_is_dropped_alone(self):
+        self.assertTrue(self.expire(FRAME_NONREF, 0.2))
+        self.assertFalse(self.receiver.awaiting_idr)
+        self.request.assert_not_called()
+        self.assertEqual(self.receiver.dropped_frames_for_latency, 1)
+
+    def test_frames_within_the_deadline_are_kept(self):
+        for kind in (FRAME_REF, FRAME_NONREF):
+            self.assertFalse(self.expire(kind, 0.01))
+        self.assertEqual(self.expired_total(), 0)
+
+    def test_late_idr_and_config_frames_are_kept(self):
+        self.assertFalse(self.expire(FRAME_IDR, 0.2))
+        self.assertFalse(self.expire(FRAME_CONFIG, 0.2))
+        self.assertEqual(self.expired_total(), 0)
+
+    def test_no_deadline_keeps_everything(self):
+        self.receiver.max_frame_age = 0
+        self.assertFalse(self.expire(FRAME_REF, 10.0))
+        self.assertFalse(self.receiver.awaiting_idr)
+
+    def test_writer_counts_expired_frames(self):
+        written = []
+        writer = DecoderWriter(
+            ReleaseLog(),
+            lambda frame: written.append(frame.number),
+            should_drop=lambda frame: self.receiver.expire_late_frame(self.reassembler, frame)
+        )
+        frames = [
+            self.frame(FRAME_NONREF, 0.2, 0),
+            self.frame(FRAME_REF, 0.0, 1),
+            self.frame(FRAME_REF, 0.2, 2),
+            self.frame(FRAME_NONREF, 0.0, 3),
+            self.frame(FRAME_IDR, 0.2, 4),
+            self.frame(FRAME_REF, 0.0, 5),
+        ]
+        for frame in frames:
+            writer.push(frame)
+        writer.start()
+        writer.stop(drain=True)
+
+        self.assertEqual(written, [1, 4, 5])
+        self.assertEqual(writer.frames_expired, 3)
+        self.assertEqual(writer.frames_written, 3)
+        self.assertEqual(self.expired_total(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
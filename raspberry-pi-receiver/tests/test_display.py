@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver.utils import display
+from deskextend_receiver.utils.display import (
+    DrmConnectorWatcher,
+    connected_resolution,
+    get_screen_resolution,
+    parse_uevent,
+    read_connectors,
+)
+
+
+def uevent(action, **fields):
+    lines = [f"{action}@/devices/platform/gpu/drm/card1".encode()]
+    lines.extend(f"{key}={value}".encode() for key, value in fields.items())
+    return b"\0".join(lines) + b"\0"
+
+
+class FakeSysfsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patcher = mock.patch.object(display.subprocess, "run", side_effect=AssertionError("subprocess used"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connector(self, name, status, modes=()):
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "status"), "w") as f:
+            f.write(f"{status}\n")
+        with open(os.path.join(path, "modes"), "w") as f:
+            f.write("".join(f"{mode}\n" for mode in modes))
+
+
+class ConnectorTest(FakeSysfsTest):
+    def test_reads_connected_modes(self):
+        self.connector("card1-HDMI-A-1", "connected", ["2560x1440", "1920x1080"])
+        self.connector("card1-HDMI-A-2", "disconnected", ["1280x720"])
+
+        connectors = read_connectors(self.root)
+        self.assertEqual(connectors, {
+            "card1-HDMI-A-1": ("connected", "2560x1440"),
+            "card1-HDMI-A-2": ("disconnected", ""),
+        })
+        self.assertEqual(connected_resolution(connectors), (2560, 1440))
+        self.assertEqual(get_screen_resolution(self.root), (2560, 1440))
+
+    def test_falls_back_to_modes_of_unknown_connectors(self):
+        self.connector("card1-DSI-1", "unknown", ["800x480"])
+        self.connector("card1-HDMI-A-1", "disconnected", ["1920x1080"])
+        self.assertEqual(get_screen_resolution(self.root), (800, 480))
+
+    def test_no_display(self):
+        self.connector("card1-HDMI-A-1", "disconnected", ["1920x1080"])
+        self.assertIsNone(get_screen_resolution(self.root))
+        self.assertIsNone(get_screen_resolution(os.path.join(self.root, "missing")))
+
+
+class WatcherTest(FakeSysfsTest):
+    def setUp(self):
+        super().setUp()
+        self.connector("card1-HDMI-A-1", "disconnected")
+        self.changes = []
+        self.watcher = DrmConnectorWatcher(self.changes.append, drm_root=self.root)
+
+    def test_parse_uevent(self):
+        event = parse_uevent(uevent("change", SUBSYSTEM="drm", HOTPLUG="1"))
+        self.assertEqual(event, {"SUBSYSTEM": "drm", "HOTPLUG": "1"})
+        self.assertIsNone(parse_uevent(b"libudev\0SUBSYSTEM=drm"))
+
+    def test_hotplug_uevent_updates_connectors(self):
+        self.connector("card1-HDMI-A-1", "connected", ["1920x1080"])
+
+        self.assertTrue(self.watcher.handle_uevent(uevent("change", SUBSYSTEM="drm", HOTPLUG="1")))
+        self.assertEqual(self.changes, [{"card1-HDMI-A-1": ("connected", "1920x1080")}])
+        self.assertEqual(self.watcher.uevents, 1)
+
+    def test_unchanged_connectors_are_not_reported(self):
+        self.assertFalse(self.watcher.handle_uevent(uevent("change", SUBSYSTEM="drm", HOTPLUG="1")))
+        self.assertEqual(self.changes, [])
+
+    def test_other_subsystems_are_ignored(self):
+        self.connector("card1-HDMI-A-1", "connected", ["1920x1080"])
+        self.assertFalse(self.watcher.handle_uevent(uevent("add", SUBSYSTEM="usb")))
+        self.assertEqual(self.watcher.uevents, 0)
+        self.assertEqual(self.changes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
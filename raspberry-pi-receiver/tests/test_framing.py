@@ -0,0 +1,44 @@
+import unittest
+
+from deskextend_receiver.utils.framing import SEQUENCE_MASK, SequenceTracker
+
+
+class SequenceTrackerTest(unittest.TestCase):
+    def observe(self, *sequences):
+        tracker = SequenceTracker()
+        for sequence in sequences:
+            tracker.observe(sequence)
+        return tracker
+
+    def test_in_order(self):
+        tracker = self.observe(5, 6, 7, 8)
+        self.assertEqual((tracker.received, tracker.gaps, tracker.lost, tracker.reordered), (4, 0, 0, 0))
+        self.assertEqual(tracker.expected, 9)
+
+    def test_wraparound_is_not_a_gap(self):
+        tracker = self.observe(SEQUENCE_MASK - 1, SEQUENCE_MASK, 0, 1)
+        self.assertEqual((tracker.gaps, tracker.lost, tracker.reordered), (0, 0, 0))
+        self.assertEqual(tracker.expected, 2)
+
+    def test_gap_across_wraparound(self):
+        tracker = self.observe(SEQUENCE_MASK - 1, 2)
+        self.assertEqual((tracker.gaps, tracker.lost), (3, 3))
+        self.assertEqual(tracker.expected, 3)
+
+    def test_gaps_count_missing_frames(self):
+        tracker = self.observe(10, 13, 14, 20)
+        self.assertEqual((tracker.gaps, tracker.lost, tracker.reordered), (7, 7, 0))
+
+    def test_late_frame_is_reordered_not_lost(self):
+        tracker = self.observe(10, 12, 11, 13)
+        self.assertEqual((tracker.gaps, tracker.lost, tracker.reordered), (1, 0, 1))
+        self.assertEqual(tracker.expected, 14)
+
+    def test_late_frame_across_wraparound(self):
+        tracker = self.observe(SEQUENCE_MASK - 1, 0, SEQUENCE_MASK, 1)
+        self.assertEqual((tracker.gaps, tracker.lost, tracker.reordered), (1, 0, 1))
+        self.assertEqual(tracker.expected, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
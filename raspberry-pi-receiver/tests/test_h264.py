@@ -0,0 +1,145 @@
+import unittest
+
+from deskextend_receiver.utils.h264 import (
+    ANNEX_B_START,
+    FRAME_CONFIG,
+    FRAME_IDR,
+    FRAME_NONREF,
+    FRAME_REF,
+    FRAME_UNKNOWN,
+    ParameterSetCache,
+    classify_access_unit,
+    parse_sps,
+)
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def u(self, count, value):
+        self.bits.extend((value >> shift) & 1 for shift in range(count - 1, -1, -1))
+        return self
+
+    def ue(self, value):
+        value += 1
+        length = value.bit_length()
+        return self.u(length - 1, 0).u(length, value)
+
+    def rbsp(self):
+        bits = self.bits + [1]
+        bits += [0] * (-len(bits) % 8)
+        data = bytes(int("".join(map(str, bits[offset:offset + 8])), 2) for offset in range(0, len(bits), 8))
+        escaped = bytearray()
+        zeros = 0
+        for byte in data:
+            if zeros >= 2 and byte <= 3:
+                escaped.append(3)
+                zeros = 0
+            escaped.append(byte)
+            zeros = zeros + 1 if byte == 0 else 0
+        return bytes(escaped)
+
+
+def make_sps(profile=100, level=40, width_mbs=120, height_mbs=68, crop_bottom=4, poc_type=0, sps_id=0):
+    writer = BitWriter().u(8, profile).u(8, 0).u(8, level).ue(sps_id)
+    if profile >= 100:
+        writer.ue(1).ue(0).ue(0).u(1, 0).u(1, 0)
+    writer.ue(0).ue(poc_type)
+    if poc_type == 0:
+        writer.ue(0)
+    elif poc_type == 1:
+        writer.u(1, 0).ue(0).ue(0).ue(2).ue(1).ue(3)
+    writer.ue(1).u(1, 0).ue(width_mbs - 1).ue(height_mbs - 1).u(1, 1).u(1, 1)
+    if crop_bottom:
+        writer.u(1, 1).ue(0).ue(0).ue(0).ue(crop_bottom)
+    else:
+        writer.u(1, 0)
+    writer.u(1, 0)
+    return b"\x67" + writer.rbsp()
+
+
+PPS = b"\x68\xee\x3c\x80"
+IDR_SLICE = b"\x65\x88\x84\x00"
+REF_SLICE = b"\x41\x9a\x02"
+NONREF_SLICE = b"\x01\x9e\x04"
+SEI = b"\x06\x05\x01\x80"
+
+
+def annex_b(*units):
+    return b"".join(ANNEX_B_START + unit for unit in units)
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_slice_types(self):
+        self.assertEqual(classify_access_unit(annex_b(make_sps(), PPS, IDR_SLICE)), FRAME_IDR)
+        self.assertEqual(classify_access_unit(annex_b(REF_SLICE)), FRAME_REF)
+        self.assertEqual(classify_access_unit(annex_b(b"\x61\x9a")), FRAME_REF)
+        self.assertEqual(classify_access_unit(annex_b(NONREF_SLICE)), FRAME_NONREF)
+        self.assertEqual(classify_access_unit(annex_b(SEI, NONREF_SLICE)), FRAME_NONREF)
+
+    def test_config_and_unknown(self):
+        self.assertEqual(classify_access_unit(annex_b(make_sps(), PPS)), FRAME_CONFIG)
+        self.assertEqual(classify_access_unit(annex_b(SEI)), FRAME_UNKNOWN)
+        self.assertEqual(classify_access_unit(b"\x12\x34\x56"), FRAME_UNKNOWN)
+        self.assertEqual(classify_access_unit(b""), FRAME_UNKNOWN)
+
+    def test_three_byte_start_codes(self):
+        self.assertEqual(classify_access_unit(b"\x00\x00\x01" + IDR_SLICE), FRAME_IDR)
+
+    def test_bounds_limit_the_scan(self):
+        data = b"junk" + annex_b(NONREF_SLICE) + annex_b(IDR_SLICE)
+        first_end = 4 + len(annex_b(NONREF_SLICE))
+        self.assertEqual(classify_access_unit(data, 4, first_end), FRAME_NONREF)
+        self.assertEqual(classify_access_unit(data, first_end), FRAME_IDR)
+        self.assertEqual(classify_access_unit(bytearray(data), 0, 4), FRAME_UNKNOWN)
+
+
+class ParseSpsTest(unittest.TestCase):
+    def test_high_profile_1080p(self):
+        self.assertEqual(parse_sps(make_sps()), (100, 40, 1920, 1080))
+
+    def test_baseline_profile(self):
+        self.assertEqual(parse_sps(make_sps(profile=66, level=31, width_mbs=80, height_mbs=45, crop_bottom=0)),
+                         (66, 31, 1280, 720))
+
+    def test_poc_type_one(self):
+        self.assertEqual(parse_sps(make_sps(poc_type=1)), (100, 40, 1920, 1080))
+
+    def test_emulation_prevention_bytes_are_removed(self):
+        sps = make_sps(profile=66, level=0, width_mbs=1, height_mbs=1, crop_bottom=0, sps_id=63)
+        self.assertIn(b"\x00\x00\x03", sps)
+        self.assertEqual(parse_sps(sps), (66, 0, 16, 16))
+
+    def test_truncated_sps(self):
+        self.assertIsNone(parse_sps(make_sps()[:4]))
+
+
+class ParameterSetCacheTest(unittest.TestCase):
+    def test_caches_parameter_sets_from_an_idr(self):
+        cache = ParameterSetCache()
+        self.assertTrue(cache.observe(annex_b(make_sps(), PPS, IDR_SLICE)))
+        self.assertTrue(cache.ready())
+        self.assertEqual(cache.format, (100, 40, 1920, 1080))
+        self.assertEqual(cache.annex_b(), annex_b(make_sps(), PPS))
+
+    def test_ignores_units_after_the_first_slice(self):
+        cache = ParameterSetCache()
+        self.assertFalse(cache.observe(annex_b(REF_SLICE, make_sps(), PPS)))
+        self.assertFalse(cache.ready())
+
+    def test_format_change_drops_the_old_pps(self):
+        cache = ParameterSetCache()
+        cache.observe(annex_b(make_sps(), PPS))
+        cache.observe(annex_b(make_sps(width_mbs=80, height_mbs=45, crop_bottom=0)))
+        self.assertEqual(cache.format, (100, 40, 1280, 720))
+        self.assertFalse(cache.ready())
+
+    def test_incomplete_head_skips_the_last_unit(self):
+        cache = ParameterSetCache()
+        self.assertTrue(cache.observe(annex_b(make_sps(), PPS[:2]), complete=False))
+        self.assertIsNone(cache.pps)
+
+
+if __name__ == "__main__":
+    unittest.main()
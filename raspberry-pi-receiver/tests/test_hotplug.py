@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.utils.hotplug import DeviceWatcher, inotify_available
+
+
+@unittest.skipUnless(inotify_available(), "inotify not available")
+class DeviceWatcherTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.watcher = DeviceWatcher(self.root)
+        self.addCleanup(self.watcher.close)
+
+    def touch(self, *parts):
+        with open(os.path.join(self.root, *parts), "w"):
+            pass
+
+    def test_unrelated_devices_are_ignored(self):
+        for name in ("tty5", "pts0", "input-event3", "null"):
+            self.touch(name)
+        self.assertFalse(self.watcher.wait(0.5))
+        self.assertEqual(self.watcher.events, 4)
+
+    def test_accessory_names_wake_the_watcher(self):
+        for name in ("ttyACM0", "ttyGS0", "ttyUSB1"):
+            with self.subTest(name=name):
+                self.touch(name)
+                self.assertTrue(self.watcher.wait(0.5))
+
+    def test_serial_by_id_is_watched_once_created(self):
+        os.makedirs(os.path.join(self.root, "serial", "by-id"))
+        self.assertTrue(self.watcher.wait(0.5))
+        self.touch("serial", "by-id", "usb-DeskExtend-if00")
+        self.assertTrue(self.watcher.wait(0.5))
+
+
+class FakeWatcher:
+    def __init__(self, receiver, results):
+        self.receiver = receiver
+        self.results = list(results)
+        self.timeouts = []
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        self.timeouts.append(timeout)
+        if not self.results:
+            self.receiver.running = False
+            self.done.set()
+            return False
+        return self.results.pop(0)
+
+    def close(self):
+        pass
+
+
+class UsbMonitorTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            "DESKEXTEND_CACHE_DIR": cache_dir.name,
+            "DESKEXTEND_USB_RESCAN_INTERVAL": "30",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with mock.patch.object(VideoReceiver, "start_usb_gadget_setup"):
+            self.receiver = VideoReceiver(mode="usb")
+        self.receiver.running = True
+
+    def run_monitor(self, results):
+        watcher = FakeWatcher(self.receiver, results)
+        with mock.patch.object(self.receiver, "open_usb_watcher", return_value=watcher), \
+                mock.patch.object(self.receiver, "refresh_usb_devices") as refresh:
+            self.receiver.start_usb_monitor()
+            self.assertTrue(watcher.done.wait(2.0))
+            self.receiver.usb_monitor_thread.join(2.0)
+        return refresh, watcher
+
+    def test_unrelated_events_do_not_rescan_while_idle(self):
+        refresh, watcher = self.run_monitor([False] * 20)
+        refresh.assert_not_called()
+        self.assertTrue(all(0 < timeout <= 30 for timeout in watcher.timeouts))
+
+    def test_accessory_events_rescan(self):
+        refresh, _ = self.run_monitor([False, True, False, True])
+        self.assertEqual(refresh.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver import core
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.utils.h264 import FRAME_REF
+from deskextend_receiver.utils.metrics import CONTENT_TYPE, Histogram, MetricsRegistry
+from deskextend_receiver.utils.reassembly import StreamFrame
+
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"'
+SAMPLE = re.compile(rf'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{{{LABEL}(?:,{LABEL})*\}})? (-?[0-9.e+-]+|NaN|[+-]Inf)$')
+
+
+class HistogramTest(unittest.TestCase):
+    def setUp(self):
+        self.histogram = Histogram((0.001, 0.01, 0.1))
+
+    def observe(self, *values):
+        for value in values:
+            self.histogram.observe(value)
+
+    def test_values_land_in_their_buckets(self):
+        self.observe(0.0005, 0.001, 0.005, 0.05, 0.5, 2.0)
+
+        self.assertEqual(self.histogram.counts, [2, 1, 1, 2])
+        self.assertEqual(self.histogram.count, 6)
+        self.assertAlmostEqual(self.histogram.sum, 2.5565)
+        self.assertEqual(self.histogram.max, 2.0)
+
+    def test_cumulative_ends_at_infinity(self):
+        self.observe(0.0005, 0.005, 0.005, 0.5)
+        self.assertEqual(list(self.histogram.cumulative()),
+                         [(0.001, 1), (0.01, 3), (0.1, 3), (float("inf"), 4)])
+
+    def test_quantile_reports_the_bucket_bound(self):
+        self.observe(*[0.005] * 90, *[0.05] * 9, 0.08)
+
+        self.assertEqual(self.histogram.quantile(0.5), 0.01)
+        self.assertEqual(self.histogram.quantile(0.95), 0.08)
+        self.assertEqual(self.histogram.quantile(0.99), 0.08)
+
+    def test_quantile_is_capped_by_the_maximum(self):
+        self.observe(0.002, 0.003)
+        self.assertEqual(self.histogram.quantile(0.5), 0.003)
+
+    def test_overflow_bucket_reports_the_maximum(self):
+        self.observe(0.005, 3.0, 4.0)
+        self.assertEqual(self.histogram.quantile(0.99), 4.0)
+
+    def test_summary_is_scaled(self):
+        self.assertEqual(self.histogram.summary(),
+                         {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0})
+        self.observe(0.002, 0.004)
+
+        summary = self.histogram.summary()
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["avg"], 3.0)
+        self.assertEqual(summary["p50"], 4.0)
+        self.assertEqual(summary["max"], 4.0)
+
+    def test_reset(self):
+        self.observe(0.005, 0.5)
+        self.histogram.reset()
+
+        self.assertEqual(self.histogram.counts, [0, 0, 0, 0])
+        self.assertEqual((self.histogram.count, self.histogram.sum, self.histogram.max), (0, 0.0, 0.0))
+        self.assertEqual(self.histogram.quantile(0.5), 0.0)
+
+
+class RegistryHistogramTest(unittest.TestCase):
+    def test_render_histogram(self):
+        registry = MetricsRegistry()
+        registry.histogram("deskextend_latency_seconds", "Frame latency.", buckets=(0.01, 0.1))
+        labels = (("transport", "USB"),)
+        registry.observe("deskextend_latency_seconds", 0.005, labels)
+        registry.observe("deskextend_latency_seconds", 0.5, labels)
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines, [
+            "# HELP deskextend_latency_seconds Frame latency.",
+            "# TYPE deskextend_latency_seconds histogram",
+            'deskextend_latency_seconds_bucket{transport="USB",le="0.01"} 1',
+            'deskextend_latency_seconds_bucket{transport="USB",le="0.1"} 1',
+            'deskextend_latency_seconds_bucket{transport="USB",le="+Inf"} 2',
+            'deskextend_latency_seconds_sum{transport="USB"} 0.505',
+            'deskextend_latency_seconds_count{transport="USB"} 2',
+        ])
+        self.assertEqual(registry.histogram_summaries("deskextend_latency_seconds"),
+                         [({"transport": "USB"}, registry.histograms[("deskextend_latency_seconds", labels)].summary())])
+
+
+def parse_exposition(text):
+    types = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert name not in types, f"{name} described twice"
+            types[name] = metric_type
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"invalid sample line: {line!r}"
+        name = match.group(1)
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert family in types, f"{name} has no TYPE line"
+        samples[name + (match.group(2) or "")] = float(match.group(3))
+    return types, samples
+
+
+class ReceiverMetricsTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.stream_metric_labels = (("transport", "Network"),)
+        self.receiver.active_transport = "Network"
+        with mock.patch.object(self.receiver, "hide_chromium_kiosk"):
+            self.receiver.mark_stream_connected("Network")
+            self.receiver.mark_stream_connected("USB")
+        self.receiver.record_written_frames([StreamFrame((), 0, 0, FRAME_REF) for _ in range(3)], 0.0)
+        self.receiver.metrics.inc("deskextend_bytes_received_total", 4096, (("transport", "Network"),))
+        self.receiver.metrics.inc("deskextend_frames_dropped_total", 2, (("transport", "USB"), ("reason", "overflow")))
+        self.receiver.metrics.observe("deskextend_frame_latency_seconds", 0.012, (("transport", "Network"), ("stage", "total")))
+
+    def test_registry_renders_labelled_counters_and_gauges(self):
+        types, samples = parse_exposition(self.receiver.metrics.render())
+
+        self.assertEqual(types["deskextend_frames_written_total"], "counter")
+        self.assertEqual(types["deskextend_active_streams"], "gauge")
+        self.assertEqual(samples['deskextend_frames_written_total{transport="Network"}'], 3)
+        self.assertEqual(samples['deskextend_bytes_received_total{transport="Network"}'], 4096)
+        self.assertEqual(samples['deskextend_frames_dropped_total{transport="USB",reason="overflow"}'], 2)
+        self.assertEqual(samples['deskextend_stream_connections_total{transport="USB"}'], 1)
+        self.assertEqual(samples['deskextend_active_transport{transport="Network"}'], 1)
+        self.assertEqual(samples['deskextend_active_transport{transport="USB"}'], 0)
+        self.assertEqual(samples["deskextend_active_streams"], 2)
+        self.assertEqual(samples["deskextend_decoder_up"], 0)
+        self.assertEqual(types["deskextend_frame_latency_seconds"], "histogram")
+        self.assertEqual(samples['deskextend_frame_latency_seconds_count{transport="Network",stage="total"}'], 1)
+        self.assertEqual(samples['deskextend_frame_latency_seconds_bucket{transport="Network",stage="total",le="+Inf"}'], 1)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("deskextend_decoder_starts_total", "Decoder pipelines started")
+        registry.inc("deskextend_decoder_starts_total", 1, (("pipeline", 'v4l2 "hw"\\path\nnext'),))
+
+        _, samples = parse_exposition(registry.render())
+        self.assertEqual(samples['deskextend_decoder_starts_total{pipeline="v4l2 \\"hw\\"\\\\path\\nnext"}'], 1)
+
+    @unittest.skipUnless(core.Flask and core.psutil, "Flask/psutil not available")
+    def test_metrics_endpoint(self):
+        with mock.patch.object(core.threading, "Thread"), mock.patch.object(self.receiver, "start_display_monitor"):
+            self.receiver.start_web_server()
+        response = self.receiver.app.test_client().get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], CONTENT_TYPE)
+        _, samples = parse_exposition(response.get_data(as_text=True))
+        self.assertEqual(samples['deskextend_frames_written_total{transport="Network"}'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
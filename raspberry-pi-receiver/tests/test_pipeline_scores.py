@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver import core
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services.pipeline_scores import MIN_SCORED_SECONDS, PipelineScoreboard, score_entry
+
+HARDWARE = {"name": "Hardware v4l2 + autovideosink", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "v4l2h264dec"]}
+SOFTWARE = {"name": "Software avdec + autovideosink", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "avdec_h264"]}
+VAAPI = {"name": "VAAPI + vaapisink", "cmd": ["gst-launch-1.0", "fdsrc", "fd=0", "!", "vaapih264dec"]}
+
+
+def entry(**fields):
+    return {"sessions": 1, "frames": 0, "seconds": MIN_SCORED_SECONDS, "dropped_buffers": 0, "late_frames": 0,
+            "restarts": 0, "cpu_seconds": 0.0, "cpu_seconds_sampled": 0.0, **fields}
+
+
+class ScoreEntryTest(unittest.TestCase):
+    def test_needs_thirty_seconds_of_streaming(self):
+        self.assertIsNone(score_entry(entry(frames=1000, seconds=MIN_SCORED_SECONDS - 0.1)))
+        self.assertEqual(score_entry(entry(frames=1000)), 100.0)
+
+    def test_sender_frame_rate_does_not_matter(self):
+        slow_sender = entry(frames=300)
+        fast_sender = entry(frames=1800, dropped_buffers=180)
+        self.assertGreater(score_entry(slow_sender), score_entry(fast_sender))
+        self.assertEqual(score_entry(entry(frames=300)), score_entry(entry(frames=1800)))
+
+    def test_decoder_side_losses_lower_the_score(self):
+        self.assertAlmostEqual(score_entry(entry(frames=900, dropped_buffers=90)), 90.0)
+        self.assertAlmostEqual(score_entry(entry(frames=900, late_frames=100)), 90.0)
+        self.assertEqual(score_entry(entry(frames=10, dropped_buffers=50)), 0.0)
+
+    def test_restarts_are_normalized_per_session(self):
+        self.assertAlmostEqual(score_entry(entry(frames=900, restarts=1, sessions=1)), 50.0)
+        self.assertAlmostEqual(score_entry(entry(frames=900, restarts=1, sessions=4)), 80.0)
+
+    def test_cpu_load_costs_up_to_a_quarter(self):
+        self.assertAlmostEqual(score_entry(entry(frames=900, cpu_seconds=30.0, cpu_seconds_sampled=30.0), cpu_count=2), 87.5)
+        self.assertAlmostEqual(score_entry(entry(frames=900, cpu_seconds=90.0, cpu_seconds_sampled=30.0), cpu_count=2), 75.0)
+
+
+class ScoreboardTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "scores", "pipeline-scores.json")
+        self.scores = PipelineScoreboard(self.path)
+
+    def stream(self, pipeline_info, frames, dropped=0, late=0, restarts=0, seconds=MIN_SCORED_SECONDS):
+        self.scores.record_session(pipeline_info, "subprocess")
+        self.scores.record_sample(pipeline_info, "subprocess", frames, seconds, dropped, None, late)
+        for _ in range(restarts):
+            self.scores.record_restart(pipeline_info, "subprocess")
+
+    def test_scores_persist_across_restarts(self):
+        self.stream(HARDWARE, 1800, dropped=18)
+        self.scores.save()
+
+        reloaded = PipelineScoreboard(self.path)
+        self.assertEqual(reloaded.score(HARDWARE, "subprocess"), self.scores.score(HARDWARE, "subprocess"))
+        self.assertAlmostEqual(reloaded.score(HARDWARE, "subprocess"), 99.0)
+        self.assertIsNone(reloaded.score(HARDWARE, "appsrc"))
+        summary, = reloaded.summary()
+        self.assertEqual((summary["name"], summary["fps"], summary["delivered_percent"]), (HARDWARE["name"], 60.0, 99.0))
+
+    def test_save_only_writes_changes(self):
+        self.scores.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.stream(HARDWARE, 100)
+        self.scores.save()
+        os.remove(self.path)
+        self.scores.save()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unreadable_file_starts_empty(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(PipelineScoreboard(self.path).entries, {})
+
+    def test_old_entries_without_late_frames_still_score(self):
+        os.makedirs(os.path.dirname(self.path))
+        self.stream(HARDWARE, 900)
+        legacy = dict(self.scores.entries)
+        for value in legacy.values():
+            del value["late_frames"]
+        with open(self.path, "w") as f:
+            json.dump({"pipelines": legacy}, f)
+
+        reloaded = PipelineScoreboard(self.path)
+        self.assertEqual(reloaded.score(HARDWARE, "subprocess"), 100.0)
+        reloaded.record_sample(HARDWARE, "subprocess", 100, 1.0, late_frames=100)
+        self.assertAlmostEqual(reloaded.score(HARDWARE, "subprocess"), 90.9, places=1)
+
+    def test_rank_puts_scored_pipelines_first(self):
+        pipelines = [HARDWARE, SOFTWARE, VAAPI]
+        self.assertEqual(self.scores.rank(pipelines, "subprocess"), pipelines)
+
+        self.stream(HARDWARE, 1800, dropped=400)
+        self.stream(VAAPI, 600)
+        self.stream(SOFTWARE, 600, seconds=5.0)
+        self.assertEqual(self.scores.rank(pipelines, "subprocess"), [VAAPI, HARDWARE, SOFTWARE])
+
+
+class FakeDecoder:
+    backend = "subprocess"
+    qos_dropped = 0
+    pid = None
+
+    def __init__(self, pipeline_info, backend="subprocess", env=None, pipe_size=0):
+        self.name = pipeline_info["name"]
+        self.pipeline_info = pipeline_info
+
+    def start(self, settle_time):
+        return True
+
+    def is_alive(self):
+        return True
+
+
+class ReceiverScoringTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = 100.0
+        patcher = mock.patch.object(core.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.parallel_probe = False
+        self.receiver.stream_metric_labels = (("transport", "Network"),)
+        patcher = mock.patch.object(self.receiver, "arrange_decoder_window")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_start_decoder_tries_the_best_scored_pipeline_first(self):
+        scores = self.receiver.pipeline_scores
+        scores.record_session(SOFTWARE, "subprocess")
+        scores.record_sample(SOFTWARE, "subprocess", 900, MIN_SCORED_SECONDS)
+        scores.record_session(HARDWARE, "subprocess")
+        scores.record_sample(HARDWARE, "subprocess", 1800, MIN_SCORED_SECONDS, 900)
+
+        with mock.patch.object(core, "create_decoder", FakeDecoder):
+            self.assertTrue(self.receiver.start_decoder([HARDWARE, SOFTWARE]))
+        self.assertEqual(self.receiver.decoder.name, SOFTWARE["name"])
+
+    def test_idle_gaps_are_not_scored(self):
+        self.receiver.decoder = FakeDecoder(HARDWARE)
+        self.receiver.reset_decoder_sample()
+        for _ in range(10):
+            self.now += 0.1
+            self.receiver.count_decoder_frame()
+        self.now += 10.0
+        for _ in range(5):
+            self.receiver.count_decoder_frame()
+            self.now += 0.1
+        self.receiver.metrics.inc("deskextend_frames_dropped_total", 2, (("transport", "Network"), ("reason", "overflow")))
+        self.receiver.sample_decoder_performance()
+
+        entry, = self.receiver.pipeline_scores.entries.values()
+        self.assertEqual(entry["frames"], 5)
+        self.assertAlmostEqual(entry["seconds"], 0.5)
+        self.assertEqual(entry["late_frames"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.utils.framing import pack_v1_frame
+from deskextend_receiver.utils.h264 import ANNEX_B_START, FRAME_CONFIG, classify_access_unit
+from deskextend_receiver.utils.reassembly import FrameReassembler
+
+SPS = bytes.fromhex("67640028ace80780227e54")
+PPS = b"\x68\xee\x3c\x80"
+PARAMETER_SETS = ANNEX_B_START + SPS + ANNEX_B_START + PPS
+IDR = ANNEX_B_START + b"\x65\x88\x84\x00"
+SLICE = ANNEX_B_START + b"\x41\x9a\x02"
+LABELS = (("transport", "Network"),)
+
+
+class WriteLog:
+    name = "Software avdec + autovideosink"
+    backend = "subprocess"
+    blocked_seconds = 0.0
+    write_calls = 0
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, frame):
+        self.written.append((frame.kind, b"".join(bytes(segment) for segment in frame.segments)))
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write(frame)
+
+
+class PrimeDecoderTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.stream_metric_labels = LABELS
+        self.reassembler = FrameReassembler(64 * 1024, 1024 * 1024, classify=classify_access_unit)
+
+    def write(self, decoder, *payloads):
+        self.receiver.decoder = decoder
+        for payload in payloads:
+            self.reassembler.write(pack_v1_frame(payload))
+            frame = self.reassembler.next_frame()
+            self.receiver.write_frame_to_decoder(frame)
+            self.reassembler.release(frame)
+
+    def injections(self):
+        return self.receiver.metrics.get("deskextend_parameter_set_injections_total", LABELS)
+
+    def test_new_decoder_gets_cached_parameter_sets_first(self):
+        self.write(WriteLog(), PARAMETER_SETS + IDR, SLICE)
+        replacement = WriteLog()
+        self.write(replacement, SLICE, IDR)
+
+        self.assertEqual(replacement.written[0], (FRAME_CONFIG, PARAMETER_SETS))
+        self.assertEqual([data for _, data in replacement.written[1:]], [SLICE, IDR])
+        self.assertEqual(self.injections(), 1)
+
+    def test_each_decoder_is_primed_once(self):
+        self.write(WriteLog(), PARAMETER_SETS + IDR)
+        replacement = WriteLog()
+        self.write(replacement, SLICE, SLICE, IDR)
+
+        self.assertEqual(sum(1 for kind, _ in replacement.written if kind == FRAME_CONFIG), 1)
+        self.assertEqual(len(replacement.written), 4)
+
+    def test_not_primed_until_parameter_sets_are_cached(self):
+        self.assertFalse(self.receiver.parameter_sets.ready())
+        decoder = WriteLog()
+        self.write(decoder, SLICE, IDR)
+
+        self.assertEqual([data for _, data in decoder.written], [SLICE, IDR])
+        self.assertEqual(self.injections(), 0)
+
+    def test_not_primed_when_the_first_frame_carries_them(self):
+        self.write(WriteLog(), PARAMETER_SETS + IDR)
+        replacement = WriteLog()
+        self.write(replacement, PARAMETER_SETS + IDR)
+
+        self.assertEqual([data for _, data in replacement.written], [PARAMETER_SETS + IDR])
+        self.assertEqual(self.injections(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+
+from deskextend_receiver.utils.framing import PROTOCOL_V1, V1_HEADER, pack_v1_frame
+from deskextend_receiver.utils.h264 import FRAME_IDR, FRAME_NONREF, FRAME_REF
+from deskextend_receiver.utils.reassembly import FRAME_SKIPPED, FrameIndex, FrameReassembler, FrameSizeError
+
+
+def payload(number, size):
+    return bytes((number + offset) & 0xFF for offset in range(size))
+
+
+def frame_bytes(frame):
+    return b"".join(bytes(segment) for segment in frame.segments)
+
+
+class FrameReassemblerTest(unittest.TestCase):
+    def test_frames_split_across_reads(self):
+        reassembler = FrameReassembler(4096, 4096)
+        data = pack_v1_frame(payload(1, 100)) + pack_v1_frame(payload(2, 50))
+        for offset in range(0, len(data), 7):
+            reassembler.write(data[offset:offset + 7])
+
+        self.assertEqual(reassembler.protocol, PROTOCOL_V1)
+        first = reassembler.next_frame()
+        second = reassembler.next_frame()
+        self.assertIsNone(reassembler.next_frame())
+        self.assertEqual(frame_bytes(first), payload(1, 100))
+        self.assertEqual(frame_bytes(second), payload(2, 50))
+        self.assertEqual((first.number, second.number), (0, 1))
+
+    def test_wraparound_keeps_frames_intact(self):
+        reassembler = FrameReassembler(300, 4096)
+        previous = None
+        wrapped = 0
+        for number in range(50):
+            size = 90 + number % 7
+            reassembler.write(pack_v1_frame(payload(number, size)))
+            frame = reassembler.next_frame()
+            self.assertEqual(frame_bytes(frame), payload(number, size))
+            if len(frame.segments) == 2:
+                wrapped += 1
+            if previous is not None:
+                reassembler.release(previous)
+            previous = frame
+        reassembler.release(previous)
+
+        self.assertGreater(wrapped, 0)
+        self.assertEqual(reassembler.grow_count, 0)
+        self.assertEqual(reassembler.copied_bytes, 0)
+        self.assertEqual(reassembler.pending(), 0)
+
+    def test_out_of_order_release_frees_space_in_order(self):
+        reassembler = FrameReassembler(300, 4096)
+        reassembler.write(pack_v1_frame(payload(1, 100)) + pack_v1_frame(payload(2, 100)))
+        first = reassembler.next_frame()
+        second = reassembler.next_frame()
+        free_before = reassembler.free_space()
+
+        reassembler.release(second)
+        self.assertEqual(reassembler.free_space(), free_before)
+        reassembler.release(first)
+        self.assertEqual(reassembler.free_space(), reassembler.capacity)
+
+    def test_growth_while_frames_are_held(self):
+        reassembler = FrameReassembler(300, 4096)
+        reassembler.write(pack_v1_frame(payload(1, 120)))
+        held = reassembler.next_frame()
+
+        reassembler.write(pack_v1_frame(payload(2, 1000)))
+        grown = reassembler.next_frame()
+
+        self.assertEqual(reassembler.grow_count, 1)
+        self.assertGreaterEqual(reassembler.capacity, 1004)
+        self.assertEqual(frame_bytes(held), payload(1, 120))
+        self.assertEqual(frame_bytes(grown), payload(2, 1000))
+        reassembler.release(held)
+        reassembler.release(grown)
+
+        reassembler.write(pack_v1_frame(payload(3, 500)))
+        self.assertEqual(frame_bytes(reassembler.next_frame()), payload(3, 500))
+
+    def test_full_buffer_refuses_more_data(self):
+        reassembler = FrameReassembler(300, 4096)
+        reassembler.write(pack_v1_frame(payload(1, 200)))
+        held = reassembler.next_frame()
+        with self.assertRaises(BufferError):
+            reassembler.write(pack_v1_frame(payload(2, 200)))
+        reassembler.release(held)
+
+    def test_oversize_frame_is_rejected(self):
+        reassembler = FrameReassembler(4096, 1000)
+        reassembler.write(pack_v1_frame(payload(1, 10)))
+        reassembler.write(V1_HEADER.pack(1001))
+
+        self.assertEqual(frame_bytes(reassembler.next_frame()), payload(1, 10))
+        with self.assertRaises(FrameSizeError) as raised:
+            reassembler.next_frame()
+        self.assertEqual(raised.exception.frame_size, 1001)
+        self.assertEqual(reassembler.grow_count, 0)
+
+
+class FrameIndexTest(unittest.TestCase):
+    def fill(self, index, start, count):
+        for number in range(start, start + count):
+            index.append(number * 100, number, FRAME_REF, arrival=float(number), sequence=number)
+
+    def test_append_and_popleft_wrap_around(self):
+        index = FrameIndex(capacity=4)
+        self.fill(index, 0, 3)
+        self.assertEqual(index.popleft()[0], 0)
+        self.assertEqual(index.popleft()[0], 100)
+        self.fill(index, 3, 3)
+
+        self.assertEqual(index.capacity, 4)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.first_number(), 2)
+        self.assertEqual([index.offset_at(position) for position in range(4)], [200, 300, 400, 500])
+
+    def test_growth_preserves_order(self):
+        index = FrameIndex(capacity=4)
+        self.fill(index, 0, 3)
+        index.popleft()
+        index.popleft()
+        self.fill(index, 3, 6)
+
+        self.assertEqual(index.capacity, 8)
+        self.assertEqual(index.first_number(), 2)
+        popped = [index.popleft() for _ in range(len(index))]
+        self.assertEqual([entry[0] for entry in popped], [number * 100 for number in range(2, 9)])
+        self.assertEqual([entry[1] for entry in popped], list(range(2, 9)))
+        self.assertEqual([entry[4] for entry in popped], list(range(2, 9)))
+        self.assertEqual([entry[7] for entry in popped], [float(number) for number in range(2, 9)])
+
+    def test_discard_and_skip(self):
+        index = FrameIndex(capacity=4)
+        self.fill(index, 0, 4)
+        index.mark_skipped(2)
+        index.discard(2)
+
+        self.assertEqual(index.first_number(), 2)
+        self.assertEqual(index.kind_at(0), FRAME_REF | FRAME_SKIPPED)
+        self.assertEqual(index.kind_at(1), FRAME_REF)
+        index.discard(10)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.total, 4)
+
+
+class DropPolicyTest(unittest.TestCase):
+    def reassembler_with(self, kinds):
+        kinds_by_marker = {marker: kind for marker, kind in kinds}
+        reassembler = FrameReassembler(4096, 4096, classify=lambda data, start=0, end=None: kinds_by_marker[data[start]])
+        for marker, _ in kinds:
+            reassembler.write(pack_v1_frame(bytes([marker]) * 16))
+        return reassembler
+
+    def test_drop_stale_keeps_the_newest_frames(self):
+        reassembler = self.reassembler_with([(1, FRAME_REF), (2, FRAME_REF), (3, FRAME_REF)])
+        self.assertEqual(reassembler.drop_stale(1), (2 * (16 + V1_HEADER.size), 2))
+        self.assertEqual(frame_bytes(reassembler.next_frame()), bytes([3]) * 16)
+
+    def test_drop_to_decodable_skips_to_the_latest_idr(self):
+        reassembler = self.reassembler_with([(1, FRAME_REF), (2, FRAME_NONREF), (3, FRAME_IDR), (4, FRAME_REF)])
+        dropped_bytes, dropped = reassembler.drop_to_decodable(1)
+
+        self.assertEqual(dropped, 2)
+        self.assertEqual(dropped_bytes, 2 * (16 + V1_HEADER.size))
+        self.assertEqual(reassembler.next_frame().kind, FRAME_IDR)
+        self.assertEqual(reassembler.dropped_by_type["ref"], 1)
+        self.assertEqual(reassembler.dropped_by_type["nonref"], 1)
+
+    def test_drop_to_decodable_skips_nonref_frames_without_an_idr(self):
+        reassembler = self.reassembler_with([(1, FRAME_REF), (2, FRAME_NONREF), (3, FRAME_REF), (4, FRAME_NONREF)])
+        self.assertEqual(reassembler.drop_to_decodable(1), (16 + V1_HEADER.size, 1))
+        self.assertEqual([reassembler.next_frame().kind for _ in range(3)], [FRAME_REF, FRAME_REF, FRAME_NONREF])
+
+
+if __name__ == "__main__":
+    unittest.main()
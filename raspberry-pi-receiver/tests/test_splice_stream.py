@@ -0,0 +1,125 @@
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.utils.framing import PROTOCOL_V1, V1_HEADER
+from deskextend_receiver.utils.h264 import classify_access_unit
+from deskextend_receiver.utils.reassembly import FrameReassembler
+
+IDR = b"\x00\x00\x00\x01\x65" + b"\x88" * 27
+SLICE = b"\x00\x00\x00\x01\x41" + b"\x9a" * 27
+
+
+def v1_frame(payload):
+    return V1_HEADER.pack(len(payload)) + payload
+
+
+class SpliceDecoder:
+    backend = "subprocess"
+
+    def __init__(self, fail_after=None):
+        self.received = b""
+        self.fail_after = fail_after
+
+    def splice_from(self, fd, count):
+        if self.fail_after is not None and len(self.received) >= self.fail_after:
+            raise BrokenPipeError("decoder exited")
+        chunk = os.read(fd, min(count, 7))
+        self.received += chunk
+        return len(chunk)
+
+
+class SpliceStreamTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.running = True
+        self.reassembler = FrameReassembler(64 * 1024, 1024 * 1024)
+        self.sender, self.conn = socket.socketpair()
+        self.conn.settimeout(1.0)
+        self.addCleanup(self.sender.close)
+        self.addCleanup(self.conn.close)
+
+    def splice(self):
+        return self.receiver.splice_stream(self.conn, (("transport", "Network"),), self.reassembler)
+
+    def assert_resumed_at_frame_boundary(self):
+        self.assertEqual(self.reassembler.protocol, PROTOCOL_V1)
+        self.assertIs(self.reassembler.classify, classify_access_unit)
+        self.assertTrue(self.receiver.awaiting_idr)
+        self.assertEqual(self.conn.recv(len(IDR) + V1_HEADER.size), v1_frame(IDR))
+
+    def test_missing_decoder_falls_back_to_the_copy_path(self):
+        self.sender.sendall(v1_frame(SLICE) + v1_frame(IDR))
+        self.receiver.decoder = None
+
+        self.assertIsNone(self.splice())
+        self.assert_resumed_at_frame_boundary()
+
+    def test_recovery_waits_for_the_next_idr(self):
+        self.sender.sendall(v1_frame(SLICE) + v1_frame(IDR))
+        self.receiver.decoder = SpliceDecoder(fail_after=7)
+
+        with mock.patch.object(self.receiver, "recover_decoder", return_value=True) as recover:
+            self.assertIsNone(self.splice())
+
+        recover.assert_called_once()
+        self.assert_resumed_at_frame_boundary()
+
+    def test_failed_recovery_drops_the_connection(self):
+        self.sender.sendall(v1_frame(SLICE))
+        self.receiver.decoder = SpliceDecoder(fail_after=0)
+
+        with mock.patch.object(self.receiver, "recover_decoder", return_value=False), \
+                mock.patch.object(self.receiver, "show_chromium_kiosk"):
+            self.assertFalse(self.splice())
+
+    def test_frames_are_spliced_whole(self):
+        decoder = SpliceDecoder()
+        self.receiver.decoder = decoder
+        self.sender.sendall(v1_frame(SLICE) + v1_frame(IDR))
+        self.sender.close()
+
+        self.assertTrue(self.splice())
+        self.assertEqual(decoder.received, SLICE + IDR)
+        self.assertFalse(self.receiver.awaiting_idr)
+
+
+@unittest.skipUnless(hasattr(os, "splice"), "os.splice not available")
+class CanSpliceTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name, "DESKEXTEND_STREAM_SPLICE": "1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.decoder = SpliceDecoder()
+
+    def test_default_drop_policy_allows_splicing(self):
+        self.assertEqual(self.receiver.stream_drop_policy, "nal")
+        self.assertTrue(self.receiver.can_splice(None, False))
+
+    def test_enabled_drop_mechanisms_disable_splicing(self):
+        for attribute, value in (("max_frame_age", 0.05), ("stream_drop_backlog_bytes", 1024)):
+            with self.subTest(attribute=attribute), mock.patch.object(self.receiver, attribute, value):
+                with self.assertLogs("deskextend_receiver.core", "WARNING"):
+                    self.assertFalse(self.receiver.can_splice(None, False))
+
+    def test_serial_and_appsrc_disable_splicing(self):
+        with self.assertLogs("deskextend_receiver.core", "WARNING"):
+            self.assertFalse(self.receiver.can_splice(None, True))
+        self.receiver.decoder.backend = "appsrc"
+        with self.assertLogs("deskextend_receiver.core", "WARNING"):
+            self.assertFalse(self.receiver.can_splice(None, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,253 @@
+import os
+import select
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services import decoder as decoder_module
+from deskextend_receiver.services.decoder import DecoderStallError, SubprocessDecoder, set_pipe_size
+from deskextend_receiver.services.decoder_writer import DecoderWriter
+from deskextend_receiver.utils.reassembly import StreamFrame
+
+STUCK_PIPELINE = {"name": "stuck decoder", "cmd": [sys.executable, "-c", "import time; time.sleep(30)"]}
+
+
+class ReleaseLog:
+    def __init__(self):
+        self.released = []
+
+    def release(self, frame):
+        self.released.append(frame.number)
+
+
+def frame(size, number=0):
+    return StreamFrame((bytes(size),), size, 0, number=number)
+
+
+def payload(number, size):
+    return bytes((number + offset) & 0xFF for offset in range(size))
+
+
+def segmented_frame(number, *sizes):
+    segments = tuple(payload(number * 16 + index, size) for index, size in enumerate(sizes))
+    return StreamFrame(segments, sum(sizes), 0, number=number)
+
+
+def frame_bytes(frames):
+    return b"".join(bytes(segment) for frame in frames for segment in frame.segments)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class StuckDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = SubprocessDecoder(STUCK_PIPELINE, pipe_size=4096)
+        self.decoder.launch()
+        self.addCleanup(self.decoder.stop, 1.0)
+
+    def test_write_blocks_without_busy_looping_and_fails_once_killed(self):
+        errors = []
+
+        def write():
+            try:
+                self.decoder.write(frame(256 * 1024))
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        self.assertTrue(wait_until(lambda: self.decoder.stalled_for() > 0.2))
+        self.assertTrue(writer.is_alive())
+        self.assertLess(self.decoder.write_calls, 20)
+
+        self.decoder.kill()
+        writer.join(2.0)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], DecoderStallError)
+        self.assertIsNotNone(self.decoder.process.wait(2.0))
+        self.assertFalse(self.decoder.is_alive())
+        self.assertGreater(self.decoder.blocked_seconds, 0.2)
+
+
+class DecoderWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {
+            "DESKEXTEND_CACHE_DIR": cache_dir.name,
+            "DESKEXTEND_DECODER_STALL_TIMEOUT": "0.3",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.running = True
+        self.decoder = SubprocessDecoder(STUCK_PIPELINE, pipe_size=4096)
+        self.decoder.launch()
+        self.addCleanup(self.decoder.stop, 1.0)
+        self.receiver.decoder = self.decoder
+
+    def test_stalled_decoder_is_killed_and_recovered(self):
+        watchdog_stop = threading.Event()
+        self.addCleanup(watchdog_stop.set)
+        threading.Thread(target=self.receiver.run_decoder_watchdog, args=(watchdog_stop,), daemon=True).start()
+
+        with mock.patch.object(self.receiver, "start_decoder", return_value=False) as start_decoder, \
+                mock.patch.object(self.receiver, "recover_decoder", wraps=self.receiver.recover_decoder) as recover:
+            writer = DecoderWriter(ReleaseLog(), self.receiver.write_frame_to_decoder, on_error=lambda error: recover(error, None))
+            writer.start()
+            writer.push(frame(256 * 1024))
+            writer.thread.join(5.0)
+        failed_at = time.monotonic()
+
+        self.assertFalse(writer.thread.is_alive())
+        recover.assert_called_once()
+        error = recover.call_args[0][0]
+        self.assertIsInstance(error, DecoderStallError)
+        self.assertIs(writer.error, error)
+        start_decoder.assert_called_once()
+        self.assertFalse(self.decoder.is_alive())
+        self.assertEqual(
+            self.receiver.metrics.get("deskextend_decoder_stalls_total", (("pipeline", "stuck decoder"), ("backend", "subprocess"))),
+            1
+        )
+        self.assertLessEqual(self.receiver.decoder_stall_started, failed_at - 0.3)
+
+
+class ScriptedWritev:
+    def __init__(self, counts):
+        self.counts = list(counts)
+        self.sink = bytearray()
+        self.calls = []
+
+    def __call__(self, fd, buffers):
+        self.calls.append(len(buffers))
+        limit = self.counts.pop(0) if self.counts else None
+        if limit == 0:
+            raise BlockingIOError
+        data = b"".join(bytes(buffer) for buffer in buffers)
+        if limit is not None:
+            data = data[:limit]
+        self.sink += data
+        return len(data)
+
+
+class WritevTest(unittest.TestCase):
+    def decoder(self, counts):
+        decoder = SubprocessDecoder(STUCK_PIPELINE)
+        decoder.process = types.SimpleNamespace(stdin=types.SimpleNamespace(fileno=lambda: -1), poll=lambda: None)
+        writev = ScriptedWritev(counts)
+        for patcher in (
+            mock.patch.object(decoder_module.os, "writev", writev),
+            mock.patch.object(decoder, "wait_writable"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return decoder, writev
+
+    def test_partial_writes_resume_mid_segment(self):
+        frames = [segmented_frame(1, 100, 50), segmented_frame(2, 30), segmented_frame(3, 70, 0, 20)]
+        decoder, writev = self.decoder([1, 99, 0, 25, 25, 0, 0, 55, 1, 3])
+        decoder.write_frames(frames)
+
+        self.assertEqual(bytes(writev.sink), frame_bytes(frames))
+        self.assertEqual(decoder.wait_writable.call_count, 3)
+        self.assertEqual(decoder.write_calls, len(writev.calls))
+
+    def test_boundary_on_a_segment_edge(self):
+        frames = [segmented_frame(1, 64), segmented_frame(2, 64)]
+        decoder, writev = self.decoder([64, 64])
+        decoder.write_frames(frames)
+
+        self.assertEqual(bytes(writev.sink), frame_bytes(frames))
+        self.assertEqual(writev.calls, [2, 1])
+
+    def test_batches_are_split_at_iov_max(self):
+        frames = [segmented_frame(number, 7, 9) for number in range(5)]
+        decoder, writev = self.decoder([])
+        with mock.patch.object(decoder_module, "IOV_MAX", 4):
+            decoder.write_frames(frames)
+
+        self.assertEqual(bytes(writev.sink), frame_bytes(frames))
+        self.assertEqual(writev.calls, [4, 4, 2])
+
+    def test_frames_cross_a_real_pipe_boundary(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        os.set_blocking(write_fd, False)
+        capacity = set_pipe_size(write_fd, 4096)
+        decoder = SubprocessDecoder(STUCK_PIPELINE)
+        decoder.process = types.SimpleNamespace(stdin=types.SimpleNamespace(fileno=lambda: write_fd), poll=lambda: None)
+        decoder.poller = select.poll()
+        decoder.poller.register(write_fd, select.POLLOUT)
+        frames = [segmented_frame(number, 3000, 1500, 700) for number in range(8)]
+        expected = frame_bytes(frames)
+        received = bytearray()
+
+        def drain():
+            while len(received) < len(expected):
+                time.sleep(0.001)
+                received.extend(os.read(read_fd, 1000))
+
+        reader = threading.Thread(target=drain, daemon=True)
+        reader.start()
+        decoder.write_frames(frames[:3])
+        for single in frames[3:]:
+            decoder.write(single)
+        reader.join(5.0)
+
+        self.assertEqual(capacity, 4096)
+        self.assertEqual(bytes(received), expected)
+        self.assertGreater(decoder.write_calls, 8)
+        self.assertIsNone(decoder.blocked_since)
+
+
+class PipeSizeTest(unittest.TestCase):
+    def setUp(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        self.fd = write_fd
+
+    def test_resizes_the_pipe(self):
+        self.assertEqual(set_pipe_size(self.fd, 256 * 1024), 256 * 1024)
+
+    def test_falls_back_to_the_system_limit(self):
+        size = {"value": 65536}
+
+        def fake_fcntl(fd, command, argument=0):
+            if command == decoder_module.F_SETPIPE_SZ:
+                if argument > 128 * 1024:
+                    raise PermissionError("over pipe-max-size")
+                size["value"] = argument
+                return argument
+            return size["value"]
+
+        with tempfile.NamedTemporaryFile("w", suffix="pipe-max-size") as limit:
+            limit.write("131072\n")
+            limit.flush()
+            with mock.patch.object(decoder_module, "PIPE_MAX_SIZE_PATH", limit.name), \
+                    mock.patch.object(decoder_module.fcntl, "fcntl", fake_fcntl):
+                self.assertEqual(set_pipe_size(self.fd, 1024 * 1024), 128 * 1024)
+
+    def test_unreadable_limit_keeps_the_default_size(self):
+        with mock.patch.object(decoder_module, "PIPE_MAX_SIZE_PATH", os.path.join(tempfile.gettempdir(), "missing-pipe-max")), \
+                mock.patch.object(decoder_module.fcntl, "fcntl", side_effect=[PermissionError("denied"), 65536]):
+            self.assertEqual(set_pipe_size(self.fd, 1024 * 1024), 65536)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import pty
+import tempfile
+import termios
+import time
+import unittest
+
+from deskextend_receiver.services.decoder import set_pipe_size
+from deskextend_receiver.utils import tty
+from deskextend_receiver.utils.tty import MAX_READ_SIZE, EndpointStream, RawStream, RawTTY
+
+
+class RawTTYTest(unittest.TestCase):
+    def setUp(self):
+        self.host, follower = pty.openpty()
+        self.addCleanup(self.close_host)
+        self.path = os.ttyname(follower)
+        self.tty = RawTTY(self.path, timeout=0.1, write_timeout=0.5)
+        self.addCleanup(self.tty.close)
+        os.close(follower)
+
+    def close_host(self):
+        if self.host is not None:
+            os.close(self.host)
+        self.host = None
+
+    def read_exactly(self, size, buffer_size=4096):
+        buffer = bytearray(buffer_size)
+        received = bytearray()
+        deadline = time.monotonic() + 2.0
+        while len(received) < size and time.monotonic() < deadline:
+            received += buffer[:self.tty.readinto(buffer)]
+        return bytes(received)
+
+    def test_line_discipline_is_raw(self):
+        iflag, oflag, cflag, lflag, _, _, cc = termios.tcgetattr(self.tty.fileno())
+        self.assertFalse(lflag & (termios.ICANON | termios.ECHO | termios.ISIG | termios.IEXTEN))
+        self.assertFalse(iflag & (termios.ICRNL | termios.IXON | termios.ISTRIP))
+        self.assertFalse(oflag & termios.OPOST)
+        self.assertEqual(cflag & termios.CSIZE, termios.CS8)
+        self.assertEqual((cc[termios.VMIN], cc[termios.VTIME]), (1, 0))
+
+        payload = bytes(range(256))
+        os.write(self.host, payload)
+        self.assertEqual(self.read_exactly(len(payload)), payload)
+        self.tty.write(b"\r\n\x03")
+        self.assertEqual(os.read(self.host, 16), b"\r\n\x03")
+
+    def test_read_times_out_without_data(self):
+        started = time.monotonic()
+        self.assertEqual(self.tty.readinto(bytearray(16)), 0)
+        elapsed = time.monotonic() - started
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(self.tty.read_calls, 0)
+
+    def test_short_reads_return_what_is_available(self):
+        os.write(self.host, b"0123456789")
+        buffer = bytearray(4096)
+        deadline = time.monotonic() + 1.0
+        count = 0
+        while not count and time.monotonic() < deadline:
+            count = self.tty.readinto(buffer)
+        self.assertEqual(bytes(buffer[:count]), b"0123456789"[:count])
+
+        os.write(self.host, b"abcdefghijklmnopqrstuvwxyz")
+        self.assertEqual(self.read_exactly(10 - count + 26, buffer_size=8), b"0123456789"[count:] + b"abcdefghijklmnopqrstuvwxyz")
+        self.assertEqual(self.tty.bytes_read, 36)
+
+    def test_host_hangup_ends_the_stream(self):
+        self.close_host()
+        self.assertIsNone(self.tty.readinto(bytearray(16)))
+
+
+class RawStreamTest(unittest.TestCase):
+    def test_reads_are_not_capped(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, write_fd)
+        capacity = set_pipe_size(write_fd, 4 * MAX_READ_SIZE)
+        if capacity <= MAX_READ_SIZE:
+            self.skipTest("pipe cannot hold more than one capped read")
+        payload = os.urandom(capacity)
+        os.write(write_fd, payload)
+        stream = RawStream("pipe", read_fd, timeout=0.1)
+        self.addCleanup(stream.close)
+
+        buffer = bytearray(2 * capacity)
+        self.assertEqual(stream.readinto(buffer), len(payload))
+        self.assertEqual(bytes(buffer[:len(payload)]), payload)
+
+
+class EndpointStreamTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        for name in ("ep1", "ep2"):
+            os.mkfifo(os.path.join(self.path, name))
+        self.host_out = os.open(os.path.join(self.path, "ep1"), os.O_RDWR)
+        self.host_in = os.open(os.path.join(self.path, "ep2"), os.O_RDWR | os.O_NONBLOCK)
+        self.addCleanup(self.close_host)
+
+    def close_host(self):
+        for fd in (self.host_out, self.host_in):
+            if fd is not None:
+                os.close(fd)
+        self.host_out = self.host_in = None
+        endpoints = tty._endpoints.get(self.path)
+        if endpoints:
+            deadline = time.monotonic() + 2.0
+            while not endpoints.closed and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    def open_stream(self, timeout=0.2):
+        stream = EndpointStream(self.path, timeout=timeout, write_timeout=0.5)
+        self.addCleanup(stream.close)
+        return stream
+
+    def test_read_times_out_without_data(self):
+        stream = self.open_stream(timeout=0.1)
+        started = time.monotonic()
+        self.assertEqual(stream.readinto(bytearray(16)), 0)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_reads_are_capped(self):
+        stream = self.open_stream()
+        payload = os.urandom(3 * MAX_READ_SIZE)
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(self.host_out, view):]
+
+        buffer = bytearray(8 * 1024 * 1024)
+        received = bytearray()
+        while len(received) < len(payload):
+            count = stream.readinto(buffer)
+            self.assertTrue(count)
+            received += buffer[:count]
+        self.assertEqual(bytes(received), payload)
+
+    def test_reopened_stream_keeps_data_sent_after_close(self):
+        first = self.open_stream()
+        first.close()
+        self.assertIsNone(first.readinto(bytearray(16)))
+
+        os.write(self.host_out, b"next session")
+        second = self.open_stream()
+        buffer = bytearray(64)
+        count = second.readinto(buffer)
+        self.assertEqual(bytes(buffer[:count]), b"next session")
+
+    def test_write_reaches_the_in_endpoint(self):
+        stream = self.open_stream()
+        stream.write(b"hello")
+        deadline = time.monotonic() + 1.0
+        data = b""
+        while len(data) < 5 and time.monotonic() < deadline:
+            try:
+                data += os.read(self.host_in, 16)
+            except BlockingIOError:
+                time.sleep(0.01)
+        self.assertEqual(data, b"hello")
+
+    def test_host_disconnect_ends_the_stream(self):
+        stream = self.open_stream()
+        os.close(self.host_out)
+        self.host_out = None
+        self.assertIsNone(stream.readinto(bytearray(16)))
+
+
+if __name__ == "__main__":
+    unittest.main()
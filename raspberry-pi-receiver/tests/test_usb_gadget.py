@@ -0,0 +1,177 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from deskextend_receiver import core
+from deskextend_receiver.core import VideoReceiver
+from deskextend_receiver.services import usb_gadget
+from deskextend_receiver.services.usb_gadget import (
+    FUNCTIONS,
+    build_gadget_tree,
+    gadget_dirs,
+    gadget_matches,
+    setup_usb_gadget,
+)
+
+UDC = "fe980000.usb"
+
+
+class GadgetTreeTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_NAME": "TestPi"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, *parts):
+        with open(os.path.join(*parts)) as f:
+            return f.read().strip()
+
+    def bind(self):
+        with open(os.path.join(gadget_dirs(self.root)["gadget"], "UDC"), "w") as f:
+            f.write(f"{UDC}\n")
+
+    def test_builds_each_function(self):
+        for function, spec in FUNCTIONS.items():
+            with self.subTest(function=function):
+                root = os.path.join(self.root, function)
+                dirs = gadget_dirs(root)
+                function_dir = build_gadget_tree(function, root)
+
+                self.assertEqual(function_dir, os.path.join(dirs["functions"], spec["instance"]))
+                self.assertTrue(os.path.isdir(function_dir))
+                link = os.path.join(dirs["config"], spec["instance"])
+                self.assertTrue(os.path.islink(link))
+                self.assertEqual(os.path.realpath(link), os.path.realpath(function_dir))
+                self.assertEqual(self.read(dirs["gadget"], "bDeviceClass"), spec["device_class"])
+                self.assertEqual(self.read(dirs["config_strings"], "configuration"), spec["configuration"])
+                self.assertEqual(self.read(dirs["strings"], "serialnumber"), "DeskExtend-TestPi")
+
+    def test_matches_only_a_bound_tree(self):
+        build_gadget_tree("ncm", self.root)
+        self.assertFalse(gadget_matches("ncm", self.root))
+        self.bind()
+        self.assertTrue(gadget_matches("ncm", self.root))
+
+    def test_detects_a_different_function(self):
+        build_gadget_tree("acm", self.root)
+        self.bind()
+        self.assertFalse(gadget_matches("ncm", self.root))
+
+    def test_detects_changed_attributes(self):
+        build_gadget_tree("acm", self.root)
+        self.bind()
+        with mock.patch.dict(os.environ, {"DESKEXTEND_NAME": "OtherPi"}):
+            self.assertFalse(gadget_matches("acm", self.root))
+
+    def test_detects_extra_functions(self):
+        build_gadget_tree("acm", self.root)
+        dirs = gadget_dirs(self.root)
+        extra = os.path.join(dirs["functions"], FUNCTIONS["ecm"]["instance"])
+        os.makedirs(extra)
+        os.symlink(extra, os.path.join(dirs["config"], FUNCTIONS["ecm"]["instance"]))
+        self.bind()
+        self.assertFalse(gadget_matches("acm", self.root))
+
+    def test_rebuild_is_idempotent(self):
+        build_gadget_tree("ffs", self.root)
+        build_gadget_tree("ffs", self.root)
+        self.bind()
+        self.assertTrue(gadget_matches("ffs", self.root))
+
+
+class SetupUsbGadgetTest(GadgetTreeTest):
+    def setUp(self):
+        super().setUp()
+        patches = [
+            mock.patch.object(usb_gadget, "_function_ready", return_value=True),
+            mock.patch.object(usb_gadget, "_configure_usb_network", return_value=True),
+            mock.patch.object(usb_gadget, "_wait_for_path", return_value=True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def setup(self, function):
+        with mock.patch.object(usb_gadget, "_cleanup_existing_gadget", wraps=usb_gadget._cleanup_existing_gadget) as cleanup, \
+                mock.patch.object(usb_gadget, "build_gadget_tree", wraps=build_gadget_tree) as build:
+            result = setup_usb_gadget(function, self.root, udc=UDC)
+        return result, cleanup.called or build.called
+
+    def test_identical_tree_is_left_untouched(self):
+        build_gadget_tree("ncm", self.root)
+        self.bind()
+        udc_path = os.path.join(gadget_dirs(self.root)["gadget"], "UDC")
+        before = os.stat(udc_path).st_mtime_ns
+
+        self.assertEqual(self.setup("ncm"), (True, False))
+        self.assertEqual(os.stat(udc_path).st_mtime_ns, before)
+        usb_gadget._configure_usb_network.assert_called_once()
+
+    def test_unready_function_is_rebuilt(self):
+        build_gadget_tree("ncm", self.root)
+        self.bind()
+        usb_gadget._function_ready.return_value = False
+
+        self.assertEqual(self.setup("ncm"), (True, True))
+        self.assertTrue(gadget_matches("ncm", self.root))
+
+    def test_changed_function_triggers_a_rebuild(self):
+        build_gadget_tree("acm", self.root)
+        self.bind()
+
+        self.assertEqual(self.setup("ncm"), (True, True))
+        self.assertTrue(gadget_matches("ncm", self.root))
+        dirs = gadget_dirs(self.root)
+        self.assertFalse(os.path.lexists(os.path.join(dirs["config"], FUNCTIONS["acm"]["instance"])))
+        self.assertEqual(self.read(dirs["gadget"], "UDC"), UDC)
+
+
+class UsbGadgetSetupThreadTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DESKEXTEND_CACHE_DIR": cache_dir.name, "DESKEXTEND_USB_GADGET_ASYNC": "1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receiver = VideoReceiver(mode="network")
+        self.receiver.mode = "usb"
+        self.receiver.running = True
+        self.receiver.usb_gadget_ready.clear()
+        patcher = mock.patch.object(core.os, "geteuid", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.receiver, "refresh_usb_devices")
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_setup(self, **setup):
+        with mock.patch.object(core, "setup_usb_gadget", **setup) as setup_usb_gadget, \
+                self.assertLogs(core.logger, "INFO") as logs:
+            self.receiver.start_usb_gadget_setup()
+            self.receiver.wait_for_usb_gadget()
+            self.receiver.usb_gadget_thread.join(2.0)
+        setup_usb_gadget.assert_called_once_with(self.receiver.usb_function)
+        self.assertFalse(self.receiver.usb_gadget_thread.is_alive())
+        self.assertTrue(self.receiver.usb_gadget_ready.is_set())
+        self.refresh.assert_called_once()
+        self.assertIsNotNone(self.receiver.metrics.get("deskextend_usb_gadget_setup_seconds"))
+        return [record.getMessage() for record in logs.records if record.levelname == "ERROR"]
+
+    def test_failed_setup_is_reported(self):
+        errors = self.run_setup(return_value=False)
+        self.assertEqual(errors, ["USB gadget setup failed; receiver may not appear as USB accessory"])
+
+    def test_setup_exception_is_reported(self):
+        errors = self.run_setup(side_effect=OSError("configfs is read-only"))
+        self.assertEqual(errors, ["USB gadget setup error: configfs is read-only"])
+
+    def test_successful_setup_reports_nothing(self):
+        self.assertEqual(self.run_setup(return_value=True), [])
+
+
+if __name__ == "__main__":
+    unittest.main()